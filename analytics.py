@@ -0,0 +1,278 @@
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import Product as ProductModel
+from models import StockMovement, session_scope
+
+# Needs numpy: poetry install --extras analytics
+#
+# Reports over the whole catalog run on a columnar copy of the product
+# table held in numpy arrays sorted by id. The copy remembers the last
+# ledger movement it has seen and `refresh` applies only the movements
+# after it, instead of loading every product again.
+
+
+@dataclass
+class Line:
+    """A product in a report."""
+
+    name: str
+    quantity: int
+    price: int
+    value: int
+
+
+@dataclass
+class Band:
+    """Products whose price is in [low, high)."""
+
+    low: float
+    high: float
+    count: int
+    quantities: int
+    value: int
+
+
+@dataclass
+class Analytics:
+    """Columnar snapshot of the product table."""
+
+    ids: np.ndarray
+    names: np.ndarray
+    quantities: np.ndarray
+    prices: np.ndarray
+    # last ledger movement included in the arrays
+    movement_id: int = 0
+
+    # reload everything when the ledger tail is larger than this
+    # fraction of the catalog
+    RELOAD_RATIO = 0.5
+
+    @classmethod
+    def load(cls) -> "Analytics":
+        """Load every product with a Core SELECT, no ORM object is built.
+
+        A missing name is loaded as an empty one, like `SqlBackend.chunks`.
+
+        Returns
+        -------
+        outs: Analytics
+            Return the snapshot.
+        """
+        stmt = select(
+            ProductModel.id,
+            func.coalesce(ProductModel.name, ""),
+            func.coalesce(ProductModel.quantity, 0),
+            func.coalesce(ProductModel.price, 0),
+        ).order_by(ProductModel.id)
+        with session_scope() as session:
+            # read the ledger position first: a write that lands between
+            # the two reads is in the arrays and is applied again, with
+            # the same result, by the next refresh
+            movement_id = session.execute(last_movement()).scalar_one()
+            rows = session.execute(stmt).all()
+        ids, names, quantities, prices = zip(*rows) if rows else ([], [], [], [])
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            names=np.array([sys.intern(name) for name in names], dtype=object),
+            quantities=np.array(quantities, dtype=np.int64),
+            prices=np.array(prices, dtype=np.int64),
+            movement_id=movement_id,
+        )
+
+    def refresh(self) -> int:
+        """Apply the ledger movements made since the snapshot was taken.
+
+        Returns
+        -------
+        outs: int
+            Return number of movements applied.
+        """
+        with session_scope() as session:
+            last = session.execute(last_movement()).scalar_one()
+            count = last - self.movement_id
+            if count > max(len(self), 1) * self.RELOAD_RATIO:
+                vars(self).update(vars(self.load()))
+                return count
+            stmt = (
+                select(
+                    StockMovement.product_id,
+                    func.coalesce(StockMovement.name, ""),
+                    StockMovement.kind,
+                    StockMovement.quantity,
+                    StockMovement.price,
+                )
+                .where(StockMovement.id > self.movement_id)
+                .where(StockMovement.id <= last)
+                .order_by(StockMovement.id)
+            )
+            tail = session.execute(stmt).all()
+        # only the last movement of each product counts
+        changes = {row[0]: row for row in tail}
+        deleted = [id for id, row in changes.items() if row[2] == "delete"]
+        updated = [row for row in changes.values() if row[2] != "delete"]
+        if deleted:
+            keep = ~np.isin(self.ids, np.array(deleted, dtype=np.int64))
+            self._select(keep)
+        if updated:
+            self._upsert(updated)
+        self.movement_id = last
+        return len(tail)
+
+    def _select(self, mask: np.ndarray):
+        self.ids = self.ids[mask]
+        self.names = self.names[mask]
+        self.quantities = self.quantities[mask]
+        self.prices = self.prices[mask]
+
+    def _upsert(self, rows: list):
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        names = np.array([sys.intern(row[1]) for row in rows], dtype=object)
+        quantities = np.array([row[3] or 0 for row in rows], dtype=np.int64)
+        prices = np.array([row[4] or 0 for row in rows], dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == ids[found]
+        at = positions[found]
+        self.names[at] = names[found]
+        self.quantities[at] = quantities[found]
+        self.prices[at] = prices[found]
+        new = ~found
+        if new.any():
+            self.ids = np.concatenate([self.ids, ids[new]])
+            self.names = np.concatenate([self.names, names[new]])
+            self.quantities = np.concatenate([self.quantities, quantities[new]])
+            self.prices = np.concatenate([self.prices, prices[new]])
+            # new ids are usually the largest, then the order is kept
+            if len(self.ids) > 1 and np.any(np.diff(self.ids) < 0):
+                self._select(np.argsort(self.ids, kind="stable"))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def values(self) -> np.ndarray:
+        """Line value, price times quantity, of every product."""
+        return self.prices * self.quantities
+
+    def _lines(self, index: np.ndarray) -> list[Line]:
+        values = self.values
+        return [
+            Line(
+                str(self.names[i]),
+                int(self.quantities[i]),
+                int(self.prices[i]),
+                int(values[i]),
+            )
+            for i in index
+        ]
+
+    def price_percentiles(self, percentiles=(25, 50, 75, 90, 99)) -> dict:
+        """Price below which the given percent of products are.
+
+        Returns
+        -------
+        outs: dict[float, float]
+            Return price keyed by percentile, empty without products.
+        """
+        if not len(self):
+            return {}
+        prices = np.percentile(self.prices, percentiles)
+        return dict(zip(percentiles, prices.tolist()))
+
+    def value_by_price_band(self, edges) -> list[Band]:
+        """Histogram of the catalog by price.
+
+        Parameters
+        ----------
+        edges: list
+            Increasing band limits, e.g. `[0, 10, 100, 1000]`; the last
+            band includes its upper limit.
+
+        Returns
+        -------
+        outs: list[Band]
+            Return number of products, quantities and value of each band.
+        """
+        edges = np.asarray(edges)
+        size = len(edges) - 1
+        band = np.searchsorted(edges, self.prices, side="right") - 1
+        band[self.prices == edges[-1]] = size - 1
+        inside = (band >= 0) & (band < size)
+        band = band[inside]
+        counts = np.bincount(band, minlength=size)
+        quantities = np.bincount(band, self.quantities[inside], minlength=size)
+        values = np.bincount(band, self.values[inside], minlength=size)
+        return [
+            Band(low, high, int(count), int(quantity), int(value))
+            for low, high, count, quantity, value in zip(
+                edges[:-1].tolist(), edges[1:].tolist(), counts, quantities, values
+            )
+        ]
+
+    def top_by_value(self, k=10) -> list[Line]:
+        """Products with the largest price times quantity, largest first."""
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        values = self.values
+        top = np.argpartition(values, len(values) - k)[-k:]
+        return self._lines(top[np.argsort(-values[top], kind="stable")])
+
+    def low_stock(self, threshold: int) -> list[Line]:
+        """Products with at most `threshold` in stock, lowest first."""
+        index = np.flatnonzero(self.quantities <= threshold)
+        return self._lines(index[np.argsort(self.quantities[index], kind="stable")])
+
+    def reorder(self, lead_days=7, window_days=30, safety_stock=0) -> list[Line]:
+        """Products whose stock won't last until a new order arrives.
+
+        Daily demand of a product is what was sold, the negative updates
+        in the ledger, over the last `window_days` divided by that many
+        days. Its reorder point is the demand over `lead_days` plus
+        `safety_stock`.
+
+        Parameters
+        ----------
+        lead_days: float
+            Days between ordering and receiving a product.
+        window_days: float
+            Days of sales used to estimate the demand.
+        safety_stock: int
+            Units kept on top of the expected demand.
+
+        Returns
+        -------
+        outs: list[Line]
+            Return products at or below their reorder point, lowest first.
+        """
+        since = datetime.now(timezone.utc).replace(tzinfo=None)
+        since -= timedelta(days=window_days)
+        stmt = (
+            select(StockMovement.product_id, func.sum(-StockMovement.delta))
+            .where(StockMovement.created_at >= since)
+            .where(StockMovement.kind == "update", StockMovement.delta < 0)
+            .group_by(StockMovement.product_id)
+        )
+        with session_scope() as session:
+            sold = session.execute(stmt).all()
+        demand = np.zeros(len(self), dtype=np.float64)
+        if sold:
+            ids = np.array([row[0] for row in sold], dtype=np.int64)
+            units = np.array([row[1] for row in sold], dtype=np.float64)
+            positions = np.searchsorted(self.ids, ids)
+            found = positions < len(self.ids)
+            found[found] = self.ids[positions[found]] == ids[found]
+            demand[positions[found]] = units[found] / window_days
+        points = demand * lead_days + safety_stock
+        index = np.flatnonzero((self.quantities <= points) & (points > 0))
+        return self._lines(index[np.argsort(self.quantities[index], kind="stable")])
+
+
+def last_movement():
+    """Select the id of the last ledger movement."""
+    return select(func.coalesce(func.max(StockMovement.id), 0))
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from sqlalchemy import URL, AsyncAdaptedQueuePool, delete, event, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+import models
+from models import Product as ProductModel
+from queries import (
+    Direction,
+    Merge,
+    Order,
+    Page,
+    Summary,
+    adjust_statement,
+    aggregate_columns,
+    criterion_clause,
+    fuzzy_candidates,
+    make_page,
+    page_statement,
+    prefix_statement,
+    rank_by_similarity,
+    totals_statement,
+    upsert_statement,
+)
+from shop import Shop
+
+# Needs the aiosqlite driver: poetry install --extras async
+
+
+class AsyncShop:
+    """
+    Asyncio counterpart of Shop.
+    Every call works in its own session, so any number of tasks can use
+    it at the same time. The engine is created on first use with the
+    default database, call `configure` to choose another one.
+    """
+
+    engine: AsyncEngine | None = None
+    Session: async_sessionmaker | None = None
+    _lock = asyncio.Lock()
+
+    @classmethod
+    async def configure(
+        cls, path=models.DATABASE, pool_size=5, pragmas=None
+    ) -> AsyncEngine:
+        """Create the engine, then create and upgrade the database schema.
+
+        Parameters
+        ----------
+        path: str
+            Path of the sqlite database file.
+        pool_size: int
+            Number of connections kept open by the pool.
+        pragmas: dict
+            Pragmas set on every connection, merged over `models.PRAGMAS`.
+
+        Returns
+        -------
+        outs: AsyncEngine
+            Return the new engine.
+        """
+        await cls.dispose()
+        # sqlalchemy 2.0 defaults to a new connection per session
+        engine = create_async_engine(
+            URL.create("sqlite+aiosqlite", database=str(path)),
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size,
+        )
+        pragmas = {**models.PRAGMAS, **(pragmas or {})}
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            models.apply_pragmas(dbapi_connection, pragmas)
+
+        async with engine.begin() as connection:
+            await connection.run_sync(models.create_schema)
+        cls.engine = engine
+        cls.Session = async_sessionmaker(engine, expire_on_commit=False)
+        return engine
+
+    @classmethod
+    async def dispose(cls):
+        """Close all connections of the engine."""
+        if cls.engine is not None:
+            await cls.engine.dispose()
+            cls.engine = cls.Session = None
+
+    @classmethod
+    async def _sessions(cls) -> async_sessionmaker:
+        """Session factory, configured with defaults on first use."""
+        async with cls._lock:
+            if cls.Session is None:
+                await cls.configure()
+        return cls.Session
+
+    @classmethod
+    async def save(cls, name: str, quantity=0, price=0, merge=None) -> bool:
+        """Save a product or merge it into the existing one, see `Shop.save`.
+
+        Returns
+        -------
+        out: bool
+            Return True if product save successfully otherwise False.
+        """
+        stmt = upsert_statement(Merge(merge or Shop.MERGE))
+        values = {"name": name, "quantity": quantity, "price": price}
+        try:
+            async with (await cls._sessions()).begin() as session:
+                await session.execute(stmt, values)
+            return True
+        except Exception as e:
+            fields = {"operation": "save", "product": name}
+            logging.error(f"Error on save: {e}", extra=fields)
+            return False
+
+    @classmethod
+    async def remove(cls, name: str) -> bool:
+        """Delete a product by name.
+
+        Returns
+        -------
+        outs: bool
+            Return True if delete operation was successful otherwise False
+        """
+        stmt = delete(ProductModel).where(ProductModel.name_key == name.lower())
+        try:
+            async with (await cls._sessions()).begin() as session:
+                result = await session.execute(stmt)
+        except Exception as e:
+            fields = {"operation": "remove", "product": name}
+            logging.error(f"Error on remove: {e}", extra=fields)
+            return False
+        if not result.rowcount:
+            fields = {"operation": "remove", "product": name}
+            logging.error(f"Error on remove: {name} not found", extra=fields)
+        return bool(result.rowcount)
+
+    @classmethod
+    async def adjust_stock(cls, name: str, delta: int) -> bool:
+        """Add delta to the quantity of a product, see `Shop.adjust_stock`."""
+        return await cls.adjust_many({name: delta})
+
+    @classmethod
+    async def adjust_many(cls, deltas: dict[str, int]) -> bool:
+        """Adjust quantities of many products at once, see `Shop.adjust_many`.
+
+        Returns
+        -------
+        outs: bool
+            Return True if every quantity changed otherwise False.
+        """
+        stmt = adjust_statement()
+        try:
+            async with (await cls._sessions()).begin() as session:
+                for name, delta in deltas.items():
+                    value = {"key": name.lower(), "delta": int(delta)}
+                    if not (await session.execute(stmt, value)).rowcount:
+                        raise ValueError(
+                            f"{value['key']} not found or its quantity would "
+                            f"drop below zero by {value['delta']}"
+                        )
+            return True
+        except Exception as e:
+            fields = {"operation": "adjust", "product": list(deltas)}
+            logging.error(f"Error on adjust: {e}", extra=fields)
+            return False
+
+    @classmethod
+    async def get(cls, name: str) -> ProductModel | None:
+        """Find a product by name.
+
+        Returns
+        -------
+        outs: Product | None
+            Return the product or None if it does not exist.
+        """
+        stmt = select(ProductModel).where(ProductModel.name_key == name.lower())
+        async with (await cls._sessions())() as session:
+            return await session.scalar(stmt)
+
+    @classmethod
+    async def search(cls, name: str) -> str:
+        """Find a product by name, formatted like `Shop.search`.
+
+        Returns
+        -------
+        outs: str
+            Return the product if it was found otherwise empty string.
+        """
+        try:
+            product = await cls.get(name)
+        except Exception as e:
+            fields = {"operation": "search", "product": name}
+            logging.error(f"Error on search {e}", extra=fields)
+            return ""
+        if product is None:
+            return ""
+        s = "Name: {}\nQuntity: {}\nPrice: {}\n"
+        return s.format(product.name, product.quantity, product.price)
+
+    @classmethod
+    async def find(cls, name: str, limit=None) -> list[ProductModel]:
+        """Find products by a part of their name, see `Shop.find`.
+
+        Returns
+        -------
+        outs: list[Product]
+            Return matching products, best match first.
+        """
+        limit = limit or Shop.MATCHES
+        if not name:
+            return []
+        async with (await cls._sessions())() as session:
+            products = list(await session.scalars(prefix_statement(name, limit)))
+            if len(products) >= limit:
+                return products
+            found = {product.id for product in products}
+            plan = fuzzy_candidates(name, limit)
+            try:
+                rows = (await session.execute(*next(plan))).all()
+                while True:
+                    rows = (await session.execute(*plan.send(rows))).all()
+            except StopIteration as stop:
+                ids = stop.value
+            except OperationalError as e:
+                fields = {"operation": "search_fuzzy", "product": name}
+                logging.error(f"Error on fuzzy search {e}", extra=fields)
+                return products
+            ids = [id_ for id_ in ids if id_ not in found]
+            if not ids:
+                return products
+            stmt = select(ProductModel).where(ProductModel.id.in_(ids))
+            candidates = await session.scalars(stmt)
+        return products + rank_by_similarity(name, candidates, limit - len(products))
+
+    @classmethod
+    async def page(
+        cls,
+        order=Order.ID,
+        direction=Direction.ASC,
+        after=None,
+        before=None,
+        limit=None,
+    ) -> Page:
+        """Fetch one page of products, see `Shop.page`.
+
+        Returns
+        -------
+        outs: Page
+            Return the products and cursors of the page.
+        """
+        order, direction = Order(order), Direction(direction)
+        stmt = page_statement(order, direction, after, before, limit or Shop.PAGE_SIZE)
+        async with (await cls._sessions())() as session:
+            rows = (await session.execute(stmt)).all()
+        return make_page(rows, before)
+
+    @classmethod
+    async def iter_products(
+        cls, order=Order.ID, direction=Direction.ASC, batch_size=None
+    ) -> AsyncIterator[ProductModel]:
+        """Stream products one keyset page at a time, use with `async for`.
+
+        Yields
+        ------
+        outs: Product
+        """
+        batch_size = batch_size or Shop.BATCH_SIZE
+        page = await cls.page(order, direction, limit=batch_size)
+        while page.products:
+            for product in page.products:
+                yield product
+            if len(page.products) < batch_size:
+                break
+            page = await cls.page(order, direction, after=page.last, limit=batch_size)
+
+    @classmethod
+    async def summary(cls, *criteria) -> Summary:
+        """Calculate count, quantities, capital and price range at once,
+        see `Shop.summary`.
+
+        Returns
+        -------
+        outs: Summary
+            Return aggregated figures of the matching products.
+        """
+        if criteria:
+            clauses = [criterion_clause(criterion) for criterion in criteria]
+            stmt = select(*aggregate_columns()).where(*clauses)
+        else:
+            stmt = totals_statement()
+        async with (await cls._sessions())() as session:
+            row = (await session.execute(stmt)).one()
+        return Summary(*row)
+
+    @classmethod
+    async def total_capital(cls) -> int:
+        """Calculate total capital of shop."""
+        return (await cls.summary()).capital
+
+    @classmethod
+    async def total_quantities(cls) -> int:
+        """Calculate total quantities of shop."""
+        return (await cls.summary()).quantities
@@ -0,0 +1,528 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from statistics import fmean, median, quantiles
+from typing import Callable, Iterator
+
+import models
+import render
+from shop import Direction, Order, Shop
+from ui import COLUMNS
+
+# Reproducible benchmarks of the Shop layer. Every run uses new sqlite
+# files in a temporary directory, results are written as json and can be
+# compared with a stored baseline:
+#
+#   python bench.py --sizes 1000 100000 --output run.json
+#   python bench.py --sizes 1000 100000 --baseline run.json
+
+SIZES = (1_000, 100_000, 1_000_000)
+# a scenario is slower than the baseline if it lost this share of ops/sec
+THRESHOLD = 0.2
+# names kept from the generated catalog to look up existing products
+SAMPLE_SIZE = 1000
+# modules whose cold import is timed
+STARTUP_MODULES = ("main", "ui", "shop", "frozen")
+# first query after start, on an existing and on a new database
+FIRST_QUERY = (
+    "import models; models.configure('bench.db'); "
+    "from shop import Shop; Shop.summary()"
+)
+
+WORDS = (
+    "apple asus bag ball bike book bottle cable camera case chair charger "
+    "coffee cup desk dell drill fan glass hammer headset iphone jacket kettle "
+    "lamp laptop mouse mug notebook oil pan pen phone printer router samsung "
+    "shirt shoe soap sofa speaker table tea tv watch xiomi"
+).split()
+# zipf like weights, the first words are picked the most
+WEIGHTS = [1 / rank for rank in range(1, len(WORDS) + 1)]
+
+
+def random_name(rand: random.Random, index: int) -> str:
+    """Name of random letters, spread evenly over the alphabet."""
+    return "".join(rand.choices(string.ascii_lowercase, k=rand.randint(6, 14)))
+
+
+def prefixed_name(rand: random.Random, index: int) -> str:
+    """Name sharing one of a few prefixes, like brand-model names."""
+    return f"{rand.choice(WORDS[:5])} {index:x}"
+
+
+def words_name(rand: random.Random, index: int) -> str:
+    """Name of words picked with a skewed (zipf like) distribution."""
+    words = rand.choices(WORDS, weights=WEIGHTS, k=2)
+    return f"{words[0]} {words[1]} {index}"
+
+
+NAME_DISTRIBUTIONS = {
+    "random": random_name,
+    "prefixed": prefixed_name,
+    "words": words_name,
+}
+
+
+def generate_catalog(size: int, distribution="random", seed=0) -> Iterator[dict]:
+    """Yield `size` products with unique names.
+
+    The same size, distribution and seed always give the same catalog.
+    """
+    rand = random.Random(seed)
+    make_name = NAME_DISTRIBUTIONS[distribution]
+    seen = set()
+    index = 0
+    while len(seen) < size:
+        name = make_name(rand, index)
+        index += 1
+        if name in seen:
+            continue
+        seen.add(name)
+        yield {
+            "name": name,
+            "quantity": rand.randint(0, 500),
+            "price": rand.randint(1, 5000),
+        }
+
+
+def load_catalog(path: str, size: int, distribution: str, seed=0) -> list[str]:
+    """Create a database at path filled with a generated catalog.
+
+    Returns
+    -------
+    outs: list[str]
+        Return a random sample of the product names.
+    """
+    models.configure(path)
+    Shop._invalidate()
+    rand = random.Random(seed)
+    sample = []
+    feed_path = f"{path}.jsonl"
+    with open(feed_path, "w", encoding="utf-8") as feed:
+        for index, product in enumerate(generate_catalog(size, distribution, seed)):
+            feed.write(json.dumps(product) + "\n")
+            # reservoir sampling keeps memory flat for any size
+            if len(sample) < SAMPLE_SIZE:
+                sample.append(product["name"])
+            elif (slot := rand.randint(0, index)) < SAMPLE_SIZE:
+                sample[slot] = product["name"]
+    Shop.bulk_import(feed_path)
+    os.remove(feed_path)
+    return sample
+
+
+def timed(operation: Callable, arguments: list) -> dict:
+    """Call operation once per argument and collect latency figures.
+
+    Returns
+    -------
+    outs: dict
+        Return number of operations, ops/sec and mean, p50, p95 and p99
+        latency in milliseconds.
+    """
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        result = operation(argument)
+        if isinstance(result, Iterator):
+            # streamed results are only done when fully consumed
+            for _ in result:
+                pass
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    if len(latencies) > 1:
+        cuts = quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0]
+    return {
+        "operations": len(latencies),
+        "ops_per_sec": round(len(latencies) / total, 2) if total else None,
+        "mean_ms": round(fmean(latencies) * 1000, 4),
+        "p50_ms": round(p50 * 1000, 4),
+        "p95_ms": round(p95 * 1000, 4),
+        "p99_ms": round(p99 * 1000, 4),
+    }
+
+
+def typo(name: str, rand: random.Random) -> str:
+    """Drop one letter of the name."""
+    index = rand.randrange(len(name))
+    return name[:index] + name[index + 1 :]
+
+
+def mixed_operation(sample: list[str], rand: random.Random) -> Callable:
+    """Operation that picks a read or a write, 9 reads for each write."""
+    reads = (
+        lambda: Shop.search(rand.choice(sample)),
+        lambda: Shop.find(rand.choice(sample)[:4]),
+        lambda: Shop.summary(),
+        lambda: Shop.page(Order.NAME),
+    )
+
+    def operation(index: int):
+        if index % 10 == 0:
+            return Shop.save(f"mixed {index}", 1, 1)
+        if index % 10 == 5:
+            return Shop.remove(f"mixed {index - 5}")
+        return rand.choice(reads)()
+
+    return operation
+
+
+def run_scenarios(sample: list[str], operations: int, scans: int, seed=0) -> dict:
+    """Time every Shop method on the loaded catalog.
+
+    Parameters
+    ----------
+    sample: list[str]
+        Names of existing products.
+    operations: int
+        Number of calls of point operations like search and save.
+    scans: int
+        Number of calls of operations that read the whole catalog.
+    """
+    rand = random.Random(seed)
+    names = [rand.choice(sample) for _ in range(operations)]
+    new_names = [f"bench new {i}" for i in range(operations)]
+    last_page = Shop.page(Order.NAME, Direction.DEC, limit=1).last
+    scenarios = {
+        "save": (lambda name: Shop.save(name, 1, 1), new_names),
+        "save_existing": (lambda name: Shop.save(name, 1, 1), names),
+        "search": (Shop.search, names),
+        "search_missing": (Shop.search, [f"missing {i}" for i in range(operations)]),
+        "find_prefix": (Shop.find, [name[:4] for name in names]),
+        "find_typo": (Shop.find, [typo(name, rand) for name in names]),
+        "remove": (Shop.remove, new_names),
+        "page_first": (lambda order: Shop.page(order), [Order.NAME] * operations),
+        "page_last": (
+            lambda cursor: Shop.page(Order.NAME, before=cursor),
+            [last_page] * operations,
+        ),
+        "summary": (lambda _: Shop.summary(), range(operations)),
+        "total_capital": (lambda _: Shop.total_capital(), range(scans)),
+        "total_quantities": (lambda _: Shop.total_quantities(), range(scans)),
+        "products": (lambda _: Shop.products(), range(scans)),
+        "sort_asc": (lambda _: Shop.sort_asc(), range(scans)),
+        "sort_dec": (lambda _: Shop.sort_dec(), range(scans)),
+        "sort_dec_first_page": (
+            lambda _: islice(Shop.sort_dec(Order.TOTAL), Shop.PAGE_SIZE),
+            range(operations),
+        ),
+        "mixed": (mixed_operation(sample, rand), range(operations)),
+    }
+    return {
+        name: timed(operation, list(arguments))
+        for name, (operation, arguments) in scenarios.items()
+    }
+
+
+def bench_concurrency(
+    path: str, sample: list[str], requests=1000, concurrency=32, seed=0
+) -> dict:
+    """Throughput of concurrent requests, threads on Shop against tasks
+    on AsyncShop. A request looks up a product and finds products by the
+    first letters of its name.
+
+    Returns
+    -------
+    outs: dict
+        Return ops/sec of `concurrent_sync` and `concurrent_async`.
+    """
+    rand = random.Random(seed)
+    names = [rand.choice(sample) for _ in range(requests)]
+
+    def request(name: str):
+        Shop.search(name)
+        Shop.find(name[:4])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(request, names))
+    results = {"concurrent_sync": throughput(requests, start)}
+    try:
+        results["concurrent_async"] = asyncio.run(bench_async(path, names, concurrency))
+    except ImportError as e:
+        results["concurrent_async"] = {"skipped": str(e)}
+    return results
+
+
+async def bench_async(path: str, names: list[str], concurrency: int) -> dict:
+    """Run the requests of `bench_concurrency` as tasks on AsyncShop."""
+    from async_shop import AsyncShop
+
+    await AsyncShop.configure(path, pool_size=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(name: str):
+        async with semaphore:
+            await AsyncShop.search(name)
+            await AsyncShop.find(name[:4])
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(request(name) for name in names))
+        return throughput(len(names), start)
+    finally:
+        await AsyncShop.dispose()
+
+
+def throughput(requests: int, start: float) -> dict:
+    """Figures of requests served since start."""
+    seconds = time.perf_counter() - start
+    return {
+        "operations": requests,
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(requests / seconds, 2),
+    }
+
+
+def bench_writes(operations=5000, max_ops=500, max_delay=0.01) -> dict:
+    """Time saves and removes with immediate writes and with group commit.
+
+    Every mode runs on a new database in a temporary directory.
+
+    Returns
+    -------
+    outs: dict
+        Return operations per second and failures of each mode.
+    """
+    results = {}
+    for mode in ("immediate", "group_commit"):
+        with tempfile.TemporaryDirectory() as directory:
+            models.configure(os.path.join(directory, "bench.db"))
+            Shop._invalidate()
+            if mode == "group_commit":
+                Shop.write_behind(max_ops, max_delay)
+            start = time.perf_counter()
+            outcomes = [Shop.save(f"product {i}", 1, 1) for i in range(operations)]
+            outcomes += [Shop.remove(f"product {i}") for i in range(0, operations, 2)]
+            Shop.close()
+            seconds = time.perf_counter() - start
+            # futures in group commit mode
+            outcomes = [getattr(r, "result", lambda: r)() for r in outcomes]
+            models.engine.dispose()
+        results[mode] = {
+            "operations": len(outcomes),
+            "seconds": round(seconds, 4),
+            "ops_per_sec": round(len(outcomes) / seconds),
+            "failed": outcomes.count(False),
+        }
+    return results
+
+
+def bench_startup(repeat=5) -> dict:
+    """Time cold imports and the first query, each in a new interpreter.
+
+    Returns
+    -------
+    outs: dict
+        Return the median milliseconds of each program.
+    """
+    programs = {f"import_{module}": f"import {module}" for module in STARTUP_MODULES}
+    programs["first_query_new_db"] = FIRST_QUERY
+    programs["first_query"] = FIRST_QUERY
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": here}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, program in programs.items():
+            code = "\n".join(
+                (
+                    "import time",
+                    "start = time.perf_counter()",
+                    program,
+                    "print(time.perf_counter() - start)",
+                )
+            )
+            seconds = []
+            for _ in range(repeat):
+                if name == "first_query_new_db":
+                    for file in os.listdir(directory):
+                        os.remove(os.path.join(directory, file))
+                process = subprocess.run(
+                    [sys.executable, "-c", code],
+                    cwd=directory,
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                seconds.append(float(process.stdout))
+            results[name] = {"ms": round(median(seconds) * 1000, 2)}
+    return results
+
+
+def bench_render(rows=1_000_000) -> dict:
+    """Time writing a products table, a print per row against the
+    buffered renderer.
+
+    Output goes to a line buffered file, flushed at every new line like
+    a terminal, so the cost of the writes is counted.
+
+    Returns
+    -------
+    outs: dict
+        Return rows per second of `print_rows` and `buffered`.
+    """
+    data = [
+        (f"product {i}", i % 100, i % 5000, i % 100 * (i % 5000)) for i in range(rows)
+    ]
+
+    def print_rows(out):
+        for row in data:
+            print("{:<30}{:<10}{:>20}${:>20}$".format(*row), file=out)
+
+    def buffered(out):
+        for block in render.table(COLUMNS, data):
+            out.write(block)
+
+    results = {}
+    for name, write in (("print_rows", print_rows), ("buffered", buffered)):
+        with open(os.devnull, "w", buffering=1) as out:
+            start = time.perf_counter()
+            write(out)
+            results[name] = throughput(rows, start)
+    return results
+
+
+def run(
+    sizes=SIZES,
+    distribution="random",
+    operations=1000,
+    scans=3,
+    cache=False,
+    seed=0,
+    concurrency=32,
+) -> dict:
+    """Run every scenario for each catalog size.
+
+    Parameters
+    ----------
+    concurrency: int
+        Threads and tasks of the concurrent requests scenarios.
+    cache: bool
+        Keep Shop read caches on. They are off by default so the numbers
+        show the cost of the database work.
+
+    Returns
+    -------
+    outs: dict
+        Return the run settings and results per size and scenario.
+    """
+    if not cache:
+        Shop.names.maxsize = Shop.queries.maxsize = 0
+    results = {"meta": meta(distribution, operations, scans, cache, seed)}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            path = os.path.join(directory, "bench.db")
+            sample = load_catalog(path, size, distribution, seed)
+            load = {"seconds": round(time.perf_counter() - start, 4)}
+            results[str(size)] = {
+                "load": load,
+                **run_scenarios(sample, operations, scans, seed),
+                **bench_concurrency(path, sample, operations, concurrency, seed),
+            }
+            models.engine.dispose()
+    results["writes"] = bench_writes(operations)
+    results["startup"] = bench_startup()
+    results["render"] = bench_render()
+    return results
+
+
+def meta(distribution, operations, scans, cache, seed) -> dict:
+    """Settings and environment of a run, to tell runs apart."""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "distribution": distribution,
+        "operations": operations,
+        "scans": scans,
+        "cache": cache,
+        "seed": seed,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold=THRESHOLD) -> list[str]:
+    """Find scenarios that got slower than in the baseline.
+
+    Returns
+    -------
+    outs: list[str]
+        Return a description of each regression.
+    """
+    regressions = []
+    for group, scenarios in results.items():
+        if group == "meta" or group not in baseline:
+            continue
+        for name, figures in scenarios.items():
+            old = baseline[group].get(name, {}).get("ops_per_sec")
+            new = figures.get("ops_per_sec")
+            if old and new and new < old * (1 - threshold):
+                change = (new - old) / old * 100
+                regressions.append(
+                    f"{group}/{name}: {new} ops/sec, was {old} ({change:+.1f}%)"
+                )
+            # startup times, lower is better
+            old = baseline[group].get(name, {}).get("ms")
+            new = figures.get("ms")
+            if old and new and new > old * (1 + threshold):
+                change = (new - old) / old * 100
+                regressions.append(
+                    f"{group}/{name}: {new} ms, was {old} ({change:+.1f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Shop layer.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--distribution", choices=NAME_DISTRIBUTIONS, default="random")
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--scans", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cache", action="store_true", help="keep caches on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write results to")
+    parser.add_argument("--baseline", help="results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+    results = run(
+        args.sizes,
+        args.distribution,
+        args.operations,
+        args.scans,
+        args.cache,
+        args.seed,
+        args.concurrency,
+    )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
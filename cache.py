@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Hashable
+
+
+class LRUCache:
+    """
+    Least recently used cache with a size bound.
+    Counts hits, misses and evictions so the size can be tuned.
+    A cache of size 0 stores nothing. Safe to share between threads.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+        # changes whenever values are dropped
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_or_compute(self, key: Hashable, compute: Callable):
+        """Return the cached value of key, compute and store it if missing.
+
+        Parameters
+        ----------
+        key: Hashable
+            Key of the value.
+        compute: Callable
+            Function without arguments that computes the value.
+
+        Returns
+        -------
+        outs:
+            Return the cached or computed value.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return value
+            generation = self._generation
+        # computed outside the lock, so a slow query does not block hits
+        value = compute()
+        if self.maxsize > 0:
+            with self._lock:
+                if generation != self._generation:
+                    # dropped while computing, the value may be stale
+                    return value
+                self._data[key] = value
+                self._data.move_to_end(key)
+                if len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def pop(self, key: Hashable):
+        """Drop the value of key if it is cached."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        """Drop all values, counters are kept."""
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self) -> dict[str, int]:
+        """Counters of the cache.
+
+        Returns
+        -------
+        outs: dict[str, int]
+            Return size, maxsize, hits, misses and evictions.
+        """
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,46 @@
+import argparse
+
+from feed import Format
+from shop import Shop
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments of the exporter."""
+    parser = argparse.ArgumentParser(
+        description="Export products to a csv, jsonl or columnar file."
+    )
+    parser.add_argument("path", help="file to write, .csv, .jsonl or .col")
+    parser.add_argument(
+        "--format",
+        choices=[format.value for format in Format],
+        help="file format, picked from the extension if not given",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=Shop.BATCH_SIZE,
+        help="rows fetched and written at a time",
+    )
+    parser.add_argument(
+        "--backup",
+        action="store_true",
+        help="copy the whole database to path instead",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.backup:
+            Shop.backup(args.path)
+            print(f"Database copied to {args.path}")
+            return
+        rows = Shop.export(args.path, args.format, args.chunk_size)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Export failed: {e}")
+    print(f"Exported {rows} products to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
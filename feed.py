@@ -0,0 +1,276 @@
+import csv
+import json
+import struct
+import sys
+from array import array
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, Iterator
+
+# Streaming readers and writers for product feeds. Rows are read one at
+# a time and written a chunk at a time, so files of any size can be
+# imported and exported with flat memory.
+
+FIELDS = ("name", "quantity", "price")
+# fields of exported products
+EXPORT_FIELDS = ("id", "name", "quantity", "price")
+
+# Columnar files start with COLUMNAR_MAGIC followed by row groups, one
+# per exported chunk. A row group is its number of rows and the size of
+# its names in bytes (two little endian uint32) and the array typecode
+# of the id, quantity and price columns, "i" (int32) when every value of
+# the column fits, "q" (int64) otherwise. Then come the three columns
+# (little endian), the byte length of each name (uint32) and the utf-8
+# names one after the other.
+COLUMNAR_MAGIC = b"SHOPCOL2"
+ROW_GROUP = struct.Struct("<II3s")
+INT32 = (-(2**31), 2**31 - 1)
+
+
+class Format(Enum):
+    """
+    File formats of exported products
+    """
+
+    CSV = "csv"
+    JSONL = "jsonl"
+    COLUMNAR = "columnar"
+
+
+def read_csv(path: Path) -> Iterator[tuple[int, dict]]:
+    """Yield line number and record of a csv file with a header row."""
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def read_jsonl(path: Path) -> Iterator[tuple[int, dict]]:
+    """Yield line number and record of a file with one json object per line.
+
+    A line that is not valid json is yielded as a string so the caller
+    can reject it like any other invalid record.
+    """
+    with open(path, encoding="utf-8") as file:
+        for line_num, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_num, json.loads(line)
+            except json.JSONDecodeError:
+                yield line_num, line.rstrip("\n")
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _typecode(column: tuple) -> str:
+    """Narrowest array typecode of a columnar file that holds the values."""
+    low, high = INT32
+    return "i" if low <= min(column) and max(column) <= high else "q"
+
+
+def read_columnar(path: Path) -> Iterator[tuple[int, dict]]:
+    """Yield row number and record of a columnar file."""
+    with open(path, "rb") as file:
+        if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar product file")
+        row_num = 0
+        while header := file.read(ROW_GROUP.size):
+            rows, names_size, typecodes = ROW_GROUP.unpack(header)
+            columns = []
+            for typecode in typecodes.decode("ascii") + "I":
+                values = array(typecode)
+                data = file.read(rows * values.itemsize)
+                if len(data) != rows * values.itemsize:
+                    raise ValueError(f"{path} is truncated")
+                values.frombytes(data)
+                columns.append(_little_endian(values))
+            ids, quantities, prices, lengths = columns
+            names = file.read(names_size)
+            if len(names) != names_size:
+                raise ValueError(f"{path} is truncated")
+            start = 0
+            for index, length in enumerate(lengths):
+                row_num += 1
+                yield row_num, {
+                    "id": ids[index],
+                    "name": names[start : start + length].decode("utf-8"),
+                    "quantity": quantities[index],
+                    "price": prices[index],
+                }
+                start += length
+
+
+READERS = {
+    ".csv": read_csv,
+    ".jsonl": read_jsonl,
+    ".ndjson": read_jsonl,
+    ".col": read_columnar,
+}
+
+
+def read_records(path) -> Iterator[tuple[int, dict]]:
+    """Pick a reader based on file extension and yield its records.
+
+    Raises
+    ------
+    ValueError
+        If the file extension is not supported.
+    """
+    path = Path(path)
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ValueError(f"Unsupported feed format: {path.suffix}")
+    return reader(path)
+
+
+def write_csv(path: Path, chunks: Iterable[list[tuple]]) -> int:
+    """Write chunks of exported products to a csv file with a header row.
+
+    Returns
+    -------
+    outs: int
+        Return number of rows written.
+    """
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_FIELDS)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def write_jsonl(path: Path, chunks: Iterable[list[tuple]]) -> int:
+    """Write chunks of exported products, one json object per line.
+
+    Returns
+    -------
+    outs: int
+        Return number of rows written.
+    """
+    rows = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for chunk in chunks:
+            file.writelines(
+                json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n" for row in chunk
+            )
+            rows += len(chunk)
+    return rows
+
+
+def write_columnar(path: Path, chunks: Iterable[list[tuple]]) -> int:
+    """Write chunks of exported products as row groups of a columnar file.
+
+    Returns
+    -------
+    outs: int
+        Return number of rows written.
+    """
+    rows = 0
+    with open(path, "wb") as file:
+        file.write(COLUMNAR_MAGIC)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            ids, names, quantities, prices = zip(*chunk)
+            names = [name.encode("utf-8") for name in names]
+            lengths = array("I", map(len, names))
+            columns = (ids, quantities, prices)
+            typecodes = "".join(_typecode(column) for column in columns)
+            file.write(ROW_GROUP.pack(len(chunk), sum(lengths), typecodes.encode()))
+            for typecode, column in zip(typecodes, columns):
+                file.write(_little_endian(array(typecode, column)).tobytes())
+            file.write(_little_endian(lengths).tobytes())
+            file.write(b"".join(names))
+            rows += len(chunk)
+    return rows
+
+
+WRITERS = {
+    Format.CSV: write_csv,
+    Format.JSONL: write_jsonl,
+    Format.COLUMNAR: write_columnar,
+}
+# format picked from the extension of the file when it is not given
+FORMATS = {
+    ".csv": Format.CSV,
+    ".jsonl": Format.JSONL,
+    ".ndjson": Format.JSONL,
+    ".col": Format.COLUMNAR,
+}
+
+
+def format_of(path) -> Format:
+    """Export format of a file picked from its extension.
+
+    Raises
+    ------
+    ValueError
+        If the file extension is not supported.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(f"Unsupported export format: {suffix}")
+    return FORMATS[suffix]
+
+
+def write_records(path, chunks: Iterable[list[tuple]], format=None) -> int:
+    """Write chunks of exported products in a format.
+
+    Parameters
+    ----------
+    path: str
+        File to write.
+    chunks: Iterable[list[tuple]]
+        Lists of id, name, quantity and price rows.
+    format: Format
+        Format of the file, picked from its extension if not given.
+
+    Returns
+    -------
+    outs: int
+        Return number of rows written.
+
+    Raises
+    ------
+    ValueError
+        If the format is not supported.
+    """
+    format = Format(format) if format else format_of(path)
+    return WRITERS[format](Path(path), chunks)
+
+
+def parse_product(record) -> dict:
+    """Validate a feed record and convert it to product values.
+
+    Returns
+    -------
+    outs: dict
+        Return name, quantity and price of the product.
+
+    Raises
+    ------
+    ValueError
+        If the record is not a valid product.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    name = record.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name is required")
+    values = {"name": name.strip().lower()}
+    for field in ("quantity", "price"):
+        try:
+            value = int(record.get(field) or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} is not an integer") from None
+        if value < 0:
+            raise ValueError(f"{field} is negative")
+        values[field] = value
+    return values
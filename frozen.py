@@ -0,0 +1,199 @@
+import argparse
+import mmap
+import os
+import sqlite3
+import struct
+from bisect import bisect_left
+from typing import NamedTuple
+from urllib.parse import quote
+
+# A frozen catalog is a read only copy of the product table in a single
+# file, for replicas that only look products up, e.g. price checkers.
+# Readers map the file in memory and binary search it, nothing is loaded
+# up front and SQLAlchemy is not imported.
+#
+# Layout, little endian:
+#   header   magic, number of products, size of the keys and names
+#            blobs, id of the last stock movement in the build
+#   records  one fixed width record per product, sorted by key: id,
+#            quantity, price, then offset and length of its key and name
+#   keys     lowercased utf-8 names, in record order
+#   names    utf-8 names as stored
+
+MAGIC = b"SHOPFRZ1"
+HEADER = struct.Struct("<8sIIIq")
+RECORD = struct.Struct("<qqqIIII")
+
+
+class Item(NamedTuple):
+    """A product of a frozen catalog."""
+
+    id: int
+    name: str
+    quantity: int
+    price: int
+
+
+def build(database: str, path: str) -> int:
+    """Compile the product table of a database into a frozen catalog.
+
+    Products are read by one SELECT, a consistent copy even while the
+    shop keeps writing. The file is written under a temporary name and
+    renamed over `path`, so readers see either the old or the new
+    catalog, never a partial one.
+
+    Parameters
+    ----------
+    database: str
+        Path of the sqlite database, e.g. the live shop.db.
+    path: str
+        Frozen catalog file to publish.
+
+    Returns
+    -------
+    outs: int
+        Return number of products in the catalog.
+    """
+    # quoted, like `models.open_engine`: `?`, `#` and `%` are not
+    # part of a URI path
+    url = f"file:{quote(str(database))}?mode=ro"
+    connection = sqlite3.connect(url, uri=True)
+    try:
+        # the ledger position is read first, like the analytics snapshot
+        movement_id = connection.execute(
+            "SELECT ifnull(max(id), 0) FROM stock_movement"
+        ).fetchone()[0]
+        rows = connection.execute(
+            "SELECT id, name, ifnull(quantity, 0), ifnull(price, 0) "
+            "FROM product WHERE name IS NOT NULL ORDER BY lower(name)"
+        ).fetchall()
+    finally:
+        connection.close()
+    keys = [name.lower().encode("utf-8") for _, name, _, _ in rows]
+    names = [name.encode("utf-8") for _, name, _, _ in rows]
+    # lower() in sqlite only folds ascii, sort again on the python keys
+    order = sorted(range(len(rows)), key=keys.__getitem__)
+    records = bytearray()
+    key_offset = name_offset = 0
+    for index in order:
+        id, _, quantity, price = rows[index]
+        key, name = keys[index], names[index]
+        records += RECORD.pack(
+            id, quantity, price, key_offset, len(key), name_offset, len(name)
+        )
+        key_offset += len(key)
+        name_offset += len(name)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(rows), key_offset, name_offset, movement_id))
+        file.write(records)
+        file.write(b"".join(keys[index] for index in order))
+        file.write(b"".join(names[index] for index in order))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(partial, path)
+    return len(rows)
+
+
+class FrozenCatalog:
+    """
+    Reader of a frozen catalog file.
+    Call `reload` to pick up a newly published build.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, "rb") as file:
+            self.stat = os.fstat(file.fileno())
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, keys_size, names_size, movement_id = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a frozen catalog")
+        self.count = count
+        self.movement_id = movement_id
+        self.keys_start = HEADER.size + count * RECORD.size
+        self.names_start = self.keys_start + keys_size
+
+    def reload(self) -> bool:
+        """Map the catalog again if a new build replaced the file.
+
+        Lookups already running keep using the previous mapping, which
+        stays valid after the file is replaced.
+
+        Returns
+        -------
+        outs: bool
+            Return True if a new build was loaded.
+        """
+        stat = os.stat(self.path)
+        current = (self.stat.st_ino, self.stat.st_mtime_ns)
+        if (stat.st_ino, stat.st_mtime_ns) == current:
+            return False
+        self._open()
+        return True
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        # key of a record, so the catalog can be bisected like a list
+        record = RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+        start = self.keys_start + record[3]
+        return self.map[start : start + record[4]]
+
+    def _item(self, index: int) -> Item:
+        id, quantity, price, _, _, name_offset, name_size = RECORD.unpack_from(
+            self.map, HEADER.size + index * RECORD.size
+        )
+        start = self.names_start + name_offset
+        name = self.map[start : start + name_size].decode("utf-8")
+        return Item(id, name, quantity, price)
+
+    def get(self, name: str) -> Item | None:
+        """Find a product by name, regardless of letter case."""
+        key = name.lower().encode("utf-8")
+        index = bisect_left(self, key)
+        if index < self.count and self[index] == key:
+            return self._item(index)
+        return None
+
+    def find(self, prefix: str, limit=10) -> list[Item]:
+        """Products whose name starts with prefix, in name order."""
+        key = prefix.lower().encode("utf-8")
+        items = []
+        index = bisect_left(self, key)
+        while index < self.count and len(items) < limit:
+            if not self[index].startswith(key):
+                break
+            items.append(self._item(index))
+            index += 1
+        return items
+
+    def search(self, name: str) -> str:
+        """Find a product by name, formatted like `Shop.search`."""
+        item = self.get(name)
+        if item is None:
+            return ""
+        s = "Name: {}\nQuntity: {}\nPrice: {}\n"
+        return s.format(item.name, item.quantity, item.price)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a frozen catalog from the shop database."
+    )
+    parser.add_argument("path", help="frozen catalog file to publish")
+    parser.add_argument("--database", default="shop.db")
+    args = parser.parse_args()
+    try:
+        count = build(args.database, args.path)
+    except (OSError, sqlite3.Error) as e:
+        raise SystemExit(f"Build failed: {e}")
+    print(f"Published {count} products to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
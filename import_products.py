@@ -0,0 +1,45 @@
+import argparse
+
+from shop import Merge, Shop
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments of the importer."""
+    parser = argparse.ArgumentParser(
+        description="Import products from a csv, jsonl or columnar file."
+    )
+    parser.add_argument("path", help="csv, jsonl or columnar (.col) file to import")
+    parser.add_argument(
+        "--merge",
+        choices=[merge.value for merge in Merge],
+        default=Shop.MERGE.value,
+        help="what to do with products that already exist",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=Shop.CHUNK_SIZE,
+        help="rows per transaction",
+    )
+    parser.add_argument("--errors", help="file to write rejected rows to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        report = Shop.bulk_import(
+            args.path,
+            merge=Merge(args.merge),
+            chunk_size=args.chunk_size,
+            error_file=args.errors,
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Import failed: {e}")
+    print(report)
+    if report.error_file:
+        print(f"Rejected rows are written to {report.error_file}")
+
+
+if __name__ == "__main__":
+    main()
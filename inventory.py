@@ -0,0 +1,341 @@
+import argparse
+import json
+import shlex
+import sys
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Iterator, TextIO
+
+# Scriptable commands on the inventory, one json object written per
+# command, e.g.
+#
+#   python inventory.py add pen --quantity 10 --price 2
+#   python inventory.py list --order price --direction dec --limit 5
+#   printf 'add pen -q 1\nadjust pen -1\ntotals\n' | python inventory.py batch
+#   python inventory.py migrate-legacy inventory.txt
+#   python inventory.py --store north add pen -q 10 -p 2
+#   python inventory.py chain search pen
+#   python inventory.py snapshot
+#   python inventory.py stock-at 2024-01-31T23:59
+#
+# Taken regularly, e.g. nightly from cron, snapshots keep `stock-at`
+# fast as the ledger of stock movements grows:
+#
+#   0 2 * * * cd /srv/shop && python inventory.py snapshot >> snapshots.log
+#
+# The shop is only imported once the arguments are parsed, so --help and
+# usage errors answer at once.
+
+# commands that read the stock, the queued writes of a batch are
+# committed before them so they see the effect of the earlier lines
+READS = ("search", "list", "totals", "stats", "history", "stock-at", "snapshot")
+
+
+def utc_time(value: str) -> datetime:
+    """Parse an ISO 8601 time, in UTC unless it has an offset."""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+class BatchParser(argparse.ArgumentParser):
+    """Parser of a batch line that raises instead of exiting."""
+
+    def error(self, message):
+        raise ValueError(message)
+
+
+def add_commands(parser: argparse.ArgumentParser):
+    """Add the inventory commands as subcommands of a parser.
+
+    Returns
+    -------
+    outs:
+        Return the subparsers action, to add more commands to it.
+    """
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="save a product")
+    add.add_argument("name")
+    add.add_argument("-q", "--quantity", type=int, default=0)
+    add.add_argument("-p", "--price", type=int, default=0)
+    add.add_argument("--merge", help="add or replace, default add")
+
+    remove = commands.add_parser("remove", help="delete a product")
+    remove.add_argument("name")
+
+    adjust = commands.add_parser("adjust", help="add delta to the quantity")
+    adjust.add_argument("name")
+    adjust.add_argument("delta", type=int)
+
+    search = commands.add_parser("search", help="find a product by name")
+    search.add_argument("name")
+    search.add_argument(
+        "--similar", action="store_true", help="closest matches instead"
+    )
+    search.add_argument("--limit", type=int)
+
+    list_ = commands.add_parser("list", help="stream products")
+    list_.add_argument("--order", default="id", help="id, name, price, ...")
+    list_.add_argument("--direction", default="asc", help="asc or dec")
+    list_.add_argument("--limit", type=int)
+
+    commands.add_parser("totals", help="count, quantities and capital")
+    commands.add_parser("stats", help="timings and cache counters of this run")
+
+    commands.add_parser("snapshot", help="save a copy of the current stock")
+    history = commands.add_parser("history", help="movements of a product")
+    history.add_argument("name")
+    history.add_argument("--limit", type=int, default=100)
+    stock_at = commands.add_parser("stock-at", help="quantities at a past time")
+    stock_at.add_argument("when", type=utc_time, help="ISO 8601, default UTC")
+    return commands
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments of the inventory command."""
+    parser = argparse.ArgumentParser(
+        prog="inventory", description="Run inventory commands, output is json."
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--database", help="sqlite file, default from config")
+    target.add_argument("--store", help="run on the database of a store of config")
+    parser.add_argument(
+        "--stats", metavar="FILE", help="time the commands, write figures to FILE"
+    )
+    commands = add_commands(parser)
+    batch = commands.add_parser("batch", help="run a command per line")
+    batch.add_argument("file", nargs="?", default="-", help="commands file, - is stdin")
+    batch.add_argument(
+        "--group",
+        type=int,
+        default=1000,
+        help="most writes committed in one transaction",
+    )
+    migrate = commands.add_parser(
+        "migrate-legacy", help="import a name,number,price,total_price file"
+    )
+    migrate.add_argument("file", help="legacy inventory file, e.g. inventory.txt")
+    migrate.add_argument("--chunk-size", type=int, default=50_000)
+    migrate.add_argument("--errors", help="file to write rejected lines to")
+    migrate.add_argument("--checkpoint", help="default is <file>.checkpoint")
+    migrate.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    chain = commands.add_parser("chain", help="query every store of config")
+    chain.add_argument("query", choices=("totals", "search"))
+    chain.add_argument("name", nargs="?", help="product to search")
+    chain.add_argument("--limit", type=int, default=10)
+    chain.add_argument("--workers", type=int, help="processes, default CPUs")
+    return parser.parse_args(argv)
+
+
+def run_chain(args: argparse.Namespace, stores: dict) -> dict:
+    """Run a query on every store, in a pool of processes."""
+    from stores import Chain
+
+    chain = Chain(stores, args.workers)
+    try:
+        if args.query == "totals":
+            totals = chain.totals()
+            return {
+                "stores": {store: vars(summary) for store, summary in totals.items()},
+                "chain": vars(chain.summary()),
+            }
+        if not args.name:
+            raise ValueError("chain search needs a name")
+        products = chain.search(args.name, args.limit)
+        return {"products": [product.to_dict() for product in products]}
+    finally:
+        chain.close()
+
+
+def run(args: argparse.Namespace):
+    """Run one command.
+
+    Returns
+    -------
+    outs: dict | Future | Iterator
+        Return the json result, the Future of a queued write or the
+        products of a list.
+    """
+    from shop import Direction, Merge, Order, Shop
+
+    if args.command == "add":
+        merge = Merge(args.merge) if args.merge else None
+        return Shop.save(args.name, args.quantity, args.price, merge)
+    if args.command == "remove":
+        return Shop.remove(args.name)
+    if args.command == "adjust":
+        return Shop.adjust_stock(args.name, args.delta)
+    if args.command == "search":
+        if args.similar:
+            products = Shop.find(args.name, args.limit)
+            return {"products": [product.to_dict() for product in products]}
+        product = Shop.get(args.name)
+        return {"product": product.to_dict() if product else None}
+    if args.command == "list":
+        products = Shop.iter_products(Order(args.order), Direction(args.direction))
+        if args.limit is not None:
+            products = (p for _, p in zip(range(args.limit), products))
+        return products
+    if args.command == "totals":
+        return vars(Shop.summary())
+    if args.command == "stats":
+        import metrics
+
+        return {**metrics.snapshot(), "caches": Shop.cache_stats()}
+    if args.command == "snapshot":
+        return {"snapshot": Shop.snapshot()}
+    if args.command == "history":
+        movements = Shop.history(args.name, args.limit)
+        return {"movements": [movement.to_dict() for movement in movements]}
+    if args.command == "stock-at":
+        return {"when": args.when.isoformat(), "stock": Shop.stock_at(args.when)}
+    raise ValueError(f"unknown command {args.command}")
+
+
+def emit(out: TextIO, result, line=None) -> bool:
+    """Write the result of a command as one json line.
+
+    Returns
+    -------
+    outs: bool
+        Return False if the command failed.
+    """
+    prefix = {} if line is None else {"line": line}
+    if isinstance(result, Future):
+        result = result.result()
+    if isinstance(result, bool):
+        result = {"ok": result}
+    if isinstance(result, dict):
+        out.write(json.dumps({**prefix, **result}) + "\n")
+        return result.get("ok", True) and "error" not in result
+    # products are written as they are fetched, never all in memory;
+    # the object is opened up to its empty products list
+    out.write(json.dumps({**prefix, "products": []})[:-2])
+    for index, product in enumerate(result):
+        out.write((", " if index else "") + json.dumps(product.to_dict()))
+    out.write("]}\n")
+    return True
+
+
+def split(line: str) -> list[str]:
+    """Split a command line like a shell, fast when nothing is quoted."""
+    if any(char in line for char in "\"'\\"):
+        return shlex.split(line)
+    return line.split()
+
+
+def run_batch(lines: Iterator[str], out: TextIO, group=1000) -> bool:
+    """Run a command per line in one process.
+
+    Writes are queued and group committed, up to `group` per
+    transaction, and their results are written in line order once
+    committed.
+
+    Returns
+    -------
+    outs: bool
+        Return False if any command failed.
+    """
+    from shop import Shop
+
+    parser = BatchParser(prog="", add_help=False)
+    add_commands(parser)
+    pending = deque()
+    ok = True
+
+    def drain(wait: bool):
+        nonlocal ok
+        while pending:
+            line, result = pending[0]
+            if isinstance(result, Future) and not (wait or result.done()):
+                break
+            pending.popleft()
+            ok = emit(out, result, line) and ok
+
+    Shop.write_behind(max_ops=group)
+    try:
+        for line_num, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                args = parser.parse_args(split(line))
+                if args.command in READS:
+                    Shop.flush()
+                    drain(wait=True)
+                result = run(args)
+            except Exception as e:
+                result = {"error": str(e)}
+            pending.append((line_num, result))
+            drain(wait=False)
+    finally:
+        Shop.close()
+    drain(wait=True)
+    return ok
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import models
+    from main import read_toml
+
+    try:
+        config = read_toml()
+    except FileNotFoundError:
+        config = {}
+    database = config.get("database") or {}
+    stores = config.get("stores") or {}
+    if args.database:
+        database["path"] = args.database
+    if args.store:
+        if args.store not in stores:
+            emit(sys.stdout, {"error": f"no store {args.store} in config"})
+            sys.exit(1)
+        database["path"] = stores[args.store]
+    if database:
+        models.configure(**database)
+    if config.get("storage"):
+        import storage
+        from shop import Shop
+
+        Shop.use(storage.open_backend(config["storage"]))
+    if args.stats:
+        import metrics
+
+        metrics.enable()
+    if args.command == "migrate-legacy":
+        from shop import Shop
+
+        try:
+            report = Shop.migrate_legacy(
+                args.file, args.chunk_size, args.errors, args.checkpoint, args.restart
+            )
+            ok = emit(sys.stdout, vars(report))
+        except (OSError, ValueError) as e:
+            ok = emit(sys.stdout, {"error": str(e)})
+    elif args.command == "chain":
+        try:
+            ok = emit(sys.stdout, run_chain(args, stores))
+        except Exception as e:
+            ok = emit(sys.stdout, {"error": str(e)})
+    elif args.command == "batch":
+        if args.file == "-":
+            ok = run_batch(sys.stdin, sys.stdout, args.group)
+        else:
+            with open(args.file, encoding="utf-8") as file:
+                ok = run_batch(file, sys.stdout, args.group)
+    else:
+        try:
+            ok = emit(sys.stdout, run(args))
+        except Exception as e:
+            ok = emit(sys.stdout, {"error": str(e)})
+    if args.stats:
+        metrics.dump(args.stats)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
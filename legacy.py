@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator
+
+import feed
+from queries import Merge
+from storage import SqlBackend, StorageBackend
+
+# Migration of the flat files of the first version of the shop, see the
+# commented out ProductFile in shopping.py, into the product table.
+# A file has a `name,number,price,total_price` line per product and the
+# first line of a name wins, later ones were refused by `Product.add`.
+#
+# The file is read once, a chunk of lines at a time, and each chunk is
+# upserted with `Merge.KEEP` in one transaction of the storage backend,
+# so names already stored are kept and memory stays flat whatever the
+# number of names. After each chunk the byte offset reached is written
+# to a checkpoint file, an interrupted migration goes on from there.
+
+CHUNK_SIZE = 50_000
+
+
+@dataclass
+class MigrationReport:
+    """Outcome of a legacy migration, also its checkpoint."""
+
+    # byte offset and number of the next line to read
+    offset: int = 0
+    lines: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    # size of the error file at the offset
+    errors_size: int = 0
+    seconds: float = 0.0
+    # size and modification time of the file, a resumed migration
+    # refuses a file that changed
+    size: int = 0
+    mtime_ns: int = 0
+    done: bool = False
+
+    def __str__(self) -> str:
+        s = "Read {} lines in {:.2f}s: inserted {}, duplicates {}, rejected {}"
+        return s.format(
+            self.lines, self.seconds, self.inserted, self.duplicates, self.rejected
+        )
+
+
+def parse_line(line: str) -> dict:
+    """Validate a legacy line and convert it to product values.
+
+    The name is split from the right, so names with commas are kept.
+
+    Raises
+    ------
+    ValueError
+        If the line is not a valid product or its total price is not
+        number times price.
+    """
+    fields = line.rsplit(",", 3)
+    if len(fields) != 4:
+        raise ValueError("expected name,number,price,total_price")
+    name, number, price, total_price = fields
+    values = feed.parse_product({"name": name, "quantity": number, "price": price})
+    try:
+        total = int(total_price)
+    except ValueError:
+        raise ValueError("total_price is not an integer") from None
+    expected = values["quantity"] * values["price"]
+    if total != expected:
+        raise ValueError(f"total_price is {total}, number * price is {expected}")
+    return values
+
+
+def read_lines(path, offset=0) -> Iterator[tuple[int, str]]:
+    """Yield lines of a file from a byte offset, with the offset after
+    each line."""
+    with open(path, "rb") as file:
+        file.seek(offset)
+        for raw in file:
+            offset += len(raw)
+            yield offset, raw.decode("utf-8", errors="replace").strip()
+
+
+def load_checkpoint(path: str) -> MigrationReport | None:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return MigrationReport(**json.load(file))
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, report: MigrationReport):
+    # written aside and renamed, a crash never leaves half a checkpoint
+    partial = f"{path}.partial"
+    with open(partial, "w", encoding="utf-8") as file:
+        json.dump(asdict(report), file)
+    os.replace(partial, path)
+
+
+def migrate(
+    path,
+    chunk_size=CHUNK_SIZE,
+    error_file=None,
+    checkpoint=None,
+    restart=False,
+    backend: StorageBackend | None = None,
+    on_commit: Callable[[], None] | None = None,
+) -> MigrationReport:
+    """Stream a legacy inventory file into the product table.
+
+    Products already in the table are kept, like duplicates in the
+    file. If the migration stops between a commit and its checkpoint,
+    the chunk is read again on resume; its lines are then counted as
+    duplicates, but nothing is inserted twice.
+
+    Parameters
+    ----------
+    path: str
+        Legacy file, e.g. inventory.txt.
+    chunk_size: int
+        Lines per transaction.
+    error_file: str
+        Where to write rejected lines, default is `<path>.errors.jsonl`.
+    checkpoint: str
+        Checkpoint file, default is `<path>.checkpoint`.
+    restart: bool
+        Ignore the checkpoint and read the file from the start.
+    backend: StorageBackend
+        Where products are written, default is the database of
+        `models.configure`; see `Shop.migrate_legacy`.
+    on_commit: Callable
+        Called after every committed chunk, e.g. to drop cached reads.
+
+    Returns
+    -------
+    outs: MigrationReport
+        Return number of lines read, inserted, duplicate and rejected
+        products, totals of every run on the file.
+
+    Raises
+    ------
+    ValueError
+        If the file changed since the checkpoint was taken.
+    """
+    error_file = error_file or f"{path}.errors.jsonl"
+    checkpoint = checkpoint or f"{path}.checkpoint"
+    stat = os.stat(path)
+    report = None if restart else load_checkpoint(checkpoint)
+    if report is None:
+        report = MigrationReport(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    elif (report.size, report.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        raise ValueError(f"{path} changed since {checkpoint}, migrate with restart")
+    if report.done:
+        return report
+    backend = backend or SqlBackend()
+    start = time.perf_counter() - report.seconds
+    lines = read_lines(path, report.offset)
+    # rejected lines of earlier runs are kept, those after the checkpoint
+    # are read again
+    with open(error_file, "a" if report.offset else "w", encoding="utf-8") as errors:
+        errors.truncate(min(report.errors_size, errors.tell()))
+        while True:
+            rows, offset, count = [], report.offset, 0
+            for offset, line in lines:
+                count += 1
+                if not line:
+                    continue
+                try:
+                    rows.append(parse_line(line))
+                except ValueError as e:
+                    number = report.lines + count
+                    error = {"line": number, "error": str(e), "row": line}
+                    errors.write(json.dumps(error) + "\n")
+                    report.rejected += 1
+                if len(rows) == chunk_size:
+                    break
+            if not count:
+                break
+            if rows:
+                with backend.transaction() as tx:
+                    inserted = backend.upsert(tx, rows, Merge.KEEP)
+                if on_commit is not None:
+                    on_commit()
+                report.inserted += inserted
+                report.duplicates += len(rows) - inserted
+            report.errors_size = errors.tell()
+            report.offset = offset
+            report.lines += count
+            report.seconds = time.perf_counter() - start
+            save_checkpoint(checkpoint, report)
+    report.done = True
+    report.seconds = time.perf_counter() - start
+    save_checkpoint(checkpoint, report)
+    logging.info(
+        f"Legacy migration of {path}: {report}",
+        extra={"operation": "migrate_legacy", "rows": report.inserted},
+    )
+    return report
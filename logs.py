@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import queue
+import tomllib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Logging of the shop. Records are put on a queue by the calling thread
+# and written by a background thread, one json object per line, to a
+# file rotated by size. Fields given in `extra` are written with the
+# message, e.g.
+#
+#   logging.error("Error on save", extra={"operation": "save", "product": n})
+
+LOG_FILE = "shop.log"
+LEVEL = "WARNING"
+# rotate the file at 10 MiB, keep 5 old ones
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+# fields of a record written when given in `extra`
+FIELDS = ("operation", "product", "ms", "rows")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single line json object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                line[field] = value
+        return json.dumps(line, default=str)
+
+
+def configure(
+    path=LOG_FILE, level=LEVEL, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT
+):
+    """Send the records of the root logger to a background writer.
+
+    Calling it again replaces the previous configuration.
+
+    Parameters
+    ----------
+    path: str
+        Log file, rotated to `path.1`, `path.2`, ... when full.
+    level: str
+        Lowest level written, e.g. `DEBUG` or `WARNING`.
+    max_bytes: int
+        Size of the file that triggers a rotation.
+    backup_count: int
+        Number of rotated files kept.
+    """
+    global _listener
+    stop()
+    handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, handler)
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    _listener.start()
+
+
+def configure_from(filename="config.toml", **defaults):
+    """Configure logging from the `logging` table of config.toml.
+
+    Parameters
+    ----------
+    filename: str
+        Config file, defaults are used if it doesn't exist.
+    defaults:
+        Arguments of `configure` used when the config doesn't set them.
+    """
+    try:
+        with open(filename, "rb") as toml_file:
+            config = tomllib.load(toml_file).get("logging") or {}
+    except FileNotFoundError:
+        config = {}
+    configure(**{**defaults, **config})
+
+
+def stop():
+    """Write the queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# queued records are written on a clean exit
+atexit.register(stop)
@@ -1,5 +1,6 @@
+import importlib
+import threading
 import tomllib
-from ui import Ui
 
 
 def read_toml(filename="config.toml") -> dict[str, str]:
@@ -50,7 +51,24 @@ def user_validation(usr, passwd) -> bool:
     return False
 
 
+def open_database():
+    """Import the database layer and connect to the configured database."""
+    import metrics
+    import models
+    import storage
+    from shop import Shop
+
+    config = read_toml()
+    models.configure(**(config.get("database") or {}))
+    Shop.use(storage.open_backend(config.get("storage")))
+    if (config.get("stats") or {}).get("enabled"):
+        metrics.enable()
+
+
 def main():
+    # the ui pulls in sqlalchemy, a slow import, so it is imported in
+    # the background while the user types the credentials
+    threading.Thread(target=importlib.import_module, args=("ui",), daemon=True).start()
     for _ in range(3):
         username = input("Username: ")
         password = input("Password: ")
@@ -58,6 +76,9 @@ def main():
             print("Username or password is incorrect.")
             continue
         # if username and password was correct
+        from ui import Ui
+
+        open_database()
         Ui.menu()
 
 
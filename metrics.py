@@ -0,0 +1,229 @@
+import contextvars
+import functools
+import inspect
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import Engine, event
+
+from models import Base
+
+# Timing of Shop operations and count of the SQL statements and rows of
+# each one. Off by default: a timed function then only checks a flag.
+# `enable` starts recording and hooks sqlalchemy events, `disable` stops
+# both.
+
+ENABLED = False
+# operations running in the current thread or task, outermost first;
+# a statement is counted in each of them
+_running = contextvars.ContextVar("running", default=())
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Latency histogram with buckets about 9% wide, from 1 microsecond."""
+
+    BASE = 2**0.125
+
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+
+    def add(self, seconds: float):
+        micros = seconds * 1e6
+        index = int(math.log(micros, self.BASE)) if micros > 1 else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound in seconds of the bucket of a percentile."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                break
+        return self.BASE ** (index + 1) / 1e6
+
+
+@dataclass
+class Operation:
+    """Figures of all calls of an operation."""
+
+    count: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    statements: int = 0
+    rows: int = 0
+    histogram: Histogram = field(default_factory=Histogram)
+
+    def to_dict(self) -> dict:
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 6),
+            "p50_ms": round(self.histogram.percentile(50) * 1000, 3),
+            "p95_ms": round(self.histogram.percentile(95) * 1000, 3),
+            "p99_ms": round(self.histogram.percentile(99) * 1000, 3),
+            "statements": self.statements,
+            "rows": self.rows,
+            "statements_per_call": round(self.statements / count, 2),
+            "rows_per_call": round(self.rows / count, 2),
+        }
+
+
+operations: dict[str, Operation] = {}
+
+
+class Call:
+    """Statements and rows of one running call."""
+
+    __slots__ = ("statements", "rows")
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+
+def _record(name: str, seconds: float, call: Call, failed: bool):
+    with _lock:
+        operation = operations.get(name)
+        if operation is None:
+            operation = operations[name] = Operation()
+        operation.count += 1
+        operation.errors += failed
+        operation.seconds += seconds
+        operation.statements += call.statements
+        operation.rows += call.rows
+        operation.histogram.add(seconds)
+
+
+def timed(function=None, *, name=None):
+    """Decorator that records the calls of a function when enabled.
+
+    A call that raises or returns False counts as an error. Generator
+    functions are timed while they produce items, not while the caller
+    consumes them.
+
+    Parameters
+    ----------
+    name: str
+        Name of the operation, default is the function name.
+    """
+    if function is None:
+        return functools.partial(timed, name=name)
+    name = name or function.__name__
+
+    if inspect.isgeneratorfunction(function):
+
+        @functools.wraps(function)
+        def generator(*args, **kwargs):
+            if not ENABLED:
+                yield from function(*args, **kwargs)
+                return
+            call, seconds, failed = Call(), 0.0, True
+            items = function(*args, **kwargs)
+            try:
+                while True:
+                    token = _running.set(_running.get() + (call,))
+                    start = time.perf_counter()
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        failed = False
+                        return
+                    finally:
+                        seconds += time.perf_counter() - start
+                        _running.reset(token)
+                    yield item
+            finally:
+                _record(name, seconds, call, failed)
+
+        return generator
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return function(*args, **kwargs)
+        call, failed = Call(), True
+        token = _running.set(_running.get() + (call,))
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+            failed = result is False
+            return result
+        finally:
+            _running.reset(token)
+            _record(name, time.perf_counter() - start, call, failed)
+
+    return wrapper
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    # rowcount is the number of changed rows, -1 for a select
+    rows = max(cursor.rowcount, 0)
+    for call in _running.get():
+        call.statements += 1
+        call.rows += rows
+
+
+def _on_load(target, context):
+    # one row read into an object
+    for call in _running.get():
+        call.rows += 1
+
+
+def enable():
+    """Start recording operations, statements and rows."""
+    global ENABLED
+    if ENABLED:
+        return
+    event.listen(Engine, "after_cursor_execute", _after_execute)
+    event.listen(Base, "load", _on_load, propagate=True)
+    ENABLED = True
+
+
+def disable():
+    """Stop recording, figures recorded so far are kept."""
+    global ENABLED
+    if not ENABLED:
+        return
+    ENABLED = False
+    event.remove(Engine, "after_cursor_execute", _after_execute)
+    event.remove(Base, "load", _on_load)
+
+
+def reset():
+    """Forget every figure recorded so far."""
+    with _lock:
+        operations.clear()
+
+
+def snapshot() -> dict:
+    """Figures of every operation as json.
+
+    Rows are rows changed by writes plus products and movements loaded
+    as objects; rows read by aggregates are not counted.
+
+    Returns
+    -------
+    outs: dict
+        Return whether recording is on and the figures of each operation,
+        slowest in total first.
+    """
+    with _lock:
+        figures = {name: op.to_dict() for name, op in operations.items()}
+    ranked = sorted(figures.items(), key=lambda item: -item[1]["seconds"])
+    return {"enabled": ENABLED, "operations": dict(ranked)}
+
+
+def dump(path: str):
+    """Write the snapshot to a json file."""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(snapshot(), file, indent=2)
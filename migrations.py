@@ -0,0 +1,269 @@
+import logging
+import sqlite3
+
+from sqlalchemy import Connection
+
+logger = logging.getLogger(__name__)
+
+# Schema revision of the database is kept in sqlite `user_version` pragma.
+# Every function in REVISIONS upgrades the schema by one step, so an old
+# shop.db is brought up to date by running the ones it has not seen yet.
+
+
+def _register_fold_name(connection: Connection):
+    """Make `models.fold_name` a sql function of the connection."""
+    from models import fold_name
+
+    connection.connection.dbapi_connection.create_function(
+        "fold_name", 1, fold_name, deterministic=True
+    )
+
+
+def _merge_duplicate_names(connection: Connection):
+    """Merge products whose names have the same folded key.
+
+    The oldest row of each name is kept, its quantity becomes the sum
+    of all duplicates and its price the price of the newest duplicate.
+    """
+    connection.exec_driver_sql(
+        """
+        UPDATE product SET
+            quantity = (
+                SELECT SUM(p.quantity) FROM product AS p
+                WHERE p.name_key = product.name_key
+            ),
+            price = (
+                SELECT p.price FROM product AS p
+                WHERE p.name_key = product.name_key
+                ORDER BY p.id DESC LIMIT 1
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM product WHERE name_key IS NOT NULL
+            GROUP BY name_key HAVING COUNT(*) > 1
+        )
+        """
+    )
+    result = connection.exec_driver_sql(
+        """
+        DELETE FROM product
+        WHERE name_key IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM product WHERE name_key IS NOT NULL
+            GROUP BY name_key
+        )
+        """
+    )
+    if result.rowcount:
+        logger.info(f"Merged {result.rowcount} duplicate products")
+
+
+def _columns(connection: Connection, table: str) -> set[str]:
+    rows = connection.exec_driver_sql(f"PRAGMA table_info({table})")
+    return {row[1] for row in rows}
+
+
+def _revision_1(connection: Connection):
+    """Name key column, the name folded in Python, with a unique index.
+
+    sqlite `lower` only folds ascii letters, so names like `Éclair` and
+    `éclair` would be different products. Products whose keys collide
+    are merged before the index is built.
+    """
+    # only needed to fill the keys, the index is on a plain column
+    _register_fold_name(connection)
+    if "name_key" not in _columns(connection, "product"):
+        connection.exec_driver_sql("ALTER TABLE product ADD COLUMN name_key TEXT")
+    connection.exec_driver_sql("UPDATE product SET name_key = fold_name(name)")
+    _merge_duplicate_names(connection)
+    connection.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_product_name_key ON product (name_key)"
+    )
+
+
+def _revision_2(connection: Connection):
+    """Indexes for sorting by name, price, quantity and total price.
+
+    A missing value sorts as an empty name or zero, so a keyset cursor
+    never holds a NULL, see `models.NAME_ORDER`.
+    """
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_product_name "
+        "ON product (coalesce(name_key, ''), id)",
+        "CREATE INDEX IF NOT EXISTS ix_product_price "
+        "ON product (coalesce(price, 0), id)",
+        "CREATE INDEX IF NOT EXISTS ix_product_quantity "
+        "ON product (coalesce(quantity, 0), id)",
+        "CREATE INDEX IF NOT EXISTS ix_product_total "
+        "ON product (coalesce(price * quantity, 0), id)",
+    ):
+        connection.exec_driver_sql(statement)
+
+
+def _revision_3(connection: Connection):
+    """Trigram full text index on product names kept in sync by triggers.
+
+    Trigram tokenizer needs sqlite 3.34, on older versions fuzzy search
+    is not available and this revision does nothing.
+    """
+    if sqlite3.sqlite_version_info < (3, 34):
+        logger.warning("sqlite is too old for trigram index, no fuzzy search")
+        return
+    for statement in (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+            name, content='product', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_fts_insert
+        AFTER INSERT ON product BEGIN
+            INSERT INTO product_fts (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_fts_delete
+        AFTER DELETE ON product BEGIN
+            INSERT INTO product_fts (product_fts, rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_fts_update
+        AFTER UPDATE OF name ON product BEGIN
+            INSERT INTO product_fts (product_fts, rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO product_fts (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        "INSERT INTO product_fts (product_fts) VALUES ('rebuild')",
+    ):
+        connection.exec_driver_sql(statement)
+
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _ledger_triggers() -> list[str]:
+    """Triggers appending every change of a product to the ledger and
+    keeping the running totals."""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS stock_movement_insert
+        AFTER INSERT ON product BEGIN
+            INSERT INTO stock_movement (
+                product_id, name, name_key, kind, delta, quantity, price,
+                created_at
+            )
+            VALUES (
+                new.id, new.name, new.name_key, 'insert',
+                ifnull(new.quantity, 0), new.quantity, new.price, {NOW}
+            );
+            UPDATE stock_totals SET
+                count = count + 1,
+                quantities = quantities + ifnull(new.quantity, 0),
+                capital = capital + ifnull(new.quantity * new.price, 0)
+            WHERE id = 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS stock_movement_update
+        AFTER UPDATE OF name, quantity, price ON product
+        WHEN old.name IS NOT new.name
+            OR old.quantity IS NOT new.quantity
+            OR old.price IS NOT new.price
+        BEGIN
+            INSERT INTO stock_movement (
+                product_id, name, name_key, kind, delta, quantity, price,
+                created_at
+            )
+            VALUES (
+                new.id, new.name, new.name_key, 'update',
+                ifnull(new.quantity, 0) - ifnull(old.quantity, 0),
+                new.quantity, new.price, {NOW}
+            );
+            UPDATE stock_totals SET
+                quantities = quantities
+                    + ifnull(new.quantity, 0) - ifnull(old.quantity, 0),
+                capital = capital
+                    + ifnull(new.quantity * new.price, 0)
+                    - ifnull(old.quantity * old.price, 0)
+            WHERE id = 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS stock_movement_delete
+        AFTER DELETE ON product BEGIN
+            INSERT INTO stock_movement (
+                product_id, name, name_key, kind, delta, quantity, price,
+                created_at
+            )
+            VALUES (
+                old.id, old.name, old.name_key, 'delete',
+                -ifnull(old.quantity, 0), 0, old.price, {NOW}
+            );
+            UPDATE stock_totals SET
+                count = count - 1,
+                quantities = quantities - ifnull(old.quantity, 0),
+                capital = capital - ifnull(old.quantity * old.price, 0)
+            WHERE id = 1;
+        END
+        """,
+    ]
+
+
+def _revision_4(connection: Connection):
+    """Stock movement ledger and running totals kept by triggers.
+
+    Tables are created from the models before the upgrade. Current
+    totals are computed once and the current stock is saved as the
+    first snapshot, so history can be rebuilt from this point on.
+    """
+    for statement in _ledger_triggers() + [
+        """
+        INSERT OR REPLACE INTO stock_totals (id, count, quantities, capital)
+        SELECT 1, count(*), ifnull(sum(quantity), 0),
+            ifnull(sum(quantity * price), 0)
+        FROM product
+        """,
+        f"""
+        INSERT INTO stock_snapshot (movement_id, created_at)
+        SELECT ifnull(max(id), 0), {NOW} FROM stock_movement
+        """,
+        """
+        INSERT INTO stock_snapshot_item
+            (snapshot_id, product_id, name, quantity, price)
+        SELECT (SELECT max(id) FROM stock_snapshot), id, name, quantity, price
+        FROM product
+        """,
+    ]:
+        connection.exec_driver_sql(statement)
+
+
+REVISIONS = [
+    _revision_1,
+    _revision_2,
+    _revision_3,
+    _revision_4,
+]
+SCHEMA_VERSION = len(REVISIONS)
+
+
+def upgrade(connection: Connection) -> int:
+    """Run revisions the database has not seen yet.
+
+    Parameters
+    ----------
+    connection: Connection
+        Connection inside a transaction, revisions are applied atomically.
+
+    Returns
+    -------
+    outs: int
+        Return the schema version of the database after upgrade.
+    """
+    version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    for number in range(version, SCHEMA_VERSION):
+        REVISIONS[number](connection)
+        logger.info(f"Database upgraded to schema version {number + 1}")
+    if version != SCHEMA_VERSION:
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return SCHEMA_VERSION
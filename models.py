@@ -1,10 +1,32 @@
-from sqlalchemy import create_engine
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import quote
+
+from sqlalchemy import URL, Engine, create_engine, event, func, literal_column, text
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Index, Integer, String
+
+from migrations import SCHEMA_VERSION, upgrade
 
 Base = declarative_base()
 
 
+def fold_name(name: str | None) -> str | None:
+    """Key of a product name, the same for every letter case.
+
+    Folded in Python, like every name compared in Python, as the sqlite
+    `lower` function only folds ascii letters.
+    """
+    return None if name is None else name.lower()
+
+
+def _name_key(context) -> str | None:
+    # default of `name_key`, from the name given to the insert
+    return fold_name(context.get_current_parameters().get("name"))
+
+
 class Product(Base):
     """Product model."""
 
@@ -12,6 +34,9 @@ class Product(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
+    # folded name, set on insert; a name is only ever replaced by one
+    # with the same key
+    name_key = Column(String, default=_name_key)
     quantity = Column(Integer)
     price = Column(Integer)
 
@@ -19,10 +44,273 @@ class Product(Base):
         s = "Product(id={}, name={}, quantity={}, Price={})"
         return s.format(self.id, self.name, self.quantity, self.price)
 
+    def to_dict(self) -> dict:
+        """Product as a json object."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "quantity": self.quantity,
+            "price": self.price,
+        }
+
+
+# names are unique regardless of letter case
+Index("ix_product_name_key", Product.name_key, unique=True)
+# Sort keys of the product list. A missing value sorts as an empty
+# name or zero, so every key can be sent back as a keyset cursor. The
+# defaults are literal, sqlite only uses an index on an expression for
+# the very same expression.
+NAME_ORDER = func.coalesce(Product.name_key, literal_column("''"))
+PRICE_ORDER = func.coalesce(Product.price, literal_column("0"))
+QUANTITY_ORDER = func.coalesce(Product.quantity, literal_column("0"))
+TOTAL_ORDER = func.coalesce(Product.price * Product.quantity, literal_column("0"))
+
+# sort keys followed by id, so they give a unique order for paging
+Index("ix_product_name", NAME_ORDER, Product.id)
+Index("ix_product_price", PRICE_ORDER, Product.id)
+Index("ix_product_quantity", QUANTITY_ORDER, Product.id)
+Index("ix_product_total", TOTAL_ORDER, Product.id)
+
+# utc time with milliseconds, set by sqlite
+NOW = text("(strftime('%Y-%m-%d %H:%M:%f', 'now'))")
+
+
+class StockMovement(Base):
+    """
+    Change of a product, appended by triggers on every insert,
+    update and delete of a product, so no write can skip it.
+    """
+
+    __tablename__ = "stock_movement"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer)
+    name = Column(String)
+    name_key = Column(String)
+    # insert, update or delete
+    kind = Column(String)
+    # change of quantity, negative for sales and removals
+    delta = Column(Integer)
+    # quantity and price after the change
+    quantity = Column(Integer)
+    price = Column(Integer)
+    created_at = Column(DateTime, server_default=NOW)
+
+    def __repr__(self) -> str:
+        s = "StockMovement(id={}, name={}, kind={}, delta={}, created_at={})"
+        return s.format(self.id, self.name, self.kind, self.delta, self.created_at)
+
+    def to_dict(self) -> dict:
+        """Movement as a json object."""
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "name": self.name,
+            "kind": self.kind,
+            "delta": self.delta,
+            "quantity": self.quantity,
+            "price": self.price,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+Index("ix_stock_movement_name_key", StockMovement.name_key, StockMovement.id)
+Index("ix_stock_movement_created_at", StockMovement.created_at)
+
+
+class StockTotals(Base):
+    """
+    Single row of running totals of the product table,
+    kept up to date by the same triggers as the ledger.
+    """
+
+    __tablename__ = "stock_totals"
+
+    id = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+    quantities = Column(Integer, default=0)
+    capital = Column(Integer, default=0)
+
+
+class StockSnapshot(Base):
+    """Copy of the stock taken after the movement `movement_id`."""
+
+    __tablename__ = "stock_snapshot"
+
+    id = Column(Integer, primary_key=True)
+    movement_id = Column(Integer)
+    created_at = Column(DateTime, server_default=NOW)
+
+
+Index("ix_stock_snapshot_created_at", StockSnapshot.created_at)
+
+
+class StockSnapshotItem(Base):
+    """Product as it was when the snapshot was taken."""
+
+    __tablename__ = "stock_snapshot_item"
+
+    snapshot_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    name = Column(String)
+    quantity = Column(Integer)
+    price = Column(Integer)
+
+
+# default path of the database
+DATABASE = "shop.db"
+# applied on every new connection; WAL lets readers work while one writes
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    # negative size is in KiB
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+# created by `configure`, or with the defaults on first use
+engine: Engine | None = None
+_engine_lock = threading.Lock()
+# a new session per unit of work, bound to the engine of the moment;
+# objects stay readable after commit
+Session = sessionmaker(expire_on_commit=False)
+
+
+def apply_pragmas(dbapi_connection, pragmas: dict):
+    """Set pragmas on a new sqlite connection."""
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def configure(path=DATABASE, pool_size=5, pragmas=None, echo=False) -> Engine:
+    """Create the engine, then create and upgrade the database schema.
+
+    Calling it again replaces the engine, e.g. to use another database.
+    Every unit of work started afterwards, in any thread, runs on the
+    new engine, see `session_scope`.
+
+    Parameters
+    ----------
+    path: str
+        Path of the sqlite database file.
+    pool_size: int
+        Number of connections kept open by the pool.
+    pragmas: dict
+        Pragmas set on every connection, merged over `PRAGMAS`.
+    echo: bool
+        Log every statement.
+
+    Returns
+    -------
+    outs: Engine
+        Return the new engine.
+    """
+    global engine
+    if engine is not None:
+        engine.dispose()
+    # published once the schema is ready
+    engine = open_engine(path, pool_size, pragmas, echo)
+    return engine
+
+
+def open_engine(
+    path=DATABASE, pool_size=5, pragmas=None, echo=False, readonly=False
+) -> Engine:
+    """Create an engine of a database with a ready schema, without making
+    it the engine of `session_scope`; see `configure` for the parameters.
+
+    A read-only engine opens an existing database whose schema is up to
+    date, it never creates or upgrades one.
+
+    Raises
+    ------
+    FileNotFoundError
+        If a read-only database does not exist.
+    ValueError
+        If a read-only database has another schema version.
+    """
+    # built from its parts, a path is never parsed as a query string
+    url = URL.create("sqlite", database=str(path))
+    pragmas = {**PRAGMAS, **(pragmas or {})}
+    if readonly:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No database {path}")
+        url = URL.create(
+            "sqlite",
+            database=f"file:{quote(str(path))}",
+            query={"mode": "ro", "uri": "true"},
+        )
+        # kept in the file, only a writer can change it
+        pragmas.pop("journal_mode", None)
+    new = create_engine(url, pool_size=pool_size, echo=echo)
+
+    @event.listens_for(new, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    with new.begin() as connection:
+        if not readonly:
+            create_schema(connection)
+        else:
+            version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+            if version != SCHEMA_VERSION:
+                new.dispose()
+                raise ValueError(
+                    f"{path} has schema version {version}, not {SCHEMA_VERSION}"
+                )
+    return new
+
+
+def get_engine() -> Engine:
+    """Engine of the database, configured with the defaults on first use."""
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                configure()
+    return engine
+
+
+def create_schema(connection):
+    """Create missing tables and upgrade the schema to the last revision.
+
+    A database whose `user_version` is already `SCHEMA_VERSION` is up to
+    date and costs one pragma read, so every change of the models must
+    come with a revision in migrations.
+    """
+    version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    if version == SCHEMA_VERSION:
+        return
+    Base.metadata.create_all(connection)
+    upgrade(connection)
+
+
+@contextmanager
+def session_scope(sessions=None) -> Iterator:
+    """Unit of work on a new session of the current engine.
+
+    Commit when the block ends, roll back and re-raise if it fails, so
+    an error never leaves the session in a broken state. The session is
+    closed at the end, giving its connection back to the pool; loaded
+    objects stay readable.
 
-# create connection
-engine = create_engine("sqlite:///shop.db")
-Session = sessionmaker(bind=engine)
-session = Session()
-# create database
-Base.metadata.create_all(engine)
+    Parameters
+    ----------
+    sessions: sessionmaker
+        Session factory of another engine, default is `Session` bound to
+        `get_engine()`.
+    """
+    if sessions is None:
+        session = Session(bind=get_engine())
+    else:
+        session = sessions()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,507 @@
+import operator
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from enum import Enum
+from functools import cache
+from typing import Any, Generator, NamedTuple
+
+from sqlalchemy import (
+    Select,
+    TextClause,
+    and_,
+    bindparam,
+    case,
+    func,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Product as ProductModel
+from models import (
+    NAME_ORDER,
+    PRICE_ORDER,
+    QUANTITY_ORDER,
+    TOTAL_ORDER,
+    StockTotals,
+    fold_name,
+)
+
+# Statements and result types shared by Shop and AsyncShop, so both
+# build exactly the same SQL.
+
+
+class Merge(Enum):
+    """
+    How to save a product whose name already exists
+    """
+
+    ADD = "add"
+    REPLACE = "replace"
+    KEEP = "keep"
+
+
+class Order(Enum):
+    """
+    Keys products can be listed by
+    """
+
+    ID = "id"
+    NAME = "name"
+    PRICE = "price"
+    QUANTITY = "quantity"
+    TOTAL = "total"
+
+
+class Direction(Enum):
+    """
+    Directions products can be sorted in
+    """
+
+    ASC = "asc"
+    DEC = "dec"
+
+
+def order_columns(order: Order) -> list:
+    """Columns of the index that gives a unique order for the key.
+
+    Keys that are not unique are followed by the id, so the pair can be
+    used as keyset cursor.
+    """
+    if order is Order.ID:
+        return [ProductModel.id]
+    if order is Order.NAME:
+        return [NAME_ORDER, ProductModel.id]
+    if order is Order.PRICE:
+        return [PRICE_ORDER, ProductModel.id]
+    if order is Order.QUANTITY:
+        return [QUANTITY_ORDER, ProductModel.id]
+    return [TOTAL_ORDER, ProductModel.id]
+
+
+def seek(columns: list, cursor: tuple, ascending: bool):
+    """Condition for the products that come after the cursor.
+
+    A pair of columns is compared as `key >= ? AND (key > ? OR id > ?)`
+    rather than a row value, so sqlite can seek the index on the key.
+    """
+    key, value = columns[0], cursor[0]
+    if len(columns) == 1:
+        return key > value if ascending else key < value
+    id_, id_value = columns[1], cursor[1]
+    if ascending:
+        return and_(key >= value, or_(key > value, id_ > id_value))
+    return and_(key <= value, or_(key < value, id_ < id_value))
+
+
+@cache
+def upsert_statement(merge: Merge):
+    """Insert statement that merges into an existing product of the name.
+
+    Values are given as parameters on execution, so the statement is
+    built and compiled once per merge mode.
+    """
+    stmt = insert(ProductModel.__table__)
+    excluded = stmt.excluded
+    if merge is Merge.KEEP:
+        return stmt.on_conflict_do_nothing(index_elements=[ProductModel.name_key])
+    if merge is Merge.ADD:
+        values = {
+            "quantity": ProductModel.quantity + excluded.quantity,
+            "price": excluded.price,
+        }
+    else:
+        values = {
+            "name": excluded.name,
+            "quantity": excluded.quantity,
+            "price": excluded.price,
+        }
+    return stmt.on_conflict_do_update(
+        index_elements=[ProductModel.name_key], set_=values
+    )
+
+
+@cache
+def adjust_statement():
+    """Update that adds `delta` to the quantity of a product.
+
+    The product is matched by `key`, its folded name. The quantity
+    is changed in the row itself, so concurrent adjustments can't
+    overwrite each other, and a delta that would make it negative
+    matches no row.
+    """
+    table = ProductModel.__table__
+    quantity = table.c.quantity + bindparam("delta")
+    return (
+        update(table)
+        .where(table.c.name_key == bindparam("key"))
+        .where(quantity >= 0)
+        .values(quantity=quantity)
+    )
+
+
+@dataclass
+class Page:
+    """A page of products and the keyset cursors around it."""
+
+    products: list[ProductModel]
+    # sort key of the first and the last product of the page
+    first: tuple | None = None
+    last: tuple | None = None
+
+
+def page_statement(
+    order: Order, direction: Direction, after, before, limit: int
+) -> Select:
+    """Select a page of products with the keys of their order.
+
+    Parameters
+    ----------
+    after: tuple
+        Cursor of the product before the page, or None.
+    before: tuple
+        Cursor of the product after the page, or None. The page is then
+        selected in reverse order, see `make_page`.
+    """
+    columns = order_columns(order)
+    # walking backwards through an ascending list is walking forwards
+    # through the descending one, and the other way around
+    ascending = (direction is Direction.ASC) == (before is None)
+    cursor = before if before is not None else after
+    stmt = select(ProductModel, *columns)
+    if cursor is not None:
+        stmt = stmt.where(seek(columns, cursor, ascending))
+    if ascending:
+        stmt = stmt.order_by(*columns)
+    else:
+        stmt = stmt.order_by(*(column.desc() for column in columns))
+    return stmt.limit(limit)
+
+
+def make_page(rows: list, before=None) -> Page:
+    """Build a page from the rows of `page_statement`."""
+    if before is not None:
+        rows.reverse()
+    if not rows:
+        return Page([])
+    products = [row[0] for row in rows]
+    return Page(products, tuple(rows[0][1:]), tuple(rows[-1][1:]))
+
+
+@dataclass
+class Summary:
+    """Aggregated figures of a set of products."""
+
+    count: int = 0
+    quantities: int = 0
+    capital: int = 0
+    min_price: int | None = None
+    max_price: int | None = None
+
+
+def totals_statement() -> Select:
+    """Select the `Summary` of all products without scanning them.
+
+    Count, quantities and capital come from the running totals and the
+    price range from both ends of the price index.
+    """
+    # products without a price have none in the range
+    priced = select(ProductModel.price).where(ProductModel.price.is_not(None))
+    return select(
+        StockTotals.count,
+        StockTotals.quantities,
+        StockTotals.capital,
+        priced.order_by(PRICE_ORDER).limit(1).scalar_subquery(),
+        priced.order_by(PRICE_ORDER.desc()).limit(1).scalar_subquery(),
+    ).where(StockTotals.id == 1)
+
+
+def aggregate_columns(criterion=None) -> tuple:
+    """Build the aggregate columns that make a `Summary`.
+
+    Parameters
+    ----------
+    criterion:
+        Optional SQL expression. When given, only rows matching it are
+        counted, so several of these column sets can share one SELECT.
+
+    Returns
+    -------
+    outs: tuple
+        count, sum of quantities, sum of line totals, min and max price.
+    """
+    count = func.count()
+    quantity = ProductModel.quantity
+    price = ProductModel.price
+    line_total = ProductModel.price * ProductModel.quantity
+    if criterion is not None:
+        count = func.count(case((criterion, 1)))
+        quantity = case((criterion, quantity))
+        price = case((criterion, price))
+        line_total = case((criterion, line_total))
+    return (
+        count,
+        func.coalesce(func.sum(quantity), 0),
+        func.coalesce(func.sum(line_total), 0),
+        func.min(price),
+        func.max(price),
+    )
+
+
+class Criterion(NamedTuple):
+    """Condition on a product that every backend can test, e.g.
+    `Criterion("price", ">", 100)` or a plain `("price", ">", 100)`.
+
+    `field` is a key of `FIELDS` and `op` one of `OPERATORS`. The value
+    of `in` is a list and that of `between` a pair of bounds, both
+    included. Names are compared by their folded key, so `==` and
+    `startswith` ignore letter case.
+    """
+
+    field: str
+    op: str
+    value: Any
+
+
+FIELDS = {
+    "id": ProductModel.id,
+    "name": ProductModel.name_key,
+    "quantity": ProductModel.quantity,
+    "price": ProductModel.price,
+    "total": ProductModel.price * ProductModel.quantity,
+}
+# operators that are the same function on columns and on values
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+OPERATORS = (*COMPARISONS, "in", "between", "startswith")
+
+
+def make_criterion(criterion: tuple) -> Criterion:
+    """Check a criterion given as a tuple and fold the names it holds.
+
+    Raises
+    ------
+    ValueError
+        If the field or operator is unknown.
+    """
+    field, op, value = criterion
+    if field not in FIELDS:
+        raise ValueError(f"Unknown field {field!r}, expected one of {list(FIELDS)}")
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator {op!r}, expected one of {OPERATORS}")
+    if field == "name":
+        if op in ("in", "between"):
+            value = [fold_name(item) for item in value]
+        else:
+            value = fold_name(value)
+    return Criterion(field, op, value)
+
+
+def criterion_clause(criterion):
+    """SQL expression of a criterion, SQL expressions are kept as they are.
+
+    Returns
+    -------
+    outs: ColumnElement
+        Return a condition for the WHERE clause, see `Criterion`.
+    """
+    if not isinstance(criterion, tuple):
+        return criterion
+    field, op, value = make_criterion(criterion)
+    column = FIELDS[field]
+    if op == "in":
+        return column.in_(value)
+    if op == "between":
+        return column.between(*value)
+    if op == "startswith":
+        return column.startswith(value, autoescape=True)
+    return COMPARISONS[op](column, value)
+
+
+def prefix_statement(prefix: str, limit: int) -> Select:
+    """Select products whose name starts with the prefix.
+
+    The prefix is turned into a range on the name key index,
+    `prefix <= name_key < next prefix`, so matches come in name key
+    order.
+    """
+    prefix = prefix.lower()
+    key = ProductModel.name_key
+    # the first string after every string starting with prefix
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    stmt = select(ProductModel).where(key >= prefix, key < upper)
+    return stmt.order_by(key).limit(limit)
+
+
+# A fuzzy search asks the full text index for products having all of a
+# few rare trigrams of the name, unranked so sqlite stops at the limit.
+# If that finds too few, it retries without the trigrams of a short run
+# of the name, where a typo most likely is. Candidates are ranked by
+# `rank_by_similarity` afterwards.
+
+# products counted per trigram, beyond it a trigram is just common
+TRIGRAM_CAP = 50
+# rarest trigrams of the name a full text query asks for
+TRIGRAM_TERMS = 4
+# longest run of trigrams left out when retrying
+TYPO_WIDTH = 4
+# full text queries of a fuzzy search, besides counting the trigrams
+FUZZY_QUERIES = 10
+# rarest trigrams searched alone when no query found anything
+FUZZY_FALLBACK = 3
+
+FUZZY_STATEMENT = text(
+    "SELECT rowid FROM product_fts WHERE product_fts MATCH :match LIMIT :limit"
+)
+
+
+def name_trigrams(name: str) -> list[str]:
+    """Trigrams of the lowercased name, in order, with repeats."""
+    name = name.lower()
+    return [name[i : i + 3] for i in range(len(name) - 2)]
+
+
+def _quote(trigram: str) -> str:
+    return '"{}"'.format(trigram.replace('"', '""'))
+
+
+@cache
+def _counts_statement(size: int) -> TextClause:
+    counts = ", ".join(
+        f"(SELECT count(*) FROM (SELECT 1 FROM product_fts "
+        f"WHERE product_fts MATCH :t{i} LIMIT :cap))"
+        for i in range(size)
+    )
+    return text(f"SELECT {counts}")
+
+
+def trigram_counts(trigrams: list[str]) -> tuple[TextClause, dict]:
+    """Statement counting the products of each trigram, at most
+    `TRIGRAM_CAP`, in one round trip.
+
+    Returns
+    -------
+    outs: tuple[TextClause, dict]
+        Return the statement and its parameters, the row has a count
+        per trigram in the same order.
+    """
+    params = {f"t{i}": _quote(trigram) for i, trigram in enumerate(trigrams)}
+    return _counts_statement(len(trigrams)), {**params, "cap": TRIGRAM_CAP}
+
+
+def fuzzy_matches(trigrams: list[str], counts: dict[str, int]) -> list[list[str]]:
+    """Full text queries finding the candidates of a fuzzy search.
+
+    Parameters
+    ----------
+    trigrams: list[str]
+        Trigrams of the name, see `name_trigrams`.
+    counts: dict[str, int]
+        Products of each trigram, see `trigram_counts`.
+
+    Returns
+    -------
+    outs: list[list[str]]
+        Return the queries in stages: run the queries of a stage in
+        order until there are enough candidates, and the next stage
+        only if there are none.
+    """
+    present = {trigram for trigram in trigrams if counts[trigram]}
+    absent = [i for i, trigram in enumerate(trigrams) if trigram not in present]
+    # a candidate shares at least half the trigrams of the name
+    minimum = max((len(set(trigrams)) + 1) // 2, 1)
+
+    def rarest(kept):
+        return sorted(kept, key=lambda trigram: (counts[trigram], trigram))
+
+    def skipped(run):
+        start, width = run
+        missed = sum(not start <= i < start + width for i in absent)
+        rare = min(counts[trigrams[i]] for i in range(start, start + width))
+        return missed, width, rare
+
+    runs = [
+        (start, width)
+        for width in range(1, TYPO_WIDTH + 1)
+        for start in range(len(trigrams) - width + 1)
+    ]
+    matches, seen = [], set()
+    for start, width in [(0, 0)] + sorted(runs, key=skipped):
+        kept = present.intersection(trigrams[:start] + trigrams[start + width :])
+        if len(kept) < minimum:
+            continue
+        terms = tuple(rarest(kept)[:TRIGRAM_TERMS])
+        if terms not in seen:
+            seen.add(terms)
+            matches.append(" AND ".join(map(_quote, terms)))
+        if len(matches) == FUZZY_QUERIES:
+            break
+    fallback = [_quote(trigram) for trigram in rarest(present)[:FUZZY_FALLBACK]]
+    return [matches, fallback]
+
+
+def fuzzy_candidates(
+    name: str, limit: int
+) -> Generator[tuple[TextClause, dict], list, list[int]]:
+    """Plan of a fuzzy search, the ids of the candidates to rank.
+
+    Counts the products of each trigram of the name, then runs the
+    queries of `fuzzy_matches` until there are enough candidates. The
+    plan does no I/O: every statement and its parameters are yielded
+    and the caller sends back the rows, so sync and async sessions run
+    the same plan, e.g.
+
+        plan = fuzzy_candidates(name, limit)
+        try:
+            rows = session.execute(*next(plan)).all()
+            while True:
+                rows = session.execute(*plan.send(rows)).all()
+        except StopIteration as stop:
+            ids = stop.value
+
+    Returns
+    -------
+    outs: list[int]
+        Return at most `5 * limit` product ids, without repeats.
+    """
+    trigrams = name_trigrams(name)
+    if not trigrams:
+        return []
+    distinct = list(dict.fromkeys(trigrams))
+    rows = yield trigram_counts(distinct)
+    counts = dict(zip(distinct, rows[0]))
+    wanted, ids = limit * 5, {}
+    for stage in fuzzy_matches(trigrams, counts):
+        for match in stage:
+            if len(ids) >= wanted:
+                break
+            params = {"match": match, "limit": wanted - len(ids)}
+            rows = yield FUZZY_STATEMENT, params
+            ids.update(dict.fromkeys(row[0] for row in rows))
+        if ids:
+            break
+    return list(ids)
+
+
+def rank_by_similarity(name: str, products, limit: int) -> list:
+    """Sort products by similarity of their name to the name.
+
+    Returns
+    -------
+    outs: list[Product]
+        Return the `limit` most similar products, most similar first.
+    """
+    name = name.lower()
+
+    def similarity(product):
+        return SequenceMatcher(None, name, product.name.lower()).ratio()
+
+    return sorted(products, key=similarity, reverse=True)[:limit]
@@ -0,0 +1,142 @@
+import shutil
+import sys
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+# Text tables for the terminal. Rows are formatted a chunk at a time
+# into one string and written at once, instead of a print per row, and
+# output longer than the screen goes through a pager.
+
+# move the cursor home and clear the screen and its scrollback
+CLEAR = "\x1b[H\x1b[2J\x1b[3J"
+# rows formatted per write
+CHUNK_SIZE = 1000
+PROMPT = "-- more -- Enter: next page, q: quit "
+
+
+@dataclass
+class Column:
+    """A column of a table."""
+
+    title: str
+    # "<" aligns left, ">" right
+    align: str = "<"
+    # written after every cell, e.g. a currency sign
+    suffix: str = ""
+
+
+def clear_screen(out: TextIO = None):
+    """Clear the terminal with escape codes, no shell is started."""
+    out = out or sys.stdout
+    out.write(CLEAR)
+    out.flush()
+
+
+def widths(columns: list[Column], rows: list[tuple]) -> list[int]:
+    """Width of each column, enough for its title and its cells."""
+    sizes = [len(column.title) for column in columns]
+    for row in rows:
+        for index, cell in enumerate(row):
+            size = len(str(cell))
+            if size > sizes[index]:
+                sizes[index] = size
+    return sizes
+
+
+def row_format(columns: list[Column], sizes: list[int]) -> str:
+    """%-format string of a row, cells separated by two spaces."""
+    cells = []
+    for column, size in zip(columns, sizes):
+        cell = f"%-{size}s" if column.align == "<" else f"%{size}s"
+        cells.append(cell + column.suffix)
+    return "  ".join(cells)
+
+
+def table(
+    columns: list[Column], rows: Iterable[tuple], footer=None, chunk_size=CHUNK_SIZE
+) -> Iterator[str]:
+    """Format rows as a table, a block of text per chunk of rows.
+
+    Widths are computed from the first chunk, so rows are streamed and
+    never all held in memory; a wider cell further down pushes the rest
+    of its row to the right.
+
+    Parameters
+    ----------
+    columns: list[Column]
+        Title, alignment and suffix of each column.
+    rows: Iterable[tuple]
+        One value per column.
+    footer: tuple
+        Row written below the table, e.g. totals.
+
+    Yields
+    ------
+    outs: str
+        Header, chunks of rows and footer, each ending with a new line.
+    """
+    rows = iter(rows)
+    chunk = list(islice(rows, chunk_size))
+    sizes = widths(columns, chunk + ([footer] if footer else []))
+    fmt = row_format(columns, sizes)
+    titles = [column.title for column in columns]
+    header = sparse_row(columns, sizes, titles, suffix=False)
+    dashes = "-" * len(header)
+    yield f"{header}\n{dashes}\n"
+    while chunk:
+        yield "\n".join([fmt % row for row in chunk]) + "\n"
+        chunk = list(islice(rows, chunk_size))
+    yield f"{dashes}\n" + (sparse_row(columns, sizes, footer) + "\n" if footer else "")
+
+
+def sparse_row(columns: list[Column], sizes: list[int], row, suffix=True) -> str:
+    """Format a row aligned with the others, empty cells get no suffix.
+
+    Used for the titles, with `suffix` False, and the footer.
+    """
+    cells = []
+    for column, size, cell in zip(columns, sizes, row):
+        cell = str(cell)
+        text = cell.ljust(size) if column.align == "<" else cell.rjust(size)
+        end = column.suffix if suffix and cell else " " * len(column.suffix)
+        cells.append(text + end)
+    return "  ".join(cells)
+
+
+def page(blocks: Iterable[str], out: TextIO = None, height=None):
+    """Write text a screen at a time, waiting for Enter between screens.
+
+    Parameters
+    ----------
+    blocks: Iterable[str]
+        Text to write, e.g. the blocks of `table`.
+    height: int
+        Lines per screen, default is the terminal height.
+    """
+    out = out or sys.stdout
+    height = height or shutil.get_terminal_size().lines - 1
+    shown = 0
+    for block in blocks:
+        lines = block.splitlines(keepends=True)
+        while lines:
+            screen, lines = lines[: height - shown], lines[height - shown :]
+            out.write("".join(screen))
+            shown += len(screen)
+            if shown == height:
+                out.flush()
+                if input(PROMPT).strip().lower() == "q":
+                    return
+                shown = 0
+    out.flush()
+
+
+def show(blocks: Iterable[str], out: TextIO = None):
+    """Write text through the pager if the output is a terminal."""
+    out = out or sys.stdout
+    if out.isatty():
+        page(blocks, out)
+        return
+    for block in blocks:
+        out.write(block)
+    out.flush()
@@ -0,0 +1,332 @@
+import argparse
+import http.client
+import json
+import logging
+from concurrent.futures import Future
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import metrics
+import models
+from models import Product
+from queries import Direction, Merge, Order
+from shop import Shop
+
+# Serve the Shop operations as json over http on the local machine.
+# Connections are kept alive (HTTP/1.1), requests sent back to back on one
+# connection are answered in order, and /batch runs many operations in a
+# single request:
+#
+#   GET    /products?order=name&direction=asc&after=[...]&limit=20
+#   GET    /products/<name>
+#   POST   /products             {"name", "quantity", "price", "merge"}
+#   DELETE /products/<name>
+#   POST   /products/<name>/adjust {"delta"}
+#   POST   /adjust               {"deltas": {<name>: <delta>, ...}}
+#   GET    /find?name=<text>&limit=10
+#   GET    /summary
+#   GET    /stats                cache counters, and timings with --stats
+#   POST   /batch                {"operations": [{"op": "get", ...}, ...]}
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+def product_json(product: Product | None) -> dict | None:
+    """Product as a json object."""
+    return None if product is None else product.to_dict()
+
+
+def outcome(result) -> bool:
+    """Result of a write, waiting for it in write behind mode."""
+    return result.result() if isinstance(result, Future) else result
+
+
+def op_get(name: str) -> dict:
+    return {"product": product_json(Shop.get(name))}
+
+
+def op_save(name: str, quantity=0, price=0, merge=None) -> dict:
+    merge = Merge(merge) if merge else None
+    return {"ok": outcome(Shop.save(name, int(quantity), int(price), merge))}
+
+
+def op_remove(name: str) -> dict:
+    return {"ok": outcome(Shop.remove(name))}
+
+
+def op_adjust(name: str, delta) -> dict:
+    return {"ok": outcome(Shop.adjust_stock(name, int(delta)))}
+
+
+def op_adjust_many(deltas: dict) -> dict:
+    return {"ok": outcome(Shop.adjust_many(deltas))}
+
+
+def op_find(name: str, limit=None) -> dict:
+    products = Shop.find(name, int(limit) if limit else None)
+    return {"products": [product_json(product) for product in products]}
+
+
+def op_page(order="id", direction="asc", after=None, before=None, limit=None):
+    page = Shop.page(
+        Order(order),
+        Direction(direction),
+        tuple(after) if after else None,
+        tuple(before) if before else None,
+        int(limit) if limit else None,
+    )
+    return {
+        "products": [product_json(product) for product in page.products],
+        "first": page.first,
+        "last": page.last,
+    }
+
+
+def op_summary() -> dict:
+    return asdict(Shop.summary())
+
+
+def op_stats() -> dict:
+    return {**metrics.snapshot(), "caches": Shop.cache_stats()}
+
+
+OPERATIONS = {
+    "get": op_get,
+    "save": op_save,
+    "remove": op_remove,
+    "adjust": op_adjust,
+    "adjust_many": op_adjust_many,
+    "find": op_find,
+    "page": op_page,
+    "summary": op_summary,
+    "stats": op_stats,
+}
+
+
+def apply(operation: dict) -> dict:
+    """Run one operation of a batch.
+
+    Parameters
+    ----------
+    operation: dict
+        Name of the operation in `op` and its arguments,
+        e.g. `{"op": "save", "name": "pen", "quantity": 2, "price": 5}`.
+
+    Returns
+    -------
+    outs: dict
+        Return the result of the operation, or `error` if it is invalid.
+    """
+    try:
+        arguments = dict(operation)
+        function = OPERATIONS[arguments.pop("op")]
+        return function(**arguments)
+    except KeyError as e:
+        return {"error": f"unknown or missing operation {e}"}
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}
+    except Exception as e:
+        fields = {"operation": operation.get("op")}
+        logging.error(f"Error on batch operation {e}", extra=fields)
+        return {"error": str(e)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Map http requests to Shop operations."""
+
+    # keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # headers and body are written apart, don't let small replies wait
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method: str):
+        url = urlsplit(self.path)
+        # names are quoted by the client, e.g. "ice%20cream"
+        path = [unquote(part) for part in url.path.split("/") if part]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            body = self.read_body()
+            status, payload = self.route(method, path, params, body)
+        except (KeyError, TypeError, ValueError) as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            # e.g. a locked database, the client still gets an answer
+            fields = {"operation": f"{method} {url.path}"}
+            logging.error(f"Error on request {e}", extra=fields)
+            status, payload = 500, {"error": str(e)}
+        self.send_json(status, payload)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def route(self, method: str, path: list, params: dict, body) -> tuple:
+        """Find the operation of a request and run it.
+
+        Returns
+        -------
+        outs: tuple[int, dict]
+            Return http status and json payload.
+        """
+        resource, name, action = (path + [None, None, None])[:3]
+        if resource == "products" and name is None:
+            if method == "GET":
+                for key in ("after", "before"):
+                    if key in params:
+                        params[key] = json.loads(params[key])
+                return 200, op_page(**params)
+            if method == "POST":
+                return 200, op_save(**body)
+        elif resource == "products" and action == "adjust" and method == "POST":
+            result = op_adjust(name, **body)
+            return (200 if result["ok"] else 409), result
+        elif resource == "products" and action is not None:
+            return 404, {"error": f"no such resource {self.path}"}
+        elif resource == "products" and method == "GET":
+            result = op_get(name)
+            return (200 if result["product"] else 404), result
+        elif resource == "products" and method == "DELETE":
+            result = op_remove(name)
+            return (200 if result["ok"] else 404), result
+        elif resource == "adjust" and method == "POST":
+            result = op_adjust_many(**body)
+            return (200 if result["ok"] else 409), result
+        elif resource == "find" and method == "GET":
+            return 200, op_find(**params)
+        elif resource == "summary" and method == "GET":
+            return 200, op_summary()
+        elif resource == "stats" and method == "GET":
+            return 200, op_stats()
+        elif resource == "batch" and method == "POST":
+            return 200, {"results": [apply(op) for op in body["operations"]]}
+        else:
+            return 404, {"error": f"no such resource {self.path}"}
+        return 405, {"error": f"{method} is not allowed on {self.path}"}
+
+    def send_json(self, status: int, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error(self, code, message=None, explain=None):
+        # errors found by http.server itself, e.g. unsupported methods
+        self.send_json(code, {"error": message or self.responses[code][0]})
+
+    def log_message(self, format, *args):
+        # formatted only when debug records are written
+        logging.debug("%s " + format, self.address_string(), *args)
+
+
+class InventoryServer(ThreadingHTTPServer):
+    """Http server with a thread per connection."""
+
+    daemon_threads = True
+    # terminals connect in bursts, e.g. when a store opens
+    request_queue_size = 128
+
+
+class InventoryClient:
+    """
+    Client of the inventory server.
+    One connection is kept alive and reused for every request.
+    """
+
+    def __init__(self, host=HOST, port=PORT, timeout=10):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method: str, path: str, payload=None):
+        """Send a request and return status and decoded json."""
+        body = json.dumps(payload) if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def get(self, name: str) -> dict | None:
+        return self.request("GET", f"/products/{quote(name, safe='')}")[1]["product"]
+
+    def save(self, name: str, quantity=0, price=0, merge=None) -> bool:
+        payload = {"name": name, "quantity": quantity, "price": price}
+        if merge:
+            payload["merge"] = Merge(merge).value
+        return self.request("POST", "/products", payload)[1]["ok"]
+
+    def remove(self, name: str) -> bool:
+        return self.request("DELETE", f"/products/{quote(name, safe='')}")[1]["ok"]
+
+    def adjust_stock(self, name: str, delta: int) -> bool:
+        path = f"/products/{quote(name, safe='')}/adjust"
+        return self.request("POST", path, {"delta": delta})[1]["ok"]
+
+    def adjust_many(self, deltas: dict[str, int]) -> bool:
+        return self.request("POST", "/adjust", {"deltas": deltas})[1]["ok"]
+
+    def find(self, name: str, limit=10) -> list[dict]:
+        path = f"/find?name={quote(name, safe='')}&limit={limit}"
+        return self.request("GET", path)[1]["products"]
+
+    def summary(self) -> dict:
+        return self.request("GET", "/summary")[1]
+
+    def stats(self) -> dict:
+        return self.request("GET", "/stats")[1]
+
+    def batch(self, operations: list[dict]) -> list[dict]:
+        payload = {"operations": operations}
+        return self.request("POST", "/batch", payload)[1]["results"]
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the inventory as json.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--database", default=models.DATABASE)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="group commit writes of concurrent requests",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="time operations, figures are served on /stats",
+    )
+    args = parser.parse_args()
+    models.configure(args.database, pool_size=args.pool_size)
+    if args.stats:
+        metrics.enable()
+    if args.write_behind:
+        Shop.write_behind()
+    server = InventoryServer((args.host, args.port), Handler)
+    print(f"Serving inventory on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Shop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,41 @@
+import json
 import logging
-from dataclasses import dataclass
+import os
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+from itertools import islice
+from typing import Iterator
 
+import feed
+import logs
+import metrics
+from cache import LRUCache
 from models import Product as ProductModel
-from models import session
+from models import StockMovement
+from queries import Direction, Merge, Order, Page, Summary
+from storage import SqlBackend, StorageBackend, copy_product
+from writequeue import WriteQueue
 
-logging.basicConfig(
-    filename="shop.log",
-    encoding="utf-8",
-    level=logging.DEBUG,
-)
+logs.configure_from()
+
+
+@dataclass
+class ImportReport:
+    """Outcome of a bulk import."""
+
+    rows: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+    error_file: str | None = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        s = "Imported {} rows in {:.2f}s ({:.0f} rows/sec), rejected {}"
+        return s.format(self.rows, self.seconds, self.rows_per_sec, self.rejected)
 
 
 @dataclass
@@ -19,32 +46,330 @@ class Shop:
 
     # default filename to store products
     FILENAME = "shop.db"
+    # what save does with a product that already exists
+    MERGE = Merge.ADD
+    # number of rows written per transaction by bulk_import
+    CHUNK_SIZE = 50_000
+    # number of products per page when listing
+    PAGE_SIZE = 20
+    # number of products fetched per query when streaming
+    BATCH_SIZE = 1000
+    # number of matches returned by find
+    MATCHES = 10
+    # products cached by name, dropped when the product changes
+    names = LRUCache(maxsize=4096)
+    # aggregates, pages and matches, dropped on every write
+    queries = LRUCache(maxsize=256)
+    # incremented on every write
+    version = 0
+    # `data_version` of the backend when the caches were filled
+    data_version = None
+    # queue of writes in write behind mode, None when writes are immediate
+    writer = None
+    # where products are stored, see `use`
+    backend: StorageBackend = SqlBackend()
 
     @classmethod
-    def save(cls, name: str, quantity=0, price=0) -> bool:
+    @metrics.timed
+    def save(cls, name: str, quantity=0, price=0, merge=None) -> bool:
         """
-        Get product name, quntity and price and if it is not exist
-        save it in the database
+        Get product name, quntity and price and save it in the database.
+        If the product already exists it is merged in the same statement.
+
+        Parameters
+        ----------
+        merge: Merge
+            `Merge.ADD` adds quantity to the stored one and takes the new
+            price, `Merge.REPLACE` overwrites the stored product and
+            `Merge.KEEP` leaves it as it is.
+            Default is `Shop.MERGE`.
 
         Returns
         -------
         out: bool
             Return True if product save successfully otherwise False.
+            In write behind mode return a Future of it.
 
         """
-        # TODO: check product exist or not;
-        # if product is not saved then you will save it;
+        merge = Merge(merge or cls.MERGE)
+        values = {"name": name, "quantity": quantity, "price": price}
 
-        try:
-            product = ProductModel(name=name, quantity=quantity, price=price)
-            session.add(product)
-            session.commit()
+        def operation(tx) -> bool:
+            cls.backend.upsert(tx, [values], merge)
             return True
+
+        return cls._write("save", name, operation)
+
+    @classmethod
+    def _write(cls, action: str, name: str, operation):
+        """Apply a write now, or queue it in write behind mode.
+
+        Parameters
+        ----------
+        action: str
+            Name of the operation for the log.
+        name: str | list[str]
+            Name of the written product, or names of the written products.
+        operation: Callable
+            Function that applies the write in a transaction of the
+            backend and returns True if it succeeded.
+
+        Returns
+        -------
+        outs: bool | Future
+            Return result of the operation, or its Future if queued.
+        """
+        if cls.writer is not None:
+            return cls.writer.submit(action, operation)
+        fields = {"operation": action, "product": name}
+        start = time.perf_counter()
+        try:
+            with cls.backend.transaction() as tx:
+                result = operation(tx)
         except Exception as e:
-            logging.error(f"Error on save: {e}")
+            logging.error(f"Error on {action}: {e}", extra=fields)
             return False
+        finally:
+            cls._invalidate(*([name] if isinstance(name, str) else name))
+        if logging.root.isEnabledFor(logging.DEBUG):
+            fields["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            logging.debug(f"Done {action}", extra=fields)
+        return result
+
+    @classmethod
+    @metrics.timed
+    def bulk_import(
+        cls, path, merge=None, chunk_size=None, error_file=None
+    ) -> ImportReport:
+        """Stream products from a csv or jsonl file into the database.
+
+        Rows are upserted on name in chunks, one transaction per chunk,
+        so memory stays flat whatever the size of the file. Invalid rows
+        are skipped and written with the reason to the error file.
+
+        Parameters
+        ----------
+        path: str
+            Csv file with a header row or jsonl file. Both must have
+            `name`, `quantity` and `price` fields.
+        merge: Merge
+            How to merge rows with an existing product, default `Shop.MERGE`.
+        chunk_size: int
+            Rows per transaction, default `Shop.CHUNK_SIZE`.
+        error_file: str
+            Where to write rejected rows, default is `<path>.errors.jsonl`.
+
+        Returns
+        -------
+        outs: ImportReport
+            Return number of imported and rejected rows and the duration.
+        """
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        error_file = error_file or f"{path}.errors.jsonl"
+        merge = Merge(merge or cls.MERGE)
+        report = ImportReport()
+        errors = None
+        start = time.perf_counter()
+        records = feed.read_records(path)
+        try:
+            while chunk := list(islice(records, chunk_size)):
+                rows, rejected = [], []
+                for line_num, record in chunk:
+                    try:
+                        rows.append(feed.parse_product(record))
+                    except ValueError as e:
+                        rejected.append((line_num, record, str(e)))
+                if rows:
+                    report.rows += cls._write_chunk(merge, rows, rejected)
+                if rejected:
+                    if errors is None:
+                        errors = open(error_file, "w", encoding="utf-8")
+                        report.error_file = error_file
+                    for line_num, record, reason in rejected:
+                        line = {"line": line_num, "error": reason, "row": record}
+                        errors.write(json.dumps(line, default=str) + "\n")
+                    report.rejected += len(rejected)
+        finally:
+            if errors is not None:
+                errors.close()
+            cls._invalidate()
+        report.seconds = time.perf_counter() - start
+        fields = {"operation": "bulk_import", "rows": report.rows}
+        fields["ms"] = round(report.seconds * 1000, 3)
+        logging.info(f"Bulk import of {path}: {report}", extra=fields)
+        return report
+
+    @classmethod
+    def _write_chunk(cls, merge: Merge, rows: list[dict], rejected: list) -> int:
+        """Write a chunk of rows in one transaction.
+
+        If the chunk fails, rows are retried one transaction each and
+        the failing ones are added to `rejected`.
+
+        Returns
+        -------
+        outs: int
+            Return number of rows written.
+        """
+        try:
+            with cls.backend.transaction() as tx:
+                cls.backend.upsert(tx, rows, merge)
+            return len(rows)
+        except Exception as e:
+            logging.error(
+                f"Error on bulk import chunk, retry row by row: {e}",
+                extra={"operation": "bulk_import", "rows": len(rows)},
+            )
+        written = 0
+        for row in rows:
+            try:
+                with cls.backend.transaction() as tx:
+                    cls.backend.upsert(tx, [row], merge)
+                written += 1
+            except Exception as e:
+                rejected.append((None, row, str(e)))
+        return written
+
+    @classmethod
+    @metrics.timed
+    def export(cls, path, format=None, chunk_size=None) -> int:
+        """Stream every product to a csv, jsonl or columnar file.
+
+        Products are read in a single read transaction, so the file is
+        a consistent copy of the catalog while writers keep working, and
+        fetched a chunk at a time so memory stays flat.
+        The file is written under a temporary name and renamed when
+        complete.
+
+        Parameters
+        ----------
+        path: str
+            File to write.
+        format: Format
+            `Format.CSV`, `Format.JSONL` or `Format.COLUMNAR`, picked
+            from the file extension if not given.
+        chunk_size: int
+            Rows fetched and written at a time, default `Shop.BATCH_SIZE`.
+
+        Returns
+        -------
+        outs: int
+            Return number of exported products.
+        """
+        start = time.perf_counter()
+        format = feed.Format(format) if format else feed.format_of(path)
+        partial = f"{path}.partial"
+        try:
+            chunks = cls.backend.chunks(chunk_size or cls.BATCH_SIZE)
+            rows = feed.write_records(partial, chunks, format)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        seconds = time.perf_counter() - start
+        fields = {"operation": "export", "rows": rows, "ms": round(seconds * 1000, 3)}
+        logging.info(f"Exported {rows} products to {path}", extra=fields)
+        return rows
+
+    @classmethod
+    @metrics.timed
+    def backup(cls, path):
+        """Copy the whole database to a file with the sqlite backup API.
+
+        Unlike copying shop.db, the copy is consistent even while
+        other connections write, and they are not blocked meanwhile.
+        A memory backend writes its products to a new database.
+
+        Parameters
+        ----------
+        path: str
+            Database file to write.
+        """
+        cls.backend.backup(path)
+
+    @classmethod
+    @metrics.timed
+    def migrate_legacy(
+        cls, path, chunk_size=None, error_file=None, checkpoint=None, restart=False
+    ):
+        """Stream a legacy `name,number,price,total_price` file into the
+        backend, resuming from its checkpoint; see `legacy.migrate`.
+
+        Cached reads are dropped after every chunk, so they see the
+        migrated products while it runs.
+
+        Returns
+        -------
+        outs: MigrationReport
+            Return number of lines read, inserted, duplicate and rejected
+            products.
+        """
+        import legacy
+
+        return legacy.migrate(
+            path,
+            chunk_size or legacy.CHUNK_SIZE,
+            error_file,
+            checkpoint,
+            restart,
+            backend=cls.backend,
+            on_commit=cls._invalidate,
+        )
 
     @classmethod
+    def _invalidate(cls, *names):
+        """Drop cached reads a write to the products may have changed.
+
+        Parameters
+        ----------
+        names: str
+            Names of the written products, all names if not given.
+        """
+        cls.version += 1
+        cls.queries.clear()
+        if not names:
+            cls.names.clear()
+        for name in names:
+            cls.names.pop(name.lower())
+
+    @classmethod
+    def _check_data_version(cls):
+        """Drop cached reads if another process, or another connection,
+        wrote to the backend since they were cached."""
+        data_version = cls.backend.data_version()
+        if data_version != cls.data_version:
+            cls._invalidate()
+            cls.data_version = data_version
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """Hit, miss and eviction counters of the read caches.
+
+        Returns
+        -------
+        outs: dict
+            Return counters of `names` and `queries` caches and the
+            write version.
+        """
+        return {
+            "version": cls.version,
+            "names": cls.names.stats(),
+            "queries": cls.queries.stats(),
+        }
+
+    @classmethod
+    def use(cls, backend: StorageBackend):
+        """Store products in another backend from now on.
+
+        Queued writes are committed to the previous backend first.
+        """
+        cls.close()
+        cls.backend = backend
+        cls.data_version = None
+        cls._invalidate()
+
+    @classmethod
+    @metrics.timed
     def remove(cls, name: str) -> bool:
         """Execuate a query to find the give name
 
@@ -57,17 +382,114 @@ class Shop:
         -------
         outs: bool
             Return True if delete operation was successful otherwise False
+            In write behind mode return a Future of it.
         """
-        try:
-            product = session.query(ProductModel).filter_by(name=name).one()
-            session.delete(product)
-            session.commit()
-            return True
-        except Exception as e:
-            logging.error(f"Error on remove {e}")
+
+        def operation(tx) -> bool:
+            if cls.backend.remove(tx, name):
+                return True
+            fields = {"operation": "remove", "product": name}
+            logging.error(f"Error on remove: {name} not found", extra=fields)
             return False
 
+        return cls._write("remove", name, operation)
+
+    @classmethod
+    @metrics.timed
+    def adjust_stock(cls, name: str, delta: int) -> bool:
+        """Add delta to the quantity of a product in a single update.
+
+        Parameters
+        ----------
+        name: str
+            Product name to adjust.
+        delta: int
+            Units received if positive, sold if negative.
+
+        Returns
+        -------
+        outs: bool
+            Return True if the quantity changed, False if the product
+            doesn't exist or has less than `-delta` in stock.
+            In write behind mode return a Future of it.
+        """
+        return cls.adjust_many({name: delta})
+
+    @classmethod
+    @metrics.timed
+    def adjust_many(cls, deltas: dict[str, int]) -> bool:
+        """Adjust quantities of many products in one transaction.
+
+        Either every adjustment is applied or, if one product doesn't
+        exist or would go below zero, none of them.
+
+        Parameters
+        ----------
+        deltas: dict[str, int]
+            Product names and the delta to add to their quantity.
+
+        Returns
+        -------
+        outs: bool
+            Return True if every quantity changed otherwise False.
+            In write behind mode return a Future of it.
+        """
+        values = [{"key": name.lower(), "delta": int(d)} for name, d in deltas.items()]
+
+        def operation(tx) -> bool:
+            for index, value in enumerate(values):
+                if cls.backend.adjust(tx, value["key"], value["delta"]):
+                    continue
+                reason = (
+                    f"{value['key']} not found or its quantity would "
+                    f"drop below zero by {value['delta']}"
+                )
+                if index:
+                    # roll back the adjustments already applied
+                    raise ValueError(reason)
+                # nothing changed, a group commit can go on without it
+                fields = {"operation": "adjust", "product": value["key"]}
+                logging.error(f"Error on adjust: {reason}", extra=fields)
+                return False
+            return True
+
+        return cls._write("adjust", list(deltas), operation)
+
+    @classmethod
+    def write_behind(cls, max_ops=500, max_delay=0.01):
+        """Queue saves and removes and group commit them.
+
+        Parameters
+        ----------
+        max_ops: int
+            Most operations committed in one transaction.
+        max_delay: float
+            Seconds an operation may wait for others to join its group.
+        """
+        cls.close()
+        cls.writer = WriteQueue(
+            max_ops,
+            max_delay,
+            on_commit=cls._invalidate,
+            transaction=cls.backend.transaction,
+        )
+
     @classmethod
+    @metrics.timed
+    def flush(cls):
+        """Block until every queued write is committed."""
+        if cls.writer is not None:
+            cls.writer.flush()
+
+    @classmethod
+    def close(cls):
+        """Commit queued writes and go back to immediate writes."""
+        if cls.writer is not None:
+            cls.writer.close()
+            cls.writer = None
+
+    @classmethod
+    @metrics.timed
     def search(cls, name: str) -> str:
         """Execute a qurey to find product.
          Parameters
@@ -83,21 +505,193 @@ class Shop:
 
         """
         try:
-            product = session.query(ProductModel).filter_by(name=name).one()
-            s = "Name: {}\nQuntity: {}\nPrice: {}\n"
-            val = (product.name, product.quantity, product.price)
-            result = s.format(*val)
-            return result
-
+            product = cls.get(name)
         except Exception as e:
-            logging.error(f"Error on search {e}")
+            fields = {"operation": "search", "product": name}
+            logging.error(f"Error on search {e}", extra=fields)
+            return ""
+        if product is None:
             return ""
+        s = "Name: {}\nQuntity: {}\nPrice: {}\n"
+        val = (product.name, product.quantity, product.price)
+        result = s.format(*val)
+        return result
 
     @classmethod
-    def products(cls):
-        products = session.query(ProductModel).all()
+    @metrics.timed
+    def get(cls, name: str) -> ProductModel | None:
+        """Find a product by name, regardless of letter case.
+
+        Returns
+        -------
+        outs: Product | None
+            Return the product or None if it does not exist.
+        """
+        cls._check_data_version()
+        product = cls.names.get_or_compute(name.lower(), lambda: cls._get(name))
+        # a copy, changing it must not change the cached product
+        return None if product is None else copy_product(product)
+
+    @classmethod
+    def _get(cls, name: str) -> ProductModel | None:
+        return cls.backend.get(name)
+
+    @classmethod
+    @metrics.timed
+    def find(cls, name: str, limit=None) -> list[ProductModel]:
+        """Find products by a part of their name, tolerating typos.
+
+        Products starting with the text come first, then the closest
+        names found by the trigram index.
+
+        Parameters
+        ----------
+        name: str
+            Whole or part of a product name.
+        limit: int
+            Maximum number of products, default `Shop.MATCHES`.
+
+        Returns
+        -------
+        outs: list[Product]
+            Return matching products, best match first.
+        """
+        limit = limit or cls.MATCHES
+        key = ("find", name.lower(), limit)
+        cls._check_data_version()
+        products = cls.queries.get_or_compute(key, lambda: cls._find(name, limit))
+        # copies, like `get`
+        return [copy_product(product) for product in products]
+
+    @classmethod
+    def _find(cls, name: str, limit: int) -> list[ProductModel]:
+        products = cls.search_prefix(name, limit)
+        if len(products) < limit:
+            found = {product.id for product in products}
+            for product in cls.search_fuzzy(name, limit):
+                if product.id not in found and len(products) < limit:
+                    products.append(product)
         return products
 
+    @classmethod
+    @metrics.timed
+    def search_prefix(cls, prefix: str, limit=None) -> list[ProductModel]:
+        """Find products whose name starts with the prefix.
+
+        Matches are found by a range on the name key index and
+        returned in the order of their folded name.
+
+        Returns
+        -------
+        outs: list[Product]
+            Return products in name order.
+        """
+        if not prefix:
+            return []
+        return cls.backend.search_prefix(prefix, limit or cls.MATCHES)
+
+    @classmethod
+    @metrics.timed
+    def search_fuzzy(cls, name: str, limit=None) -> list[ProductModel]:
+        """Find products with a name similar to the text.
+
+        Candidates sharing most trigrams with the text are taken from the
+        full text index, then ranked by similarity of the whole name.
+
+        Returns
+        -------
+        outs: list[Product]
+            Return products, most similar first.
+        """
+        return cls.backend.search_fuzzy(name, limit or cls.MATCHES)
+
+    @classmethod
+    def products(cls) -> Iterator[ProductModel]:
+        """Stream all products ordered by id."""
+        return cls.iter_products()
+
+    @classmethod
+    @metrics.timed
+    def page(
+        cls,
+        order=Order.ID,
+        direction=Direction.ASC,
+        after=None,
+        before=None,
+        limit=None,
+    ) -> Page:
+        """Fetch one page of products using keyset pagination.
+
+        Pages are found through the index of the sort key, so fetching
+        a page costs the same wherever it is in the catalog.
+
+        Parameters
+        ----------
+        order: Order
+            Key to sort products by.
+        direction: Direction
+            Sort ascending or descending.
+        after: tuple
+            Cursor of a page, `Page.last`, to fetch the page following it.
+        before: tuple
+            Cursor of a page, `Page.first`, to fetch the page preceding it.
+        limit: int
+            Number of products in the page, default `Shop.PAGE_SIZE`.
+
+        Returns
+        -------
+        outs: Page
+            Return the products and cursors of the page.
+        """
+        order, direction = Order(order), Direction(direction)
+        limit = limit or cls.PAGE_SIZE
+        key = ("page", order, direction, after, before, limit)
+        cls._check_data_version()
+        page = cls.queries.get_or_compute(
+            key, lambda: cls._page(order, direction, after, before, limit)
+        )
+        # copies, like `get`
+        products = [copy_product(product) for product in page.products]
+        return Page(products, page.first, page.last)
+
+    @classmethod
+    def _page(cls, order, direction, after, before, limit) -> Page:
+        """Fetch a page from the backend, see `page`."""
+        return cls.backend.page(order, direction, after, before, limit)
+
+    @classmethod
+    @metrics.timed
+    def iter_products(
+        cls, order=Order.ID, direction=Direction.ASC, batch_size=None
+    ) -> Iterator[ProductModel]:
+        """Stream products in batches of one keyset page each.
+
+        Only one batch is held in memory at a time, the first product
+        is available as soon as the first page is fetched.
+
+        Parameters
+        ----------
+        order: Order
+            Key to sort products by.
+        direction: Direction
+            Sort ascending or descending.
+        batch_size: int
+            Products fetched per query, default is `Shop.BATCH_SIZE`.
+
+        Yields
+        ------
+        outs: Product
+        """
+        order, direction = Order(order), Direction(direction)
+        batch_size = batch_size or cls.BATCH_SIZE
+        # streamed pages are not cached, they would only evict the others
+        page = cls._page(order, direction, None, None, batch_size)
+        while page.products:
+            yield from page.products
+            if len(page.products) < batch_size:
+                break
+            page = cls._page(order, direction, page.last, None, batch_size)
+
     @classmethod
     def mannual(cls):
         """
@@ -115,29 +709,94 @@ class Shop:
         return s
 
     @classmethod
-    def sort_asc(cls) -> list[ProductModel]:
+    def sort_asc(cls, order=Order.NAME) -> Iterator[ProductModel]:
         """Retrieve all products and sort them ascendingly.
 
+        Parameters
+        ----------
+        order: Order
+            Key to sort products by, default is name.
+
         Returns
         -------
-        outs: list[Product]
-            Return list of products
+        outs: Iterator[Product]
+            Return products streamed from the database in order.
         """
-        products = session.query(ProductModel).order_by(ProductModel.name)
-        return products
+        return cls.iter_products(order, Direction.ASC)
 
     @classmethod
-    def sort_dec(cls):
+    def sort_dec(cls, order=Order.NAME) -> Iterator[ProductModel]:
         """Retrieve all products and sort them descendingly.
 
+        Parameters
+        ----------
+        order: Order
+            Key to sort products by, default is name.
+
         Returns
         -------
-        outs: list[Product]
-            Return list of products sorted descending.
+        outs: Iterator[Product]
+            Return products streamed from the database in reverse order.
+        """
+        return cls.iter_products(order, Direction.DEC)
+
+    @classmethod
+    @metrics.timed
+    def summary(cls, *criteria) -> Summary:
+        """Calculate count, quantities, capital and price range at once.
+
+        Everything is computed by a single SELECT on the database side,
+        no product object is loaded. Without criteria the figures are
+        read from the running totals of the backend, so it costs the
+        same whatever the number of products.
+
+        Parameters
+        ----------
+        criteria:
+            Optional conditions to restrict the products, each a
+            `queries.Criterion`, e.g. `("price", ">", 100)`. The sqlite
+            backend also takes SQL expressions, e.g. `Product.price > 100`.
+
+        Returns
+        -------
+        outs: Summary
+            Return aggregated figures of the matching products.
+        """
+        if not criteria:
+            cls._check_data_version()
+            # a copy, like `get`
+            return replace(cls.queries.get_or_compute(("summary",), cls._summary))
+        return cls._summary(*criteria)
+
+    @classmethod
+    def _summary(cls, *criteria) -> Summary:
+        if not criteria:
+            return cls.backend.totals()
+        return cls.backend.summary(criteria)
+
+    @classmethod
+    @metrics.timed
+    def subtotals(cls, **filters) -> dict[str, Summary]:
+        """Calculate a summary per named filter in one SELECT.
+
+        Parameters
+        ----------
+        filters:
+            Name of subtotal mapped to a criterion, see `summary`,
+            e.g. `cheap=("price", "<", 10)`.
+
+        Returns
+        -------
+        outs: dict[str, Summary]
+            Return the summary of each filter keyed by its name.
         """
-        return Shop.sort_asc()[::-1]
+        if not filters:
+            return {}
+        summaries = cls.backend.subtotals(list(filters.values()))
+        return dict(zip(filters, summaries))
 
     @classmethod
+    @metrics.timed
     def total_capital(cls) -> int:
         """Calculate total capital of shop.
 
@@ -146,23 +805,73 @@ class Shop:
         outs: int
             Return total capital
         """
-        total = 0
-        products = session.query(ProductModel).all()
-        for product in products:
-            total += product.price * product.quantity
-        return total
+        return cls.summary().capital
 
     @classmethod
+    @metrics.timed
     def total_quantities(cls):
-        """Calculate total capital of shop.
+        """Calculate total quantities of shop.
 
         Returns
         --------
         outs: int
             Return total of quantities.
         """
-        total = 0
-        products = session.query(ProductModel).all()
-        for product in products:
-            total += product.quantity
-        return total
+        return cls.summary().quantities
+
+    @classmethod
+    @metrics.timed
+    def history(cls, name: str, limit=100) -> list[StockMovement]:
+        """Movements of a product, newest first.
+
+        Parameters
+        ----------
+        name: str
+            Product name, removed products keep their history.
+        limit: int
+            Most movements returned.
+
+        Returns
+        -------
+        outs: list[StockMovement]
+            Return inserts, updates and deletes of the product.
+        """
+        return cls.backend.history(name.lower(), limit)
+
+    @classmethod
+    @metrics.timed
+    def snapshot(cls) -> int:
+        """Save a copy of the current stock.
+
+        Point in time stock is rebuilt from the last snapshot before it
+        and the movements after that snapshot, so taking one regularly,
+        e.g. every night, keeps `stock_at` fast as the ledger grows.
+
+        Returns
+        -------
+        outs: int
+            Return id of the snapshot.
+        """
+        snapshot_id = cls.backend.snapshot()
+        logging.info(
+            f"Stock snapshot {snapshot_id} taken", extra={"operation": "snapshot"}
+        )
+        return snapshot_id
+
+    @classmethod
+    @metrics.timed
+    def stock_at(cls, when: datetime) -> dict[str, int]:
+        """Rebuild the quantity of every product at a point in time.
+
+        Parameters
+        ----------
+        when: datetime
+            Point in time, in UTC.
+
+        Returns
+        -------
+        outs: dict[str, int]
+            Return quantity of the products that existed at that time
+            keyed by their name.
+        """
+        return cls.backend.stock_at(when)
@@ -1,14 +1,15 @@
-import os
 import tomllib
 import logging
 from enum import Enum
 from dataclasses import dataclass
 from typing import Tuple
+import logs
+import render
 from models import Product
 
 
-# basic config for log file.
-logging.basicConfig(filename="inventory.log", encoding="utf-8", level=logging.DEBUG)
+# log file of the legacy app, level from config.toml
+logs.configure_from(path="inventory.log")
 
 
 class Menu(Enum):
@@ -333,7 +334,7 @@ class Ui:
     @staticmethod
     def clear_screen():
         """Clear console screen."""
-        os.system("cls")
+        render.clear_screen()
 
     @staticmethod
     def show_logo() -> str:
@@ -0,0 +1,784 @@
+import logging
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from enum import Enum
+from typing import (
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Protocol,
+)
+
+from sqlalchemy import Engine, delete, func, insert, literal, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import models
+from models import Product as ProductModel
+from models import (
+    StockMovement,
+    StockSnapshot,
+    StockSnapshotItem,
+    fold_name,
+    session_scope,
+)
+from queries import (
+    COMPARISONS,
+    Direction,
+    Merge,
+    Order,
+    Page,
+    Summary,
+    adjust_statement,
+    aggregate_columns,
+    criterion_clause,
+    fuzzy_candidates,
+    make_criterion,
+    make_page,
+    page_statement,
+    prefix_statement,
+    rank_by_similarity,
+    totals_statement,
+    upsert_statement,
+)
+
+# Where Shop keeps its products. Writes get the transaction opened by
+# `transaction`, so Shop and the write queue decide what is committed
+# together; reads open their own.
+
+
+class Backend(Enum):
+    """
+    Storage backends Shop can use
+    """
+
+    SQLITE = "sqlite"
+    MEMORY = "memory"
+
+
+class StorageBackend(Protocol):
+    """Operations Shop needs from a storage."""
+
+    def transaction(self) -> ContextManager:
+        """Transaction that commits on exit and rolls back on error."""
+
+    def upsert(self, tx, rows: list[dict], merge: Merge) -> int:
+        """Insert products or merge them into those of the same name,
+        return the number of products inserted or changed."""
+
+    def remove(self, tx, name: str) -> bool:
+        """Delete a product, False if it doesn't exist."""
+
+    def adjust(self, tx, key: str, delta: int) -> bool:
+        """Add delta to a quantity, False if missing or below zero."""
+
+    def get(self, name: str) -> ProductModel | None:
+        """Product of a name, regardless of letter case."""
+
+    def search_prefix(self, prefix: str, limit: int) -> list[ProductModel]:
+        """Products whose name starts with prefix, in name order."""
+
+    def search_fuzzy(self, name: str, limit: int) -> list[ProductModel]:
+        """Products with a similar name, most similar first."""
+
+    def page(
+        self, order: Order, direction: Direction, after, before, limit: int
+    ) -> Page:
+        """Page of products around a keyset cursor, see `Shop.page`."""
+
+    def totals(self) -> Summary:
+        """Summary of all products."""
+
+    def data_version(self) -> int:
+        """Number that changes when another connection or process
+        commits to the storage, so cached reads may be stale."""
+
+    def summary(self, criteria: tuple) -> Summary:
+        """Summary of the products matching all criteria, see
+        `queries.Criterion`."""
+
+    def subtotals(self, criteria: list) -> list[Summary]:
+        """Summary of the products matching each criterion."""
+
+    def history(self, key: str, limit: int) -> list[StockMovement]:
+        """Movements of the product of a folded name, newest first."""
+
+    def snapshot(self) -> int:
+        """Save a copy of the current stock, return its id."""
+
+    def stock_at(self, when: datetime) -> dict[str, int]:
+        """Quantity of every product at a point in time, in UTC."""
+
+    def backup(self, path: str):
+        """Write a consistent copy of the storage to a sqlite file."""
+
+    def chunks(self, size: int) -> Iterator[list[tuple]]:
+        """Id, name, quantity and price of every product by id, a
+        consistent copy read `size` rows at a time."""
+
+
+class SqlBackend:
+    """
+    Products in a sqlite database.
+    Without a path it is the database of `models.configure`, with one
+    the backend opens its own engine on first use, e.g. for a store of
+    a chain. A read-only backend only opens an existing database, see
+    `models.open_engine`.
+    """
+
+    def __init__(self, path=None, pool_size=5, readonly=False):
+        self.path = path
+        self.pool_size = pool_size
+        self.readonly = readonly
+        self._engine = None
+        self._sessions = None
+        self._lock = threading.Lock()
+        # connection of `data_version` and the engine it was opened for
+        self._watch = None
+        self._watch_engine = None
+
+    @property
+    def engine(self) -> Engine:
+        if self.path is None:
+            return models.get_engine()
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = models.open_engine(
+                        self.path, self.pool_size, readonly=self.readonly
+                    )
+                    self._sessions = sessionmaker(bind=engine, expire_on_commit=False)
+                    self._engine = engine
+        return self._engine
+
+    def session(self) -> ContextManager:
+        """Unit of work on the database, see `models.session_scope`."""
+        if self.path is None:
+            return session_scope()
+        self.engine
+        return session_scope(self._sessions)
+
+    def dispose(self):
+        """Close the connections of the engine opened by the backend."""
+        with self._lock:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = self._watch_engine = None
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = self._sessions = None
+
+    def transaction(self) -> ContextManager:
+        return self.session()
+
+    def upsert(self, tx, rows: list[dict], merge: Merge) -> int:
+        return tx.execute(upsert_statement(merge), rows).rowcount
+
+    def remove(self, tx, name: str) -> bool:
+        stmt = delete(ProductModel).where(ProductModel.name_key == name.lower())
+        return bool(tx.execute(stmt).rowcount)
+
+    def adjust(self, tx, key: str, delta: int) -> bool:
+        values = {"key": key, "delta": delta}
+        return bool(tx.execute(adjust_statement(), values).rowcount)
+
+    def get(self, name: str) -> ProductModel | None:
+        stmt = select(ProductModel).where(ProductModel.name_key == name.lower())
+        with self.session() as session:
+            return session.scalar(stmt)
+
+    def search_prefix(self, prefix: str, limit: int) -> list[ProductModel]:
+        with self.session() as session:
+            return session.scalars(prefix_statement(prefix, limit)).all()
+
+    def search_fuzzy(self, name: str, limit: int) -> list[ProductModel]:
+        plan = fuzzy_candidates(name, limit)
+        with self.session() as session:
+            try:
+                rows = session.execute(*next(plan)).all()
+                while True:
+                    rows = session.execute(*plan.send(rows)).all()
+            except StopIteration as stop:
+                ids = stop.value
+            except OperationalError as e:
+                fields = {"operation": "search_fuzzy", "product": name}
+                logging.error(f"Error on fuzzy search {e}", extra=fields)
+                return []
+            stmt = select(ProductModel).where(ProductModel.id.in_(ids))
+            candidates = session.scalars(stmt).all() if ids else []
+        return rank_by_similarity(name, candidates, limit)
+
+    def page(
+        self, order: Order, direction: Direction, after, before, limit: int
+    ) -> Page:
+        stmt = page_statement(order, direction, after, before, limit)
+        with self.session() as session:
+            rows = session.execute(stmt).all()
+        return make_page(rows, before)
+
+    def totals(self) -> Summary:
+        with self.session() as session:
+            return Summary(*session.execute(totals_statement()).one())
+
+    def data_version(self) -> int:
+        engine = self.engine
+        with self._lock:
+            if self._watch_engine is not engine:
+                if self._watch is not None:
+                    self._watch.close()
+                # outside the pool, sqlite counts commits of every other
+                # connection, those of the pool included
+                args, kwargs = engine.dialect.create_connect_args(engine.url)
+                kwargs["check_same_thread"] = False
+                self._watch = engine.dialect.connect(*args, **kwargs)
+                self._watch_engine = engine
+            return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def summary(self, criteria: tuple) -> Summary:
+        clauses = [criterion_clause(criterion) for criterion in criteria]
+        stmt = select(*aggregate_columns()).where(*clauses)
+        with self.session() as session:
+            return Summary(*session.execute(stmt).one())
+
+    def subtotals(self, criteria: list) -> list[Summary]:
+        columns = []
+        for criterion in criteria:
+            columns.extend(aggregate_columns(criterion_clause(criterion)))
+        with self.session() as session:
+            row = session.execute(select(*columns)).one()
+        size = len(columns) // len(criteria)
+        return [
+            Summary(*row[index * size : (index + 1) * size])
+            for index in range(len(criteria))
+        ]
+
+    def history(self, key: str, limit: int) -> list[StockMovement]:
+        stmt = (
+            select(StockMovement)
+            .where(StockMovement.name_key == key)
+            .order_by(StockMovement.id.desc())
+            .limit(limit)
+        )
+        with self.session() as session:
+            return list(session.scalars(stmt))
+
+    def snapshot(self) -> int:
+        last = select(func.coalesce(func.max(StockMovement.id), 0))
+        stmt = (
+            insert(StockSnapshot)
+            .values(movement_id=last.scalar_subquery())
+            .returning(StockSnapshot.id)
+        )
+        columns = ["snapshot_id", "product_id", "name", "quantity", "price"]
+        with self.session() as session:
+            snapshot_id = session.execute(stmt).scalar_one()
+            products = select(
+                literal(snapshot_id),
+                ProductModel.id,
+                ProductModel.name,
+                ProductModel.quantity,
+                ProductModel.price,
+            )
+            session.execute(insert(StockSnapshotItem).from_select(columns, products))
+        return snapshot_id
+
+    def stock_at(self, when: datetime) -> dict[str, int]:
+        last_snapshot = (
+            select(StockSnapshot)
+            .where(StockSnapshot.created_at <= when)
+            .order_by(StockSnapshot.created_at.desc())
+            .limit(1)
+        )
+        stock = {}
+        with self.session() as session:
+            snapshot = session.scalar(last_snapshot)
+            after = 0
+            if snapshot is not None:
+                after = snapshot.movement_id
+                items = select(
+                    StockSnapshotItem.product_id,
+                    StockSnapshotItem.name,
+                    StockSnapshotItem.quantity,
+                ).where(StockSnapshotItem.snapshot_id == snapshot.id)
+                for product_id, name, quantity in session.execute(items):
+                    stock[product_id] = (name, quantity or 0)
+            tail = (
+                select(
+                    StockMovement.product_id,
+                    StockMovement.name,
+                    StockMovement.kind,
+                    StockMovement.quantity,
+                )
+                .where(StockMovement.id > after, StockMovement.created_at <= when)
+                .order_by(StockMovement.id)
+                .execution_options(yield_per=1000)
+            )
+            for product_id, name, kind, quantity in session.execute(tail):
+                if kind == "delete":
+                    stock.pop(product_id, None)
+                else:
+                    stock[product_id] = (name, quantity or 0)
+        return dict(stock.values())
+
+    def backup(self, path: str):
+        source = self.engine.raw_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.driver_connection.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+    def chunks(self, size: int) -> Iterator[list[tuple]]:
+        stmt = select(
+            ProductModel.id,
+            func.coalesce(ProductModel.name, ""),
+            func.coalesce(ProductModel.quantity, 0),
+            func.coalesce(ProductModel.price, 0),
+        ).order_by(ProductModel.id)
+        # one SELECT, a single read transaction, streamed a chunk at a time
+        with self.session() as session:
+            result = session.execute(stmt, execution_options={"yield_per": size})
+            yield from result.partitions()
+
+
+def sort_key(order: Order, product: ProductModel) -> tuple:
+    """Keyset cursor of a product, like the columns of `order_columns`."""
+    if order is Order.ID:
+        return (product.id,)
+    if order is Order.NAME:
+        return (product.name.lower(), product.id)
+    if order is Order.PRICE:
+        return (product.price, product.id)
+    if order is Order.QUANTITY:
+        return (product.quantity, product.id)
+    return (product.price * product.quantity, product.id)
+
+
+def trigrams(key: str) -> set[str]:
+    return {key[i : i + 3] for i in range(len(key) - 2)}
+
+
+def copy_product(product: ProductModel) -> ProductModel:
+    """New product with the same values, callers may change it."""
+    return ProductModel(
+        id=product.id,
+        name=product.name,
+        name_key=fold_name(product.name),
+        quantity=product.quantity,
+        price=product.price,
+    )
+
+
+def aggregate(products: Iterable[ProductModel]) -> Summary:
+    """Summary of products, like `aggregate_columns`."""
+    summary = Summary()
+    for product in products:
+        summary.count += 1
+        summary.quantities += product.quantity
+        summary.capital += product.quantity * product.price
+        if summary.min_price is None or product.price < summary.min_price:
+            summary.min_price = product.price
+        if summary.max_price is None or product.price > summary.max_price:
+            summary.max_price = product.price
+    return summary
+
+
+def utc_now() -> datetime:
+    """Current time in UTC without time zone, like the ledger's."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Movement(NamedTuple):
+    """Change of a product in the ledger of a memory backend, the
+    columns of `StockMovement`."""
+
+    id: int
+    product_id: int
+    name: str
+    name_key: str
+    kind: str
+    delta: int
+    quantity: int
+    price: int
+    created_at: datetime
+
+
+class Snapshot(NamedTuple):
+    """Copy of the stock of a memory backend."""
+
+    id: int
+    # last movement before the snapshot
+    movement_id: int
+    created_at: datetime
+    # name and quantity of every product by id
+    items: dict[int, tuple[str, int]]
+
+
+class MemoryBackend:
+    """
+    Products in memory, nothing is written to disk.
+    A dict keyed by lowercased name holds the products, a sorted list of
+    the keys serves prefix search and name order, a trigram index fuzzy
+    search, and count, quantities and capital are kept as running totals.
+    Every change is appended to a ledger, like the triggers of sqlite do.
+    A transaction holds a lock and undoes its changes if it fails.
+    Products are copied on the way out, so callers can't change them.
+    """
+
+    def __init__(self, rows: Iterable[tuple] = ()):
+        """
+        Parameters
+        ----------
+        rows: Iterable[tuple]
+            Id, name, quantity and price of products to start with, e.g.
+            `SqlBackend().chunks` to cache the database.
+        """
+        self._lock = threading.RLock()
+        self.products: dict[str, ProductModel] = {}
+        self.keys: list[str] = []
+        self.prices: list[int] = []
+        self.index: dict[str, set[str]] = {}
+        self.count = self.quantities = self.capital = 0
+        # new products get the largest id plus one, like sqlite rowids
+        self.last_id = 0
+        # lists of (key, product) sorted by an order, until the next write
+        self.sorted: dict[Order, tuple[list, list]] = {}
+        self.movements: list[Movement] = []
+        self.snapshots: list[Snapshot] = []
+        for id, name, quantity, price in rows:
+            self._set(name.lower(), (id, name, quantity or 0, price or 0))
+        # the starting stock, history begins here
+        self.snapshot()
+
+    def _set(self, key: str, state: tuple | None):
+        """Replace the product of a key, None deletes it, and keep the
+        indexes and totals in step."""
+        old = self.products.pop(key, None)
+        self.sorted.clear()
+        if old is not None:
+            self.count -= 1
+            self.quantities -= old.quantity
+            self.capital -= old.quantity * old.price
+            del self.prices[bisect_left(self.prices, old.price)]
+            if state is None:
+                del self.keys[bisect_left(self.keys, key)]
+                for trigram in trigrams(key):
+                    self.index[trigram].discard(key)
+                if old.id == self.last_id:
+                    ids = (product.id for product in self.products.values())
+                    self.last_id = max(ids, default=0)
+        if state is None:
+            return
+        id, name, quantity, price = state
+        self.last_id = max(self.last_id, id)
+        product = ProductModel(id=id, name=name, quantity=quantity, price=price)
+        self.products[key] = product
+        self.count += 1
+        self.quantities += quantity
+        self.capital += quantity * price
+        insort(self.prices, price)
+        if old is None:
+            insort(self.keys, key)
+            for trigram in trigrams(key):
+                self.index.setdefault(trigram, set()).add(key)
+
+    def _change(self, tx: list, key: str, state: tuple | None):
+        """Set the product of a key, log how to undo it and append the
+        change to the ledger."""
+        old = self.products.get(key)
+        if old is not None:
+            old = (old.id, old.name, old.quantity, old.price)
+        self._set(key, state)
+        tx.append((key, old))
+        if state == old:
+            return
+        if old is None:
+            id, name, quantity, price = state
+            kind, delta = "insert", quantity
+        elif state is None:
+            id, name, quantity, price = old
+            kind, delta, quantity = "delete", -quantity, 0
+        else:
+            id, name, quantity, price = state
+            kind, delta = "update", quantity - old[2]
+        movement_id = self.movements[-1].id + 1 if self.movements else 1
+        self.movements.append(
+            Movement(
+                movement_id, id, name, key, kind, delta, quantity, price, utc_now()
+            )
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[list]:
+        with self._lock:
+            # undo log, the previous state of every changed product
+            tx = []
+            movements = len(self.movements)
+            try:
+                yield tx
+            except BaseException:
+                for key, state in reversed(tx):
+                    self._set(key, state)
+                del self.movements[movements:]
+                raise
+
+    def upsert(self, tx, rows: list[dict], merge: Merge) -> int:
+        written = 0
+        for row in rows:
+            key = row["name"].lower()
+            quantity, price = row["quantity"] or 0, row["price"] or 0
+            old = self.products.get(key)
+            if old is None:
+                state = (self.last_id + 1, row["name"], quantity, price)
+            elif merge is Merge.KEEP:
+                continue
+            elif merge is Merge.ADD:
+                state = (old.id, old.name, old.quantity + quantity, price)
+            else:
+                state = (old.id, row["name"], quantity, price)
+            self._change(tx, key, state)
+            written += 1
+        return written
+
+    def remove(self, tx, name: str) -> bool:
+        key = name.lower()
+        if key not in self.products:
+            return False
+        self._change(tx, key, None)
+        return True
+
+    def adjust(self, tx, key: str, delta: int) -> bool:
+        old = self.products.get(key)
+        if old is None or old.quantity + delta < 0:
+            return False
+        self._change(tx, key, (old.id, old.name, old.quantity + delta, old.price))
+        return True
+
+    def get(self, name: str) -> ProductModel | None:
+        product = self.products.get(name.lower())
+        return None if product is None else copy_product(product)
+
+    def search_prefix(self, prefix: str, limit: int) -> list[ProductModel]:
+        prefix = prefix.lower()
+        with self._lock:
+            start = bisect_left(self.keys, prefix)
+            keys = self.keys[start : start + limit]
+            return [
+                copy_product(self.products[key])
+                for key in keys
+                if key.startswith(prefix)
+            ]
+
+    def search_fuzzy(self, name: str, limit: int) -> list[ProductModel]:
+        with self._lock:
+            # candidates sharing most trigrams, like the full text index
+            shared = Counter()
+            for trigram in trigrams(name.lower()):
+                shared.update(self.index.get(trigram, ()))
+            keys = [key for key, _ in shared.most_common(limit * 5)]
+            candidates = [copy_product(self.products[key]) for key in keys]
+        return rank_by_similarity(name, candidates, limit)
+
+    def _sorted(self, order: Order) -> tuple[list, list]:
+        """Keys and products in ascending order, sorted once per write."""
+        if order not in self.sorted:
+            pairs = sorted(
+                (sort_key(order, product), product)
+                for product in self.products.values()
+            )
+            self.sorted[order] = ([k for k, _ in pairs], [p for _, p in pairs])
+        return self.sorted[order]
+
+    def page(
+        self, order: Order, direction: Direction, after, before, limit: int
+    ) -> Page:
+        with self._lock:
+            keys, products = self._sorted(order)
+            ascending = direction is Direction.ASC
+            if before is not None:
+                # the page ends next to the cursor
+                cursor = tuple(before)
+                if ascending:
+                    end = bisect_left(keys, cursor)
+                    start = max(0, end - limit)
+                else:
+                    start = bisect_right(keys, cursor)
+                    end = start + limit
+            else:
+                cursor = None if after is None else tuple(after)
+                if ascending:
+                    start = 0 if cursor is None else bisect_right(keys, cursor)
+                    end = start + limit
+                else:
+                    end = len(keys) if cursor is None else bisect_left(keys, cursor)
+                    start = max(0, end - limit)
+            page_keys = keys[start:end]
+            page = [copy_product(product) for product in products[start:end]]
+        if not ascending:
+            page_keys.reverse()
+            page.reverse()
+        if not page:
+            return Page([])
+        return Page(page, page_keys[0], page_keys[-1])
+
+    def totals(self) -> Summary:
+        with self._lock:
+            if not self.count:
+                return Summary()
+            return Summary(
+                self.count,
+                self.quantities,
+                self.capital,
+                self.prices[0],
+                self.prices[-1],
+            )
+
+    def data_version(self) -> int:
+        # nothing else writes to it
+        return 0
+
+    def summary(self, criteria: tuple) -> Summary:
+        tests = [evaluate(criterion) for criterion in criteria]
+        with self._lock:
+            return aggregate(
+                p for p in self.products.values() if all(t(p) for t in tests)
+            )
+
+    def subtotals(self, criteria: list) -> list[Summary]:
+        tests = [evaluate(criterion) for criterion in criteria]
+        with self._lock:
+            products = list(self.products.values())
+        return [aggregate(p for p in products if matches(p)) for matches in tests]
+
+    def history(self, key: str, limit: int) -> list[StockMovement]:
+        with self._lock:
+            found = []
+            for movement in reversed(self.movements):
+                if len(found) == limit:
+                    break
+                if movement.name_key == key:
+                    found.append(StockMovement(**movement._asdict()))
+            return found
+
+    def snapshot(self) -> int:
+        with self._lock:
+            items = {p.id: (p.name, p.quantity) for p in self.products.values()}
+            movement_id = self.movements[-1].id if self.movements else 0
+            snapshot_id = len(self.snapshots) + 1
+            self.snapshots.append(Snapshot(snapshot_id, movement_id, utc_now(), items))
+            return snapshot_id
+
+    def stock_at(self, when: datetime) -> dict[str, int]:
+        with self._lock:
+            times = [snapshot.created_at for snapshot in self.snapshots]
+            index = bisect_right(times, when)
+            stock, after = {}, 0
+            if index:
+                snapshot = self.snapshots[index - 1]
+                stock, after = dict(snapshot.items), snapshot.movement_id
+            # movement ids are their position in the ledger plus one
+            for movement in self.movements[after:]:
+                if movement.created_at > when:
+                    break
+                if movement.kind == "delete":
+                    stock.pop(movement.product_id, None)
+                else:
+                    stock[movement.product_id] = (movement.name, movement.quantity)
+        return dict(stock.values())
+
+    def backup(self, path: str):
+        # the products only, written to a new database then moved in place
+        partial = f"{path}.partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        engine = models.open_engine(
+            partial, pool_size=1, pragmas={"journal_mode": "DELETE"}
+        )
+        try:
+            with engine.begin() as connection:
+                for rows in self.chunks(1000):
+                    values = [
+                        {"id": id, "name": name, "quantity": quantity, "price": price}
+                        for id, name, quantity, price in rows
+                    ]
+                    connection.execute(insert(ProductModel), values)
+        finally:
+            engine.dispose()
+        os.replace(partial, path)
+
+    def chunks(self, size: int) -> Iterator[list[tuple]]:
+        with self._lock:
+            products = sorted(self.products.values(), key=lambda p: p.id)
+            rows = [(p.id, p.name, p.quantity, p.price) for p in products]
+        for start in range(0, len(rows), size):
+            yield rows[start : start + size]
+
+
+def evaluate(criterion: tuple) -> Callable[[ProductModel], bool]:
+    """Test of a criterion on a product, in Python, like the SQL of
+    `queries.criterion_clause`; a missing value matches nothing.
+
+    Raises
+    ------
+    TypeError
+        If the criterion is a SQL expression, only the sqlite backend
+        runs those.
+    ValueError
+        If the field or operator is unknown.
+    """
+    if not isinstance(criterion, tuple):
+        raise TypeError(
+            f"Criterion {criterion} is not a (field, op, value) tuple, "
+            "see queries.Criterion"
+        )
+    field, op, value = make_criterion(criterion)
+
+    def actual(product: ProductModel):
+        if field == "total":
+            if product.price is None or product.quantity is None:
+                return None
+            return product.price * product.quantity
+        if field == "name":
+            return fold_name(product.name)
+        return getattr(product, field)
+
+    def test(product: ProductModel) -> bool:
+        current = actual(product)
+        if current is None:
+            return False
+        if op == "in":
+            return current in value
+        if op == "between":
+            return value[0] <= current <= value[1]
+        if op == "startswith":
+            return current.startswith(value)
+        return COMPARISONS[op](current, value)
+
+    return test
+
+
+def open_backend(config: dict | None = None) -> StorageBackend:
+    """Create the backend of the `storage` table of config.toml.
+
+    Parameters
+    ----------
+    config: dict
+        `backend` is `sqlite`, the default, or `memory`. With `preload`
+        true a memory backend starts with a copy of the database.
+    """
+    config = config or {}
+    backend = Backend(config.get("backend", Backend.SQLITE.value))
+    if backend is Backend.SQLITE:
+        return SqlBackend()
+    rows = ()
+    if config.get("preload"):
+        rows = (row for chunk in SqlBackend().chunks(1000) for row in chunk)
+    return MemoryBackend(rows)
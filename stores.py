@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import NamedTuple
+
+from cache import LRUCache
+from queries import Summary, rank_by_similarity
+from storage import SqlBackend
+
+# A chain of stores, each with its own sqlite file, registered in the
+# `stores` table of config.toml by store id:
+#
+#   [stores]
+#   north = "stores/north.db"
+#   south = "stores/south.db"
+#
+# `Chain.shop` routes Shop operations to the database of a store.
+# Queries on the whole chain run on every store in a pool of processes,
+# a worker opens each database once, read-only, and their results are
+# merged. A store whose database is missing is an error, it is never
+# created by a query.
+# Workers only import what the queries need, not shop and its logging.
+
+# stores handed to a worker at a time
+CHUNK_SIZE = 16
+# products returned per store by a chain search
+MATCHES = 10
+
+# backends opened by the worker process, by database path
+_backends: dict[str, SqlBackend] = {}
+
+
+class StoreProduct(NamedTuple):
+    """A product found in a store of the chain."""
+
+    store: str
+    id: int
+    name: str
+    quantity: int
+    price: int
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+def _backend(path: str) -> SqlBackend:
+    backend = _backends.get(path)
+    if backend is None:
+        # one connection is enough, a worker runs a query at a time
+        backend = SqlBackend(path, pool_size=1, readonly=True)
+        _backends[path] = backend
+    return backend
+
+
+def _totals(path: str) -> Summary:
+    return _backend(path).totals()
+
+
+def _search(args: tuple[str, str, int]) -> list[tuple]:
+    path, name, limit = args
+    backend = _backend(path)
+    products = backend.search_prefix(name, limit) + backend.search_fuzzy(name, limit)
+    seen = set()
+    found = []
+    for product in products:
+        if product.id not in seen:
+            seen.add(product.id)
+            found.append((product.id, product.name, product.quantity, product.price))
+    return found
+
+
+def merge_summaries(summaries) -> Summary:
+    """Add up the summaries of several stores into one.
+
+    The price range is the lowest minimum and the highest maximum, a
+    store without products has none.
+    """
+    total = Summary()
+    for summary in summaries:
+        total.count += summary.count
+        total.quantities += summary.quantities
+        total.capital += summary.capital
+        if summary.min_price is not None:
+            if total.min_price is None or summary.min_price < total.min_price:
+                total.min_price = summary.min_price
+        if summary.max_price is not None:
+            if total.max_price is None or summary.max_price > total.max_price:
+                total.max_price = summary.max_price
+    return total
+
+
+class Chain:
+    """
+    Stores of a chain, each one a Shop with its own database.
+    """
+
+    def __init__(self, stores: dict[str, str], workers=None):
+        """
+        Parameters
+        ----------
+        stores: dict[str, str]
+            Database path of each store id.
+        workers: int
+            Processes of the pool, default is the number of CPUs.
+        """
+        self.stores = dict(stores)
+        self.workers = workers or os.cpu_count() or 1
+        self.shops: dict[str, type] = {}
+        self._pool = None
+
+    @classmethod
+    def from_config(cls, filename="config.toml", workers=None) -> "Chain":
+        """Create the chain of the `stores` table of config.toml."""
+        from main import read_toml
+
+        return cls(read_toml(filename).get("stores") or {}, workers)
+
+    def shop(self, store: str) -> type:
+        """Shop of a store, with its own backend and caches.
+
+        Returns
+        -------
+        outs: type[Shop]
+            Return a subclass of Shop whose operations run on the
+            database of the store.
+
+        Raises
+        ------
+        KeyError
+            If the store is not in the chain.
+        """
+        from shop import Shop
+
+        shop = self.shops.get(store)
+        if shop is None:
+            if store not in self.stores:
+                raise KeyError(f"No store {store} in the chain")
+            path = self.stores[store]
+            shop = type(
+                f"Shop_{store}",
+                (Shop,),
+                {
+                    "backend": SqlBackend(path),
+                    "names": LRUCache(maxsize=Shop.names.maxsize),
+                    "queries": LRUCache(maxsize=Shop.queries.maxsize),
+                    "version": 0,
+                    "data_version": None,
+                    "writer": None,
+                },
+            )
+            self.shops[store] = shop
+        return shop
+
+    def pool(self) -> Executor:
+        """Pool of worker processes, started on first use."""
+        if self._pool is None:
+            # spawned, a forked worker would share the connections of
+            # the parent
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._pool
+
+    def paths(self) -> list[str]:
+        """Database paths of the stores, for a query on every store.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the database of a store does not exist.
+        """
+        missing = [
+            f"{store} ({path})"
+            for store, path in self.stores.items()
+            if not os.path.isfile(path)
+        ]
+        if missing:
+            raise FileNotFoundError(f"No database of store {', '.join(missing)}")
+        return list(self.stores.values())
+
+    def _map(self, function, args: list) -> list:
+        """Run a function on the args of every store, in the pool when
+        there are several stores."""
+        if len(args) < 2:
+            return [function(arg) for arg in args]
+        return list(self.pool().map(function, args, chunksize=CHUNK_SIZE))
+
+    def totals(self) -> dict[str, Summary]:
+        """Calculate the summary of each store.
+
+        Returns
+        -------
+        outs: dict[str, Summary]
+            Return the summary of each store keyed by store id.
+        """
+        summaries = self._map(_totals, self.paths())
+        return dict(zip(self.stores, summaries))
+
+    def summary(self) -> Summary:
+        """Calculate the summary of the whole chain."""
+        return merge_summaries(self.totals().values())
+
+    def total_capital(self) -> int:
+        return self.summary().capital
+
+    def total_quantities(self) -> int:
+        return self.summary().quantities
+
+    def search(self, name: str, limit=MATCHES) -> list[StoreProduct]:
+        """Find products by name in every store.
+
+        Each store returns the products starting with the name and the
+        most similar ones, and they are ranked together.
+
+        Parameters
+        ----------
+        name: str
+            Name or part of a name, letter case is ignored.
+        limit: int
+            Maximum number of products, of all stores.
+
+        Returns
+        -------
+        outs: list[StoreProduct]
+            Return the most similar products first, with their store.
+        """
+        args = [(path, name, limit) for path in self.paths()]
+        found = [
+            StoreProduct(store, *row)
+            for store, rows in zip(self.stores, self._map(_search, args))
+            for row in rows
+        ]
+        return rank_by_similarity(name, found, limit)
+
+    def close(self):
+        """Stop the workers and close the databases of the stores."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for shop in self.shops.values():
+            shop.close()
+            shop.backend.dispose()
+        self.shops.clear()
@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+import pytest
+
+import logs
+import models
+from shop import Shop
+from storage import SqlBackend
+
+# importing shop sends the records to shop.log of the working directory,
+# those of the tests go to a file of their own
+logs.configure(os.path.join(tempfile.mkdtemp(), "shop.log"))
+
+
+@pytest.fixture
+def database(tmp_path) -> str:
+    """Path of a new database, used by `Session` and Shop."""
+    path = str(tmp_path / "shop.db")
+    models.configure(path)
+    Shop.use(SqlBackend())
+    yield path
+    Shop.close()
+    models.engine.dispose()
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from shop import Shop
+from storage import MemoryBackend
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def shop(request, database):
+    """Shop on each backend, with a pen and a cup in stock."""
+    if request.param == "memory":
+        Shop.use(MemoryBackend())
+    Shop.save("pen", 5, 2)
+    Shop.save("cup", 1, 3)
+    return Shop
+
+
+def quantities(shop) -> tuple:
+    return shop.get("pen").quantity, shop.get("cup").quantity
+
+
+def test_adjust_stock(shop):
+    assert shop.adjust_stock("Pen", 3)
+    assert shop.adjust_stock("pen", -8)
+    assert not shop.adjust_stock("pen", -1)
+    assert not shop.adjust_stock("lamp", 1)
+    assert quantities(shop) == (0, 1)
+
+
+def test_adjust_many_is_all_or_nothing(shop):
+    assert shop.adjust_many({"pen": -2, "cup": -1})
+    assert quantities(shop) == (3, 0)
+    # the second adjustment fails, the first is rolled back
+    assert not shop.adjust_many({"pen": -1, "cup": -1})
+    assert not shop.adjust_many({"pen": -1, "lamp": 1})
+    assert quantities(shop) == (3, 0)
+
+
+def test_no_oversell(shop):
+    sold = []
+
+    def sell():
+        sold.append(shop.adjust_stock("pen", -1))
+
+    threads = [threading.Thread(target=sell) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sold.count(True) == 5
+    assert shop.get("pen").quantity == 0
+
+
+def test_write_behind(shop):
+    shop.write_behind(max_delay=0.05)
+    futures = [
+        shop.adjust_many({"pen": -1, "cup": -1}),
+        shop.adjust_many({"pen": -1, "cup": -1}),
+        shop.adjust_stock("pen", -1),
+    ]
+    assert [future.result() for future in futures] == [True, False, True]
+    assert quantities(shop) == (3, 0)
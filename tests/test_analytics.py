@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import insert
+
+import models
+from models import Product as ProductModel
+from shop import Shop
+
+# numpy is the analytics extra
+np = pytest.importorskip("numpy")
+from analytics import Analytics, Band, Line  # noqa: E402
+
+
+def arrays(analytics: Analytics) -> tuple:
+    return (
+        analytics.ids.tolist(),
+        analytics.names.tolist(),
+        analytics.quantities.tolist(),
+        analytics.prices.tolist(),
+    )
+
+
+@pytest.fixture
+def catalog(database):
+    for name, quantity, price in [
+        ("pen", 10, 2),
+        ("cup", 1, 50),
+        ("lamp", 4, 100),
+        ("desk", 0, 300),
+    ]:
+        Shop.save(name, quantity, price)
+    return database
+
+
+def test_reports(catalog):
+    analytics = Analytics.load()
+    assert len(analytics) == 4
+    assert analytics.top_by_value(2) == [
+        Line("lamp", 4, 100, 400),
+        Line("cup", 1, 50, 50),
+    ]
+    assert [line.name for line in analytics.low_stock(1)] == ["desk", "cup"]
+    assert analytics.price_percentiles((0, 50, 100)) == {0: 2, 50: 75, 100: 300}
+    assert analytics.value_by_price_band([0, 10, 100, 300]) == [
+        Band(0, 10, 1, 10, 20),
+        Band(10, 100, 1, 1, 50),
+        Band(100, 300, 2, 4, 400),
+    ]
+
+
+def test_reorder(catalog):
+    Shop.adjust_stock("pen", -6)
+    analytics = Analytics.load()
+    # 6 sold in 3 days is 2 a day, 8 over the lead time, 4 are left
+    lines = analytics.reorder(lead_days=4, window_days=3)
+    assert [line.name for line in lines] == ["pen"]
+    assert analytics.reorder(lead_days=1, window_days=3) == []
+
+
+def test_refresh_applies_the_ledger(catalog):
+    analytics = Analytics.load()
+    Shop.save("pen", 5, 3)
+    Shop.remove("cup")
+    Shop.save("mug", 7, 9)
+    assert analytics.refresh() == 3
+    assert arrays(analytics) == arrays(Analytics.load())
+    assert analytics.refresh() == 0
+
+
+def test_missing_names(catalog):
+    with models.session_scope() as session:
+        session.execute(insert(ProductModel).values(quantity=3, price=4))
+    analytics = Analytics.load()
+    assert "" in analytics.names.tolist()
+    analytics.RELOAD_RATIO = 10
+    with models.session_scope() as session:
+        session.execute(insert(ProductModel).values(quantity=1, price=1))
+    assert analytics.refresh() == 1
+    assert arrays(analytics) == arrays(Analytics.load())
+    assert np.count_nonzero(analytics.names == "") == 2
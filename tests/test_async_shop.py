@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from async_shop import AsyncShop
+from queries import Direction, Merge, Order
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Run a coroutine with AsyncShop on a new database."""
+    loop = asyncio.new_event_loop()
+    path = str(tmp_path / "async ?#.db")
+    loop.run_until_complete(AsyncShop.configure(path))
+    yield loop.run_until_complete
+    loop.run_until_complete(AsyncShop.dispose())
+    loop.close()
+
+
+def test_writes_and_reads(run):
+    async def scenario():
+        assert await AsyncShop.save("Pen", 2, 3)
+        assert await AsyncShop.save("pen", 1, 4)
+        assert await AsyncShop.save("PEN", 9, 9, merge=Merge.KEEP)
+        product = await AsyncShop.get("pEn")
+        assert (product.name, product.quantity, product.price) == ("Pen", 3, 4)
+        assert await AsyncShop.search("pen") == "Name: Pen\nQuntity: 3\nPrice: 4\n"
+        assert await AsyncShop.search("cup") == ""
+        assert await AsyncShop.adjust_stock("pen", -3)
+        assert not await AsyncShop.adjust_stock("pen", -1)
+        assert await AsyncShop.remove("pen")
+        assert not await AsyncShop.remove("pen")
+        assert await AsyncShop.get("pen") is None
+
+    run(scenario())
+
+
+def test_concurrent_tasks(run):
+    async def scenario():
+        names = [f"product {i}" for i in range(50)]
+        results = await asyncio.gather(
+            *(AsyncShop.save(name, 1, 2) for name in names),
+            *(AsyncShop.save("shared", 1, 2) for _ in range(20)),
+        )
+        assert all(results)
+        summary = await AsyncShop.summary()
+        assert (summary.count, summary.quantities) == (51, 70)
+        assert await AsyncShop.total_capital() == 140
+        assert await AsyncShop.total_quantities() == 70
+        assert (await AsyncShop.summary(("quantity", ">", 1))).count == 1
+        # all or nothing
+        deltas = {"shared": -5, "product 1": -2}
+        assert not await AsyncShop.adjust_many(deltas)
+        assert (await AsyncShop.get("shared")).quantity == 20
+
+    run(scenario())
+
+
+def test_pages(run):
+    async def scenario():
+        for i in range(7):
+            await AsyncShop.save(f"p{i}", 7 - i, i)
+        page = await AsyncShop.page(Order.QUANTITY, Direction.ASC, limit=3)
+        assert [p.name for p in page.products] == ["p6", "p5", "p4"]
+        after = await AsyncShop.page(Order.QUANTITY, after=page.last, limit=3)
+        assert [p.name for p in after.products] == ["p3", "p2", "p1"]
+        before = await AsyncShop.page(Order.QUANTITY, before=after.first, limit=3)
+        assert [p.name for p in before.products] == ["p6", "p5", "p4"]
+        names = [p.name async for p in AsyncShop.iter_products(batch_size=2)]
+        assert names == [f"p{i}" for i in range(7)]
+
+    run(scenario())
+
+
+def test_find(run):
+    async def scenario():
+        for name in ("apple pie", "apple juice", "coffee mug", "desk lamp"):
+            await AsyncShop.save(name, 1, 1)
+        return [
+            [p.name for p in await AsyncShop.find(text)]
+            for text in ("apple", "cofee mgu", "lamp")
+        ]
+
+    found = run(scenario())
+    assert found[0] == ["apple juice", "apple pie"]
+    assert found[1][0] == "coffee mug"
+    assert found[2][0] == "desk lamp"
@@ -0,0 +1,88 @@
+import sqlite3
+
+from cache import LRUCache
+from queries import Direction, Order
+from server import op_stats
+from shop import Shop
+from ui import Ui
+
+
+def test_lru_counts_and_evicts():
+    cache = LRUCache(maxsize=2)
+    assert cache.get_or_compute("a", lambda: 1) == 1
+    assert cache.get_or_compute("a", lambda: 2) == 1
+    cache.get_or_compute("b", lambda: 2)
+    # a was used last, b is the one evicted
+    cache.get_or_compute("a", lambda: 0)
+    cache.get_or_compute("c", lambda: 3)
+    assert cache.get_or_compute("b", lambda: 4) == 4
+    assert cache.stats() == {
+        "size": 2,
+        "maxsize": 2,
+        "hits": 2,
+        "misses": 4,
+        "evictions": 2,
+    }
+    empty = LRUCache(maxsize=0)
+    empty.get_or_compute("a", lambda: 1)
+    assert len(empty) == 0
+
+
+def test_value_dropped_while_computing_is_not_stored():
+    cache = LRUCache()
+
+    def compute():
+        cache.clear()
+        return "stale"
+
+    assert cache.get_or_compute("a", compute) == "stale"
+    assert cache.get_or_compute("a", lambda: "fresh") == "fresh"
+
+
+def test_writes_drop_cached_reads(database):
+    Shop.save("pen", 1, 2)
+    assert Shop.get("pen").quantity == 1
+    assert Shop.summary().quantities == 1
+    Shop.adjust_stock("pen", 4)
+    assert Shop.get("PEN").quantity == 5
+    assert Shop.summary().quantities == 5
+    Shop.remove("pen")
+    assert Shop.get("pen") is None
+
+
+def test_writes_of_another_connection_drop_cached_reads(database):
+    Shop.save("pen", 1, 2)
+    assert Shop.get("pen").quantity == 1
+    assert [p.name for p in Shop.find("pe")] == ["pen"]
+    connection = sqlite3.connect(database)
+    connection.execute("UPDATE product SET quantity = 7")
+    connection.execute("INSERT INTO product (name, name_key) VALUES ('pear', 'pear')")
+    connection.commit()
+    connection.close()
+    assert Shop.get("pen").quantity == 7
+    assert [p.name for p in Shop.find("pe")] == ["pear", "pen"]
+
+
+def test_cached_results_are_copies(database):
+    Shop.save("pen", 1, 2)
+    Shop.get("pen").quantity = 100
+    Shop.find("pen")[0].quantity = 100
+    page = Shop.page(Order.NAME, Direction.ASC)
+    page.products[0].quantity = 100
+    page.products.clear()
+    Shop.summary().quantities = 100
+    assert Shop.get("pen").quantity == 1
+    assert Shop.find("pen")[0].quantity == 1
+    assert Shop.page(Order.NAME, Direction.ASC).products[0].quantity == 1
+    assert Shop.summary().quantities == 1
+    assert Shop.cache_stats()["queries"]["hits"] >= 3
+
+
+def test_cache_stats_are_shown(database, capsys):
+    Shop.get("pen")
+    Shop.get("pen")
+    caches = op_stats()["caches"]
+    assert caches["names"]["hits"] >= 1
+    Ui.stats_ui()
+    out = capsys.readouterr().out
+    assert "names" in out and "queries" in out
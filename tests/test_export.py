@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+import pytest
+
+import export_products
+import feed
+import models
+from shop import Shop
+from storage import SqlBackend, open_backend
+
+PRODUCTS = [
+    ("pen", 2, 5),
+    ("ice cream", 0, 3),
+    ('éclair, "fresh"\nbox', 7, 1),
+    ("gold bar", 3, 2**40),
+]
+
+
+@pytest.fixture
+def stocked(database):
+    for name, quantity, price in PRODUCTS:
+        Shop.save(name, quantity, price)
+    return database
+
+
+def exported(path) -> list[tuple]:
+    return [
+        (record["name"], int(record["quantity"]), int(record["price"]))
+        for _, record in feed.read_records(path)
+    ]
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl", ".col"])
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_round_trip(stocked, tmp_path, suffix, backend):
+    if backend == "memory":
+        Shop.use(open_backend({"backend": "memory", "preload": True}))
+    path = str(tmp_path / f"products{suffix}")
+    # chunks smaller than the catalog give several row groups
+    assert Shop.export(path, chunk_size=3) == len(PRODUCTS)
+    assert exported(path) == PRODUCTS
+    assert not os.path.exists(f"{path}.partial")
+
+
+def test_format_overrides_extension(stocked, tmp_path):
+    path = str(tmp_path / "products.txt")
+    assert Shop.export(path, feed.Format.JSONL) == len(PRODUCTS)
+    records = [record for _, record in feed.read_jsonl(path)]
+    assert [record["name"] for record in records] == [p[0] for p in PRODUCTS]
+    with pytest.raises(ValueError):
+        Shop.export(str(tmp_path / "products.xml"))
+    assert not os.path.exists(tmp_path / "products.xml")
+
+
+def test_columnar_import(stocked, tmp_path):
+    path = str(tmp_path / "products.col")
+    Shop.export(path)
+    models.configure(str(tmp_path / "other.db"))
+    Shop.use(SqlBackend())
+    report = Shop.bulk_import(path)
+    assert (report.rows, report.rejected) == (len(PRODUCTS), 0)
+    assert Shop.get("gold bar").price == 2**40
+
+
+def test_truncated_columnar_file(stocked, tmp_path):
+    path = tmp_path / "products.col"
+    Shop.export(str(path))
+    data = path.read_bytes()
+    # cut in the columns, then in the names
+    for size in (40, len(data) - 4):
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            list(feed.read_columnar(path))
+
+
+def test_backup_and_cli(stocked, tmp_path, capsys):
+    copy = str(tmp_path / "copy.db")
+    export_products.main([copy, "--backup"])
+    with sqlite3.connect(copy) as connection:
+        rows = connection.execute("SELECT name FROM product ORDER BY id").fetchall()
+    assert [row[0] for row in rows] == [name for name, _, _ in PRODUCTS]
+    path = str(tmp_path / "products.csv")
+    export_products.main([path, "--chunk-size", "1"])
+    assert capsys.readouterr().out.endswith(f"Exported 4 products to {path}\n")
+    with pytest.raises(SystemExit):
+        export_products.main([str(tmp_path / "products.xml")])
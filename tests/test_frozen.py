@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from sqlalchemy import insert
+
+import frozen
+import models
+from frozen import FrozenCatalog, Item
+from models import Product as ProductModel
+from shop import Shop
+from storage import SqlBackend
+
+
+@pytest.fixture
+def database(tmp_path) -> str:
+    # characters that mean something in a URI
+    path = str(tmp_path / "shop ?#%20.db")
+    models.configure(path)
+    Shop.use(SqlBackend())
+    yield path
+    Shop.close()
+    models.engine.dispose()
+
+
+def test_build_and_look_up(database, tmp_path):
+    for name, quantity, price in [("pen", 2, 3), ("Éclair", 1, 4), ("PEAR", 5, 1)]:
+        Shop.save(name, quantity, price)
+    with models.session_scope() as session:
+        session.execute(insert(ProductModel).values(quantity=1, price=1))
+    path = str(tmp_path / "catalog.frz")
+    # products without a name can't be looked up and are left out
+    assert frozen.build(database, path) == 3
+    catalog = FrozenCatalog(path)
+    assert len(catalog) == 3
+    assert catalog.get("ÉCLAIR") == Item(2, "Éclair", 1, 4)
+    assert catalog.get("apple") is None
+    assert [item.name for item in catalog.find("pe")] == ["PEAR", "pen"]
+    assert [item.name for item in catalog.find("PE", limit=1)] == ["PEAR"]
+    assert catalog.find("z") == []
+    assert catalog.search("pen") == Shop.search("pen")
+
+
+def test_reload_a_new_build(database, tmp_path):
+    path = str(tmp_path / "catalog.frz")
+    assert frozen.build(database, path) == 0
+    catalog = FrozenCatalog(path)
+    assert catalog.get("pen") is None
+    assert not catalog.reload()
+    Shop.save("pen", 2, 3)
+    frozen.build(database, path)
+    # a new file, even if built within the same clock tick
+    os.utime(path, ns=(0, catalog.stat.st_mtime_ns + 1))
+    assert catalog.reload()
+    assert catalog.get("pen").quantity == 2
+
+
+def test_not_a_catalog(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        FrozenCatalog(str(path))
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    """Run the inventory command on a new database, in an empty directory."""
+
+    def run(*args, stdin=None) -> tuple[int, list[dict]]:
+        command = [sys.executable, str(ROOT / "inventory.py")]
+        command += ["--database", str(tmp_path / "shop.db"), *args]
+        env = {**os.environ, "PYTHONPATH": str(ROOT)}
+        process = subprocess.run(
+            command, input=stdin, capture_output=True, text=True, cwd=tmp_path, env=env
+        )
+        lines = process.stdout.splitlines()
+        return process.returncode, [json.loads(line) for line in lines]
+
+    return run
+
+
+def test_commands(inventory):
+    assert inventory("add", "Pen", "-q", "10", "-p", "2") == (0, [{"ok": True}])
+    assert inventory("add", "cup", "-q", "1", "-p", "5") == (0, [{"ok": True}])
+    assert inventory("adjust", "pen", "-11") == (1, [{"ok": False}])
+    assert inventory("adjust", "pen", "-4") == (0, [{"ok": True}])
+    code, [result] = inventory("search", "PEN")
+    assert result["product"]["quantity"] == 6
+    code, [result] = inventory("list", "--order", "price", "--direction", "dec")
+    assert [p["name"] for p in result["products"]] == ["cup", "Pen"]
+    code, [result] = inventory("totals")
+    assert (result["count"], result["quantities"], result["capital"]) == (2, 7, 17)
+    code, [result] = inventory("history", "pen")
+    assert [m["kind"] for m in result["movements"]] == ["update", "insert"]
+    assert inventory("remove", "lamp") == (1, [{"ok": False}])
+    code, [result] = inventory("list", "--order", "colour")
+    assert code == 1 and "error" in result
+
+
+def test_batch(inventory):
+    lines = [
+        "# stock the shop",
+        "add pen -q 3 -p 2",
+        "add 'ice cream' -q 1",
+        "adjust pen -5",
+        "totals",
+        "fly away",
+        "search 'ice cream'",
+    ]
+    code, results = inventory("batch", "--group", "2", stdin="\n".join(lines))
+    assert code == 1
+    assert [result["line"] for result in results] == [2, 3, 4, 5, 6, 7]
+    assert results[0]["ok"] and results[1]["ok"] and not results[2]["ok"]
+    # reads see the writes of the lines before them
+    assert results[3]["count"] == 2 and results[3]["quantities"] == 4
+    assert "error" in results[4]
+    assert results[5]["product"]["name"] == "ice cream"
+
+
+def test_usage_errors(inventory):
+    code, results = inventory("add")
+    assert code == 2 and results == []
+    code, [result] = inventory("chain", "search")
+    assert code == 1 and "error" in result
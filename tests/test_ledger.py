@@ -0,0 +1,77 @@
+import sqlite3
+import time
+
+import pytest
+
+from migrations import SCHEMA_VERSION
+from shop import Shop
+from storage import MemoryBackend, SqlBackend, utc_now
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, database):
+    if request.param == "memory":
+        Shop.use(MemoryBackend())
+    return Shop.backend
+
+
+def pause() -> None:
+    # ledger times have milliseconds
+    time.sleep(0.01)
+
+
+def test_history_and_totals(backend):
+    Shop.save("Pen", 3, 2)
+    Shop.adjust_stock("pen", -1)
+    Shop.save("cup", 1, 5)
+    Shop.remove("PEN")
+    movements = [(m.kind, m.delta, m.quantity) for m in Shop.history("pen")]
+    assert movements == [("delete", -2, 0), ("update", -1, 2), ("insert", 3, 3)]
+    assert Shop.history("pen", limit=1)[0].kind == "delete"
+    summary = Shop.summary()
+    assert (summary.count, summary.quantities, summary.capital) == (1, 1, 5)
+
+
+def test_stock_at(backend):
+    Shop.save("pen", 3, 2)
+    pause()
+    before_snapshot = utc_now()
+    pause()
+    Shop.snapshot()
+    Shop.adjust_stock("pen", 4)
+    Shop.save("cup", 1, 5)
+    pause()
+    after_writes = utc_now()
+    pause()
+    Shop.remove("cup")
+    assert Shop.stock_at(before_snapshot) == {"pen": 3}
+    assert Shop.stock_at(after_writes) == {"pen": 7, "cup": 1}
+    assert Shop.stock_at(utc_now()) == {"pen": 7}
+
+
+def test_upgrade_starts_the_ledger(tmp_path):
+    path = str(tmp_path / "old.db")
+    # a database of the first version, before any revision
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE product (id INTEGER PRIMARY KEY, name VARCHAR, "
+        "quantity INTEGER, price INTEGER)"
+    )
+    connection.executemany(
+        "INSERT INTO product VALUES (?, ?, ?, ?)",
+        [(1, "Pen", 2, 10), (2, "cup", 1, 3), (3, "pen", 5, 12)],
+    )
+    connection.commit()
+    connection.close()
+    backend = SqlBackend(path)
+    try:
+        with backend.engine.connect() as connection:
+            version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+        assert version == SCHEMA_VERSION
+        # totals of the merged products, and their stock as first snapshot
+        summary = backend.totals()
+        assert (summary.count, summary.quantities, summary.capital) == (2, 8, 87)
+        assert backend.stock_at(utc_now()) == {"Pen": 7, "cup": 1}
+        assert backend.history("pen", 10) == []
+    finally:
+        backend.dispose()
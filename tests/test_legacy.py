@@ -0,0 +1,111 @@
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import legacy
+from shop import Shop
+from storage import MemoryBackend
+
+ROOT = Path(__file__).resolve().parent.parent
+LINES = 30_000
+CHUNK_SIZE = 100
+
+
+def legacy_file(path: Path):
+    """Legacy inventory with duplicate names and some broken lines."""
+    rand = random.Random(3)
+    with open(path, "w", encoding="utf-8") as file:
+        for number in range(LINES):
+            name = f"product {rand.randrange(LINES // 2)}"
+            quantity, price = rand.randint(0, 9), rand.randint(1, 99)
+            total = quantity * price if number % 97 else quantity * price + 1
+            file.write(f"{name},{quantity},{price},{total}\n")
+
+
+def migrate(cwd: Path, database: str, *args) -> subprocess.Popen:
+    command = [sys.executable, str(ROOT / "inventory.py"), "--database", database]
+    command += ["migrate-legacy", "inventory.txt", "--chunk-size", str(CHUNK_SIZE)]
+    environment = {**os.environ, "PYTHONPATH": str(ROOT)}
+    return subprocess.Popen(
+        command + list(args), cwd=cwd, env=environment, stdout=subprocess.PIPE
+    )
+
+
+def products(path: Path) -> list[tuple]:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(
+            "SELECT name, quantity, price FROM product ORDER BY name"
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_killed_migration_resumes(tmp_path):
+    reference, killed = tmp_path / "reference", tmp_path / "killed"
+    for directory in (reference, killed):
+        directory.mkdir()
+        legacy_file(directory / "inventory.txt")
+    process = migrate(reference, "shop.db")
+    expected = json.loads(process.communicate(timeout=300)[0])
+
+    process = migrate(killed, "shop.db")
+    checkpoint = killed / "inventory.txt.checkpoint"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if checkpoint.exists() and json.loads(checkpoint.read_text())["offset"]:
+            break
+        time.sleep(0.01)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    state = json.loads(checkpoint.read_text())
+    assert 0 < state["offset"] and not state["done"], "killed after it ended"
+
+    process = migrate(killed, "shop.db")
+    report = json.loads(process.communicate(timeout=300)[0])
+    assert report["done"] and report["lines"] == expected["lines"] == LINES
+    assert report["rejected"] == expected["rejected"] > 0
+    assert report["inserted"] == expected["inserted"]
+    assert products(killed / "shop.db") == products(reference / "shop.db")
+    errors = (killed / "inventory.txt.errors.jsonl").read_text()
+    assert errors == (reference / "inventory.txt.errors.jsonl").read_text()
+
+
+def test_parse_line():
+    assert legacy.parse_line("pen, blue,2,3,6") == {
+        "name": "pen, blue",
+        "quantity": 2,
+        "price": 3,
+    }
+    for line in ("pen,2,3", "pen,2,3,7", "pen,two,3,6", "pen,2,3,six"):
+        with pytest.raises(ValueError):
+            legacy.parse_line(line)
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_migrates_through_the_shop_backend(database, tmp_path, backend):
+    if backend == "memory":
+        Shop.use(MemoryBackend())
+    path = tmp_path / "inventory.txt"
+    path.write_text("pen,2,3,6\ncup,1,5,5\nPen,9,9,81\nbad line\nmug,1,1,2\n")
+    Shop.save("cup", 7, 1)
+    # cached before the migration
+    assert Shop.get("pen") is None
+    assert Shop.summary().count == 1
+    report = Shop.migrate_legacy(str(path), chunk_size=2)
+    assert (report.lines, report.inserted, report.duplicates) == (5, 1, 2)
+    assert report.rejected == 2 and report.done
+    assert Shop.get("pen").quantity == 2
+    assert Shop.get("cup").quantity == 7
+    assert Shop.summary().count == 2
+    on_disk = products(Path(database))
+    assert on_disk == ([("cup", 7, 1), ("pen", 2, 3)] if backend == "sqlite" else [])
@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+import tempfile
+
+import pytest
+
+import logs
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Log file of a test, the records of the others go back to theirs."""
+    path = tmp_path / "shop.log"
+    yield path
+    logs.configure(os.path.join(tempfile.mkdtemp(), "shop.log"))
+
+
+def records(path) -> list[dict]:
+    logs.stop()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_json_lines_with_fields(log_file):
+    logs.configure(str(log_file), level="INFO")
+    logging.debug("not written")
+    logging.info("Saved", extra={"operation": "save", "product": "pen", "ms": 1.5})
+    logging.error("Error on remove: 'ç'\nline", extra={"rows": 0, "colour": "red"})
+    first, second = records(log_file)
+    assert first["level"] == "INFO" and first["message"] == "Saved"
+    assert (first["operation"], first["product"], first["ms"]) == ("save", "pen", 1.5)
+    assert second["message"] == "Error on remove: 'ç'\nline"
+    # only the known fields are written
+    assert second["rows"] == 0 and "colour" not in second
+
+
+def test_reconfigure_and_rotate(log_file, tmp_path):
+    logs.configure(str(tmp_path / "old.log"))
+    logs.configure(str(log_file), max_bytes=500, backup_count=2)
+    for index in range(30):
+        logging.warning(f"record {index}")
+    lines = records(log_file)
+    assert not (tmp_path / "old.log").read_text()
+    assert lines[-1]["message"] == "record 29"
+    assert (tmp_path / "shop.log.1").exists()
+    assert not (tmp_path / "shop.log.3").exists()
+
+
+def test_configure_from(log_file, tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text(f'[logging]\nlevel = "DEBUG"\npath = "{log_file}"\n')
+    logs.configure_from(str(config), level="ERROR")
+    logging.debug("written")
+    assert [line["message"] for line in records(log_file)] == ["written"]
+    logs.configure_from(str(tmp_path / "missing.toml"), path=str(log_file))
+    assert logging.getLogger().level == logging.WARNING
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import metrics
+from shop import Shop
+
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def test_off_by_default():
+    @metrics.timed
+    def work():
+        return 1
+
+    metrics.reset()
+    assert work() == 1
+    assert metrics.snapshot() == {"enabled": False, "operations": {}}
+
+
+def test_counts_calls_and_errors(recording):
+    @metrics.timed(name="divide")
+    def divide(a, b):
+        return a / b > 1
+
+    assert divide(4, 2) is True
+    assert divide(1, 2) is False
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+    figures = recording.snapshot()["operations"]["divide"]
+    assert (figures["count"], figures["errors"]) == (3, 2)
+    assert 0 < figures["p50_ms"] <= figures["p99_ms"]
+
+
+def test_generators_and_nesting(recording):
+    @metrics.timed
+    def inner():
+        return True
+
+    @metrics.timed
+    def outer():
+        for _ in range(3):
+            inner()
+            yield 1
+
+    assert list(outer()) == [1, 1, 1]
+    operations = recording.snapshot()["operations"]
+    assert operations["inner"]["count"] == 3
+    assert operations["outer"]["count"] == 1
+    assert operations["outer"]["errors"] == 0
+
+
+def test_statements_and_rows(recording, database, tmp_path):
+    Shop.save("pen", 1, 2)
+    Shop.get("pen")
+    operations = recording.snapshot()["operations"]
+    assert operations["save"]["statements"] >= 1
+    assert operations["save"]["rows"] >= 1
+    assert operations["get"]["rows_per_call"] == 1
+    path = tmp_path / "stats.json"
+    recording.dump(str(path))
+    assert json.loads(path.read_text())["operations"]["save"]["count"] == 1
+
+
+def test_histogram_percentiles():
+    histogram = metrics.Histogram()
+    assert histogram.percentile(50) == 0.0
+    for micros in range(1, 101):
+        histogram.add(micros / 1e6)
+    # buckets are about 9% wide
+    assert 50e-6 <= histogram.percentile(50) <= 50e-6 * 1.1
+    assert 99e-6 <= histogram.percentile(99) <= 99e-6 * 1.1
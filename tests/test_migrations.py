@@ -0,0 +1,102 @@
+import sqlite3
+
+from sqlalchemy import select
+
+import models
+from migrations import SCHEMA_VERSION
+from models import Product
+from queries import Direction, Order, page_statement
+
+
+def old_database(path: str, rows: list[tuple]):
+    """Database of the first version, before any revision."""
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE product (id INTEGER PRIMARY KEY, name VARCHAR, "
+        "quantity INTEGER, price INTEGER)"
+    )
+    connection.executemany(
+        "INSERT INTO product (id, name, quantity, price) VALUES (?, ?, ?, ?)", rows
+    )
+    connection.commit()
+    connection.close()
+
+
+def test_upgrade_merges_names_differing_in_case(tmp_path):
+    path = str(tmp_path / "old.db")
+    old_database(
+        path,
+        [
+            (1, "Pen", 2, 10),
+            (2, "Éclair", 1, 3),
+            (3, "pen", 5, 12),
+            (4, "éclair", 4, 5),
+            (5, "ÉCLAIR", 2, 6),
+            (6, "cup", 1, 1),
+        ],
+    )
+    engine = models.open_engine(path, pool_size=1)
+    try:
+        with engine.connect() as connection:
+            version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+            products = connection.execute(
+                select(
+                    Product.id, Product.name, Product.quantity, Product.price
+                ).order_by(Product.id)
+            ).all()
+    finally:
+        engine.dispose()
+    assert version == SCHEMA_VERSION
+    # the oldest row is kept with the sum of quantities and newest price
+    assert products == [(1, "Pen", 7, 12), (2, "Éclair", 7, 6), (6, "cup", 1, 1)]
+
+
+def test_upgraded_names_are_found_in_any_case(tmp_path):
+    from shop import Shop
+    from storage import SqlBackend
+
+    path = str(tmp_path / "old.db")
+    old_database(path, [(1, "Éclair", 1, 3), (2, "éclair", 4, 5)])
+    backend = SqlBackend(path)
+    try:
+        for name in ("Éclair", "éclair", "ÉCLAIR"):
+            assert backend.get(name).quantity == 5
+        with backend.transaction() as tx:
+            assert backend.adjust(tx, "ÉCLAIR".lower(), -2)
+            row = {"name": "ÉCLAIR", "quantity": 1, "price": 5}
+            backend.upsert(tx, [row], Shop.MERGE)
+        assert backend.get("éclair").quantity == 4
+        assert backend.totals().count == 1
+    finally:
+        backend.dispose()
+
+
+def schema(path: str) -> list[tuple]:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE type IN ('index', 'trigger') ORDER BY name"
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def test_upgraded_indexes_match_new_ones(tmp_path):
+    old, new = str(tmp_path / "old.db"), str(tmp_path / "new.db")
+    old_database(old, [(1, None, None, None), (2, "pen", 1, 2)])
+    for path in (old, new):
+        models.open_engine(path, pool_size=1).dispose()
+    assert [row[:2] for row in schema(old)] == [row[:2] for row in schema(new)]
+    # the expressions of revision 2 are those of the models, so pages
+    # are read from the indexes
+    engine = models.open_engine(old, pool_size=1)
+    try:
+        with engine.connect() as connection:
+            for order in (Order.NAME, Order.PRICE, Order.QUANTITY, Order.TOTAL):
+                stmt = page_statement(order, Direction.ASC, None, None, 5)
+                sql = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+                plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+                assert f"ix_product_{order.value}" in str(plan), plan
+    finally:
+        engine.dispose()
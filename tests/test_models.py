@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+import models
+from models import Product as ProductModel
+from shop import Shop
+from storage import SqlBackend
+
+
+def count(path: str) -> int:
+    engine = models.open_engine(path, pool_size=1)
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(func.count()).select_from(ProductModel))
+    finally:
+        engine.dispose()
+
+
+def test_configure_moves_every_thread(tmp_path):
+    first, second = str(tmp_path / "a.db"), str(tmp_path / "b.db")
+    models.configure(first)
+    Shop.use(SqlBackend())
+    try:
+        with ThreadPoolExecutor(1) as pool:
+            assert pool.submit(Shop.save, "pen", 1, 2).result()
+            models.configure(second)
+            # the same thread, its next unit of work is on the new engine
+            assert pool.submit(Shop.save, "cup", 1, 2).result()
+    finally:
+        Shop.close()
+        models.engine.dispose()
+    assert count(first) == 1
+    assert count(second) == 1
+
+
+def test_path_with_uri_characters(tmp_path):
+    path = str(tmp_path / "shop ?#%20.db")
+    models.configure(path)
+    Shop.use(SqlBackend())
+    try:
+        assert Shop.save("pen", 1, 2)
+    finally:
+        Shop.close()
+        models.engine.dispose()
+    assert os.listdir(tmp_path) == ["shop ?#%20.db"]
+    assert count(path) == 1
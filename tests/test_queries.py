@@ -0,0 +1,91 @@
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from models import Product, session_scope
+from queries import Direction, Order
+from storage import MemoryBackend, SqlBackend, sort_key
+
+PAGE_SIZE = 7
+
+
+def walk_forward(backend, order, direction) -> list[int]:
+    ids, page = [], backend.page(order, direction, None, None, PAGE_SIZE)
+    while page.products:
+        ids += [product.id for product in page.products]
+        page = backend.page(order, direction, page.last, None, PAGE_SIZE)
+    return ids
+
+
+def walk_backward(backend, order, direction, cursor) -> list[int]:
+    ids, page = [], backend.page(order, direction, None, cursor, PAGE_SIZE)
+    while page.products:
+        ids = [product.id for product in page.products] + ids
+        page = backend.page(order, direction, None, page.first, PAGE_SIZE)
+    return ids
+
+
+def expected(products, order, direction) -> list[int]:
+    ordered = sorted(products, key=lambda product: sort_key(order, product))
+    if direction is Direction.DEC:
+        ordered.reverse()
+    return [product.id for product in ordered]
+
+
+@pytest.fixture
+def rows():
+    rand = random.Random(5)
+    # repeated prices and quantities, so pages split runs of equal keys
+    return [
+        {
+            "id": id,
+            "name": f"{rand.choice(['Pen', 'cup', 'Éclair'])} {id}",
+            "quantity": rand.randint(0, 3),
+            "price": rand.randint(0, 3),
+        }
+        for id in range(1, 60)
+    ]
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, database, rows):
+    if request.param == "memory":
+        return MemoryBackend(
+            (row["id"], row["name"], row["quantity"], row["price"]) for row in rows
+        )
+    with session_scope() as session:
+        session.execute(insert(Product), rows)
+    return SqlBackend()
+
+
+@pytest.mark.parametrize("direction", list(Direction))
+@pytest.mark.parametrize("order", list(Order))
+def test_pages_round_trip(backend, rows, order, direction):
+    products = [Product(**row) for row in rows]
+    ids = walk_forward(backend, order, direction)
+    assert ids == expected(products, order, direction)
+    last = backend.page(order, direction, None, None, len(ids)).last
+    # every page before the last product, walked from the end
+    assert walk_backward(backend, order, direction, last) == ids[:-1]
+
+
+@pytest.mark.parametrize("order", list(Order))
+def test_cursor_of_missing_values(database, order):
+    with session_scope() as session:
+        session.execute(
+            insert(Product),
+            [
+                {"name": None, "quantity": None, "price": None},
+                {"name": "pen", "quantity": None, "price": 2},
+                {"name": "cup", "quantity": 1, "price": None},
+                {"name": "mug", "quantity": 2, "price": 3},
+            ],
+        )
+    backend = SqlBackend()
+    for direction in Direction:
+        ids = walk_forward(backend, order, direction)
+        assert sorted(ids) == [1, 2, 3, 4]
+        last = backend.page(order, direction, None, None, 4).last
+        assert None not in last
+        assert walk_backward(backend, order, direction, last) == ids[:-1]
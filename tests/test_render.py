@@ -0,0 +1,60 @@
+import io
+
+import render
+from render import Column
+
+COLUMNS = [Column("Name"), Column("Qty", ">"), Column("Price", ">", " $")]
+
+
+def test_table():
+    rows = [("pen", 2, 5), ("ice cream", 10, 3)]
+    text = "".join(render.table(COLUMNS, rows, footer=("Total", 12, "")))
+    assert text == (
+        "Name       Qty  Price  \n"
+        "-----------------------\n"
+        "pen          2      5 $\n"
+        "ice cream   10      3 $\n"
+        "-----------------------\n"
+        "Total       12         \n"
+    )
+
+
+def test_rows_are_streamed_in_chunks():
+    consumed = []
+
+    def rows():
+        for index in range(5):
+            consumed.append(index)
+            yield (f"p{index}", index, index)
+
+    blocks = render.table(COLUMNS, rows(), chunk_size=2)
+    assert next(blocks).startswith("Name")
+    assert consumed == [0, 1]
+    assert len(list(blocks)) == 4
+    # an empty table is its header and rule
+    assert "".join(render.table(COLUMNS, [])).count("\n") == 3
+
+
+def test_pager_waits_between_screens(monkeypatch):
+    answers = iter(["", "q"])
+    prompts = []
+
+    def answer(prompt):
+        prompts.append(prompt)
+        return next(answers)
+
+    monkeypatch.setattr("builtins.input", answer)
+    out = io.StringIO()
+    lines = [f"{index}\n" for index in range(10)]
+    render.page(["".join(lines[:4]), "".join(lines[4:])], out, height=3)
+    # two screens shown, quit at the second prompt
+    assert out.getvalue() == "".join(lines[:6])
+    assert prompts == [render.PROMPT] * 2
+
+
+def test_show_without_terminal():
+    out = io.StringIO()
+    render.show(["a\n", "b\n"], out)
+    assert out.getvalue() == "a\nb\n"
+    render.clear_screen(out)
+    assert out.getvalue().endswith(render.CLEAR)
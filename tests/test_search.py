@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from async_shop import AsyncShop
+from shop import Shop
+from storage import MemoryBackend
+
+NAMES = [
+    "apple juice",
+    "apple pie",
+    "Apricot jam",
+    "coffee mug 12",
+    "coffee beans",
+    "headset 1999",
+    "desk lamp",
+    "Éclair",
+]
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def catalog(request, database):
+    if request.param == "memory":
+        Shop.use(MemoryBackend())
+    for name in NAMES:
+        Shop.save(name, 1, 1)
+    return request.param
+
+
+def names(products) -> list[str]:
+    return [product.name for product in products]
+
+
+def test_prefix_in_name_order(catalog):
+    assert names(Shop.search_prefix("AP")) == [
+        "apple juice",
+        "apple pie",
+        "Apricot jam",
+    ]
+    assert names(Shop.search_prefix("éc")) == ["Éclair"]
+    assert names(Shop.search_prefix("apple", limit=1)) == ["apple juice"]
+    assert Shop.search_prefix("tea") == []
+
+
+@pytest.mark.parametrize(
+    "typo, expected",
+    [
+        ("cofee mug 12", "coffee mug 12"),
+        ("hedset 1999", "headset 1999"),
+        ("desk lmap", "desk lamp"),
+        ("aple pie", "apple pie"),
+    ],
+)
+def test_typos(catalog, typo, expected):
+    assert names(Shop.find(typo))[0] == expected
+
+
+def test_find_prefix_first(catalog):
+    # fuzzy matches only add products the prefix did not find
+    assert names(Shop.find("apple", limit=3)) == ["apple juice", "apple pie"]
+    assert names(Shop.find("apple pi")) == ["apple pie", "apple juice"]
+    assert Shop.find("zzzz") == []
+
+
+def test_async_find_runs_the_same_plan(database):
+    for name in NAMES:
+        Shop.save(name, 1, 1)
+
+    async def find_all() -> list[list[str]]:
+        await AsyncShop.configure(database)
+        try:
+            return [
+                names(await AsyncShop.find(text))
+                for text in ("cofee mug 12", "hedset", "apple", "zzzz")
+            ]
+        finally:
+            await AsyncShop.dispose()
+
+    expected = [
+        names(Shop.find(text)) for text in ("cofee mug 12", "hedset", "apple", "zzzz")
+    ]
+    assert asyncio.run(find_all()) == expected
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from server import Handler, InventoryClient, InventoryServer
+from shop import Shop
+
+
+@pytest.fixture
+def client(database):
+    """Client of a server on a free port of a new database."""
+    server = InventoryServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = InventoryClient(*server.server_address)
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_status_codes(client):
+    assert client.request("POST", "/products", {"name": "Pen", "quantity": 2})[0] == 200
+    assert client.request("GET", "/products/pen")[0] == 200
+    assert client.request("GET", "/products/cup")[0] == 404
+    adjust = {"delta": -5}
+    assert client.request("POST", "/products/pen/adjust", adjust)[0] == 409
+    assert client.request("POST", "/adjust", {"deltas": {"pen": -1}})[0] == 200
+    assert client.request("POST", "/adjust", {"deltas": {"cup": -1}})[0] == 409
+    assert client.request("GET", "/products/pen/price")[0] == 404
+    assert client.request("GET", "/nothing")[0] == 404
+    assert client.request("DELETE", "/products")[0] == 405
+    assert client.request("PUT", "/products")[0] == 501
+    assert client.request("GET", "/products?order=colour")[0] == 400
+    assert client.request("POST", "/products", {"quantity": 1})[0] == 400
+    assert client.request("DELETE", "/products/pen")[0] == 200
+    assert client.request("DELETE", "/products/pen")[0] == 404
+
+
+def test_client_round_trip(client):
+    assert client.save("ice cream", 3, 4)
+    assert client.save("Ice Cream", 1, 9, merge="add")
+    assert client.get("ICE CREAM") == {
+        "id": 1,
+        "name": "ice cream",
+        "quantity": 4,
+        "price": 9,
+    }
+    assert client.adjust_stock("ice cream", -4)
+    assert not client.adjust_many({"ice cream": -1})
+    assert [p["name"] for p in client.find("ice creem")] == ["ice cream"]
+    assert client.summary()["count"] == 1
+    assert "caches" in client.stats()
+    status, page = client.request("GET", '/products?order=name&after=["a",0]')
+    assert status == 200 and [p["name"] for p in page["products"]] == ["ice cream"]
+    assert client.remove("ice cream")
+    assert client.get("ice cream") is None
+
+
+def test_batch(client):
+    results = client.batch(
+        [
+            {"op": "save", "name": "pen", "quantity": 2, "price": 5},
+            {"op": "get", "name": "pen"},
+            {"op": "remove", "name": "cup"},
+            {"op": "fly"},
+            {"op": "save"},
+        ]
+    )
+    assert results[0] == {"ok": True}
+    assert results[1]["product"]["quantity"] == 2
+    assert results[2] == {"ok": False}
+    assert "error" in results[3] and "error" in results[4]
+
+
+def test_write_behind_results(client):
+    Shop.write_behind(max_delay=0.05)
+    assert client.save("pen", 1, 1)
+    assert not client.remove("cup")
+    assert client.request("DELETE", "/products/cup")[0] == 404
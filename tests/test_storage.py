@@ -0,0 +1,177 @@
+import random
+
+import pytest
+
+from queries import Direction, Merge, Order
+from storage import MemoryBackend, SqlBackend
+
+# the same operations on both backends must give the same results
+OPERATIONS = 3000
+NAMES = ["pen", "cup", "mug", "desk lamp", "éclair", "straße", "ça va", "ice cream"]
+
+
+def random_name(rand: random.Random) -> str:
+    name = rand.choice(NAMES)
+    return rand.choice([name, name.upper(), name.title()])
+
+
+def apply(backend, operation) -> bool:
+    """Run an operation in a transaction, False if it was rolled back."""
+    kind, args = operation
+    try:
+        with backend.transaction() as tx:
+            if kind == "upsert":
+                name, quantity, price, merge = args
+                row = {"name": name, "quantity": quantity, "price": price}
+                backend.upsert(tx, [row], merge)
+            elif kind == "remove":
+                return backend.remove(tx, args)
+            else:
+                # like Shop.adjust_many, all or nothing
+                for name, delta in args:
+                    if not backend.adjust(tx, name.lower(), delta):
+                        raise ValueError(f"can't adjust {name}")
+    except ValueError:
+        return False
+    return True
+
+
+def random_operation(rand: random.Random):
+    kind = rand.choices(["upsert", "remove", "adjust"], [5, 1, 4])[0]
+    if kind == "upsert":
+        merge = rand.choice(list(Merge))
+        args = (random_name(rand), rand.randint(0, 20), rand.randint(0, 50), merge)
+        return kind, args
+    if kind == "remove":
+        return kind, random_name(rand)
+    deltas = [(random_name(rand), rand.randint(-10, 10)) for _ in range(3)]
+    return kind, deltas
+
+
+def state(backend):
+    rows = [row for chunk in backend.chunks(100) for row in chunk]
+    return rows, backend.totals()
+
+
+def values(product) -> tuple | None:
+    if product is None:
+        return None
+    return product.id, product.name, product.quantity, product.price
+
+
+def product_values(products) -> list[tuple]:
+    return [values(product) for product in products]
+
+
+def test_backends_agree_on_random_operations(tmp_path):
+    rand = random.Random(2024)
+    sql = SqlBackend(str(tmp_path / "shop.db"))
+    memory = MemoryBackend()
+    try:
+        for number in range(OPERATIONS):
+            operation = random_operation(rand)
+            assert apply(sql, operation) == apply(memory, operation), operation
+            if number % 100 == 0 or number == OPERATIONS - 1:
+                assert state(sql) == state(memory)
+        for name in NAMES:
+            assert values(sql.get(name)) == values(memory.get(name))
+            prefix = name[:2]
+            assert product_values(sql.search_prefix(prefix, 5)) == product_values(
+                memory.search_prefix(prefix, 5)
+            )
+            sql_history = [(m.kind, m.delta, m.quantity) for m in sql.history(name, 20)]
+            memory_history = [
+                (m.kind, m.delta, m.quantity) for m in memory.history(name, 20)
+            ]
+            assert sql_history == memory_history
+        for order in Order:
+            for direction in Direction:
+                sql_page = sql.page(order, direction, None, None, 4)
+                memory_page = memory.page(order, direction, None, None, 4)
+                assert product_values(sql_page.products) == product_values(
+                    memory_page.products
+                )
+                assert sql_page.last == memory_page.last
+    finally:
+        sql.dispose()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_products_are_copies(tmp_path, backend):
+    storage = (
+        SqlBackend(str(tmp_path / "shop.db"))
+        if backend == "sqlite"
+        else MemoryBackend()
+    )
+    with storage.transaction() as tx:
+        storage.upsert(tx, [{"name": "Pen", "quantity": 1, "price": 2}], Merge.ADD)
+    storage.get("pen").quantity = 100
+    storage.search_prefix("p", 1)[0].quantity = 100
+    storage.page(Order.ID, Direction.ASC, None, None, 1).products[0].quantity = 100
+    assert storage.get("pen").quantity == 1
+    assert storage.totals().quantities == 1
+    if backend == "sqlite":
+        storage.dispose()
+
+
+CRITERIA = [
+    ("price", ">", 10),
+    ("quantity", "<=", 2),
+    ("total", ">=", 40),
+    ("name", "==", "ÉCLAIR"),
+    ("name", "!=", "pen"),
+    ("name", "in", ["Pen", "CUP", "hat"]),
+    ("name", "startswith", "desk"),
+    ("name", "startswith", "desk_"),
+    ("price", "between", (5, 20)),
+    ("id", "in", [1, 3]),
+]
+
+
+@pytest.mark.parametrize("criterion", CRITERIA)
+def test_backends_agree_on_criteria(tmp_path, criterion):
+    rows = [
+        {"name": "Pen", "quantity": 3, "price": 5},
+        {"name": "cup", "quantity": 2, "price": 12},
+        {"name": "Éclair", "quantity": 1, "price": 30},
+        {"name": "desk lamp", "quantity": 4, "price": 20},
+        {"name": "desk_pad", "quantity": 5, "price": 8},
+    ]
+    sql, memory = SqlBackend(str(tmp_path / "shop.db")), MemoryBackend()
+    try:
+        for backend in (sql, memory):
+            with backend.transaction() as tx:
+                backend.upsert(tx, rows, Merge.ADD)
+        expected = sql.summary((criterion,))
+        assert expected.count
+        assert memory.summary((criterion,)) == expected
+        both = (criterion, ("quantity", ">", 0))
+        assert memory.summary(both) == sql.summary(both)
+        assert memory.subtotals([criterion, both[1]]) == sql.subtotals(
+            [criterion, both[1]]
+        )
+    finally:
+        sql.dispose()
+
+
+def test_criteria_forms(tmp_path):
+    from models import Product
+
+    sql, memory = SqlBackend(str(tmp_path / "shop.db")), MemoryBackend()
+    try:
+        for backend in (sql, memory):
+            with backend.transaction() as tx:
+                backend.upsert(
+                    tx, [{"name": "pen", "quantity": 1, "price": 5}], Merge.ADD
+                )
+        # sql expressions stay available on sqlite
+        assert sql.summary((Product.price > 1,)).count == 1
+        with pytest.raises(TypeError):
+            memory.summary((Product.price > 1,))
+        for backend in (sql, memory):
+            with pytest.raises(ValueError):
+                backend.summary((("colour", "==", "red"),))
+            with pytest.raises(ValueError):
+                backend.summary((("price", "like", 1),))
+    finally:
+        sql.dispose()
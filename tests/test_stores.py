@@ -0,0 +1,100 @@
+import os
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from queries import Merge, Summary
+from storage import SqlBackend
+from stores import Chain, merge_summaries
+
+STOCK = {
+    "north": [("pen", 2, 5), ("ice cream", 1, 3)],
+    "south": [("Pen", 4, 6), ("pencil case", 1, 9)],
+    "east": [],
+}
+
+
+@pytest.fixture
+def chain(tmp_path):
+    """Chain of three stores, one without products."""
+    stores = {store: str(tmp_path / f"{store}.db") for store in STOCK}
+    chain = Chain(stores, workers=2)
+    for store, products in STOCK.items():
+        shop = chain.shop(store)
+        for name, quantity, price in products:
+            shop.save(name, quantity, price)
+        # the database is created on first use
+        shop.summary()
+    yield chain
+    chain.close()
+
+
+def test_read_only_store_path_with_uri_characters(tmp_path):
+    path = str(tmp_path / "north ?#%20.db")
+    writer = SqlBackend(path)
+    with writer.transaction() as tx:
+        writer.upsert(tx, [{"name": "pen", "quantity": 1, "price": 2}], Merge.ADD)
+    writer.dispose()
+    reader = SqlBackend(path, readonly=True)
+    try:
+        assert reader.get("pen").quantity == 1
+        with pytest.raises(OperationalError):
+            with reader.transaction() as tx:
+                reader.remove(tx, "pen")
+    finally:
+        reader.dispose()
+
+
+def test_shops_are_routed_to_their_store(chain):
+    assert chain.shop("north").get("pen").quantity == 2
+    assert chain.shop("south").get("pen").quantity == 4
+    assert chain.shop("east").get("pen") is None
+    assert chain.shop("north") is chain.shop("north")
+    with pytest.raises(KeyError):
+        chain.shop("west")
+
+
+def test_totals_fan_out(chain):
+    totals = chain.totals()
+    assert list(totals) == ["north", "south", "east"]
+    assert (totals["north"].count, totals["north"].capital) == (2, 13)
+    assert totals["east"].min_price is None
+    summary = chain.summary()
+    assert (summary.count, summary.quantities, summary.capital) == (4, 8, 46)
+    assert (summary.min_price, summary.max_price) == (3, 9)
+    assert chain.total_capital() == 46 and chain.total_quantities() == 8
+
+
+def test_search_fan_out(chain):
+    found = chain.search("pen", limit=3)
+    # the exact matches of both stores, then the closest other name
+    assert {(p.store, p.name) for p in found[:2]} == {
+        ("north", "pen"),
+        ("south", "Pen"),
+    }
+    assert (found[2].store, found[2].name) == ("south", "pencil case")
+    assert found[2].to_dict()["quantity"] == 1
+
+
+def test_missing_store_is_not_created(chain, tmp_path):
+    path = str(tmp_path / "west.db")
+    chain.stores["west"] = path
+    with pytest.raises(FileNotFoundError):
+        chain.totals()
+    assert not os.path.exists(path)
+
+
+def test_single_store_runs_in_process(chain):
+    single = Chain({"north": chain.stores["north"]})
+    try:
+        assert single.summary().count == 2
+        assert single._pool is None
+    finally:
+        single.close()
+
+
+def test_merge_summaries():
+    empty = Summary()
+    assert merge_summaries([]) == empty
+    merged = merge_summaries([Summary(1, 2, 3, 4, 5), empty, Summary(1, 1, 1, 1, 6)])
+    assert merged == Summary(2, 3, 4, 1, 6)
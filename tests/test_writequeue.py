@@ -0,0 +1,64 @@
+from concurrent.futures import Future
+
+from shop import Shop
+from ui import Ui
+from writequeue import WriteQueue
+
+
+def test_futures_resolve_after_commit(database):
+    Shop.write_behind(max_delay=0.05)
+    saved = Shop.save("pen", 1, 2)
+    removed = Shop.remove("cup")
+    assert isinstance(saved, Future) and isinstance(removed, Future)
+    assert saved.result() is True
+    assert removed.result() is False
+    assert Shop.get("pen").quantity == 1
+    Shop.close()
+    assert Shop.writer is None
+    assert Shop.remove("pen") is True
+
+
+def test_failing_operation_rolls_back_alone(database):
+    Shop.write_behind(max_delay=0.05)
+    first = Shop.save("pen", 1, 2)
+
+    def broken(session):
+        raise RuntimeError("broken")
+
+    failed = Shop.writer.submit("broken", broken)
+    last = Shop.save("cup", 3, 4)
+    assert [first.result(), failed.result(), last.result()] == [True, False, True]
+    assert Shop.get("pen").quantity == 1
+    assert Shop.get("cup").quantity == 3
+
+
+def test_flush_and_close_commit_the_queue(database):
+    Shop.write_behind(max_delay=10)
+    futures = [Shop.save(f"p{i}", i, i) for i in range(20)]
+    Shop.flush()
+    assert all(future.done() for future in futures)
+    Shop.save("last", 1, 1)
+    Shop.close()
+    assert Shop.get("last") is not None
+
+
+def test_groups_are_bounded(database):
+    groups = []
+    queue = WriteQueue(max_ops=3, max_delay=10, on_commit=lambda: groups.append(1))
+    futures = [queue.submit("noop", lambda session: True) for _ in range(7)]
+    queue.close()
+    assert all(future.result() for future in futures)
+    # 3 + 3 + 1 operations, and the flush barrier of close
+    assert len(groups) >= 3
+
+
+def test_ui_waits_for_the_commit(database, monkeypatch, capsys):
+    Shop.write_behind(max_delay=0.05)
+    answers = iter(["cup"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    Ui.remove_ui()
+    assert capsys.readouterr().out == "Product not found!\n"
+    answers = iter(["Pen", "2", "3"])
+    Ui.add_ui()
+    assert capsys.readouterr().out == "Product saved successfully.\n"
+    assert Shop.get("pen").price == 3
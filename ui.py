@@ -1,7 +1,12 @@
-import os
+from concurrent.futures import Future
 from enum import Enum
-from shop import Shop
+from typing import Iterable
+
+import metrics
+import render
 from models import Product
+from render import Column
+from shop import Direction, Order, Shop, Summary
 
 
 class Menu(Enum):
@@ -11,22 +16,53 @@ class Menu(Enum):
 
     ADD = "add"
     SHOW = "show"
+    SHOW_ALL = "show all"
     HELP = "help"
     REMOVE = "remove"
     SEARCH = "search"
     CLEAR = "clear"
     SORT_ASC = "sort asc"
     SORT_DEC = "sort dec"
+    STATS = "stats"
     EXIT = "exit"
 
 
+class PageMenu(Enum):
+    """
+    Options while browsing pages of products
+    """
+
+    NEXT = "next"
+    PREV = "prev"
+    QUIT = "quit"
+
+
+# columns of the products table
+COLUMNS = [
+    Column("Product Name"),
+    Column("Quantity"),
+    Column("Price", ">", "$"),
+    Column("Total Price", ">", "$"),
+]
+# columns of the stats table
+STATS_COLUMNS = [Column("Operation")] + [
+    Column(title, ">")
+    for title in ("Calls", "Errors", "p50 ms", "p95 ms", "p99 ms")
+    + ("SQL/call", "Rows/call")
+]
+# columns of the caches table
+CACHE_COLUMNS = [Column("Cache")] + [
+    Column(title, ">") for title in ("Size", "Max", "Hits", "Misses", "Evictions")
+]
+
+
 class Ui:
     """User interfece that user will interact."""
 
     @staticmethod
     def clear_screen():
         """Clear console screen."""
-        os.system("cls")
+        render.clear_screen()
 
     @staticmethod
     def show_logo() -> str:
@@ -51,6 +87,8 @@ class Ui:
         items = ""
         for menu_item in Menu:
             items += f" -  {menu_item.value}\n"
+        keys = ", ".join(order.value for order in Order)
+        items += f"\nsort by key, e.g. `sort asc price`: {keys}\n"
         return items
 
     @staticmethod
@@ -62,17 +100,22 @@ class Ui:
         name = input("Enter product name:").lower()
         number = int(input("Enter number of the products: "))
         price = int(input("Enter price of the product: "))
-        result = Shop.save(name, number, price)
+        result = Ui.outcome(Shop.save(name, number, price))
         if result:
             print("Product saved successfully.")
         else:
             print("Some problem happend. Look at log file.")
 
+    @staticmethod
+    def outcome(result) -> bool:
+        """Result of a write, waiting for its commit in write behind mode."""
+        return result.result() if isinstance(result, Future) else result
+
     @staticmethod
     def remove_ui():
         """Get input from user to delete a product."""
         name = input("Product name: ").lower()
-        result = Shop.remove(name)
+        result = Ui.outcome(Shop.remove(name))
         if result:
             print("The product delete successfuly.")
         else:
@@ -85,43 +128,82 @@ class Ui:
         product = Shop.search(name)
         if product:
             print(product)
+            return
+        products = Shop.find(name)
+        if products:
+            print("Product not found, closest matches:\n")
+            Ui.table(products)
         else:
             print("Product not found!!")
 
     @classmethod
-    def display(cls, products: list[Product]):
+    def display(cls, products: Iterable[Product], summary: Summary = None):
         """Get list of poducts and create table like output and print it.
 
         Parameters
         -----------
             products: list of products
+            summary: totals for the footer, computed if not given
 
         """
-        titles = ("Product Name", "Quantity", "Price", "Total Price")
-        header = "{:<30}{:<10}{:>20}{:>20}".format(*titles)
-        dashes = "-" * len(header)
-        print(f"{header}\n{dashes}")
-
-        for product in products:
-            s = "{:<30}{:<10}{:>20}${:>20}$"
-            val = (
+        summary = summary or Shop.summary()
+        cls.table(products, ("", summary.quantities, "", summary.capital))
+
+    @staticmethod
+    def table(products: Iterable[Product], footer=None):
+        """Print products as a table, through the pager if it is long.
+
+        Parameters
+        -----------
+            products: products, streamed if an iterator
+            footer: row below the table, nothing if not given
+
+        """
+        rows = (
+            (
                 product.name,
                 product.quantity,
                 product.price,
                 product.quantity * product.price,
             )
-            print(s.format(*val))
-        print(dashes)
-        total_capital = Shop.total_capital()
-        quantities = Shop.total_quantities()
-        footer = "{:>31}{:>50}$".format(quantities, total_capital)
-        print(footer)
+            for product in products
+        )
+        render.show(render.table(COLUMNS, rows, footer))
+
+    @classmethod
+    def browse(cls, order: Order, direction=Direction.ASC):
+        """Display products page by page, move with next and prev."""
+        summary = Shop.summary()
+        page = Shop.page(order, direction)
+        while True:
+            cls.display(page.products, summary)
+            if summary.count <= Shop.PAGE_SIZE:
+                return
+            options = ", ".join(item.value for item in PageMenu)
+            response = input(f"{options} > ")
+            if response == PageMenu.QUIT.value:
+                return
+            elif response == PageMenu.NEXT.value:
+                new_page = Shop.page(order, direction, after=page.last)
+            elif response == PageMenu.PREV.value:
+                new_page = Shop.page(order, direction, before=page.first)
+            else:
+                print("Wrong choice!!")
+                continue
+            if new_page.products:
+                page = new_page
+            else:
+                print("No more products.")
 
     @staticmethod
     def show_ui():
         """Display all products in the screen."""
-        products = Shop.products()
-        Ui.display(products)
+        Ui.browse(Order.ID)
+
+    @staticmethod
+    def show_all_ui():
+        """Display every product at once, a screen at a time."""
+        Ui.display(Shop.iter_products())
 
     @staticmethod
     def help_ui():
@@ -129,20 +211,76 @@ class Ui:
         print(Shop.mannual())
 
     @staticmethod
-    def sort_asc_ui():
-        """Display sorted products ascengingly by name in the screen."""
-        products = Shop.sort_asc()
-        Ui.display(products)
+    def sort_asc_ui(key=""):
+        """Display sorted products ascengingly by key in the screen."""
+        Ui.sort_ui(key, Direction.ASC)
+
+    @staticmethod
+    def sort_dec_ui(key=""):
+        """Display sorted products descengingly by key in the screen."""
+        Ui.sort_ui(key, Direction.DEC)
 
     @staticmethod
-    def sort_dec_ui():
-        """Display sorted products descengingly by name in the screen."""
-        products = Shop.sort_dec()
-        Ui.display(products)
+    def sort_ui(key: str, direction: Direction):
+        """Display products sorted by key, name if key is empty."""
+        try:
+            order = Order(key or Order.NAME.value)
+        except ValueError:
+            keys = ", ".join(order.value for order in Order)
+            print(f"Wrong sort key!! Choose one of: {keys}")
+            return
+        Ui.browse(order, direction)
+
+    @staticmethod
+    def stats_ui(command=""):
+        """Print timings of the shop operations and counters of its caches.
+
+        `stats on` and `stats off` start and stop recording, `stats reset`
+        clears the figures and `stats dump <file>` writes them as json.
+        """
+        if command == "on":
+            metrics.enable()
+            print("Recording operations.")
+            return
+        if command == "off":
+            metrics.disable()
+            print("Stopped recording operations.")
+            return
+        if command == "reset":
+            metrics.reset()
+            print("Figures cleared.")
+            return
+        if command.startswith("dump "):
+            path = command.removeprefix("dump ").strip()
+            metrics.dump(path)
+            print(f"Figures written to {path}")
+            return
+        if command:
+            print("Wrong choice!! Use stats on, off, reset or dump <file>")
+            return
+        if not metrics.ENABLED:
+            print("Recording is off, turn it on with `stats on`.")
+        fields = ("count", "errors", "p50_ms", "p95_ms", "p99_ms")
+        fields += ("statements_per_call", "rows_per_call")
+        rows = [
+            (name, *(op[field] for field in fields))
+            for name, op in metrics.snapshot()["operations"].items()
+        ]
+        render.show(render.table(STATS_COLUMNS, rows))
+        caches = Shop.cache_stats()
+        print(f"Caches, version {caches['version']}:")
+        fields = ("size", "maxsize", "hits", "misses", "evictions")
+        rows = [
+            (name, *(caches[name][field] for field in fields))
+            for name in ("names", "queries")
+        ]
+        render.show(render.table(CACHE_COLUMNS, rows))
 
     @staticmethod
     def exit_ui():
         """Exit of the program."""
+        # queued writes are committed before leaving
+        Shop.close()
         print("Goodbye.")
         exit()
 
@@ -166,6 +304,8 @@ class Ui:
                 Ui.add_ui()
             elif response == Menu.SHOW.value:
                 Ui.show_ui()
+            elif response == Menu.SHOW_ALL.value:
+                Ui.show_all_ui()
             elif response == Menu.HELP.value:
                 Ui.help_ui()
             elif response == Menu.REMOVE.value:
@@ -174,10 +314,12 @@ class Ui:
                 Ui.search_ui()
             elif response == Menu.CLEAR.value:
                 Ui.clear_screen()
-            elif response == Menu.SORT_ASC.value:
-                Ui.sort_asc_ui()
-            elif response == Menu.SORT_DEC.value:
-                Ui.sort_dec_ui()
+            elif response.startswith(Menu.SORT_ASC.value):
+                Ui.sort_asc_ui(response.removeprefix(Menu.SORT_ASC.value).strip())
+            elif response.startswith(Menu.SORT_DEC.value):
+                Ui.sort_dec_ui(response.removeprefix(Menu.SORT_DEC.value).strip())
+            elif response.startswith(Menu.STATS.value):
+                Ui.stats_ui(response.removeprefix(Menu.STATS.value).strip())
             else:
                 print("Wrong choice!!")
 
@@ -0,0 +1,146 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+import metrics
+from models import session_scope
+
+# An operation gets the running transaction, a session with the sqlite
+# backend, and returns True if it was applied. It must not raise for
+# expected failures, like removing a product that does not exist, an
+# exception rolls back the whole group.
+Operation = Callable[[Session], bool]
+
+
+class WriteQueue:
+    """
+    Group commit of writes.
+    Operations are queued and a background thread commits them together,
+    in one transaction every `max_ops` operations or `max_delay` seconds,
+    whichever comes first. Each caller gets a future of its own result.
+    """
+
+    def __init__(
+        self, max_ops=500, max_delay=0.01, on_commit=None, transaction=session_scope
+    ):
+        self.max_ops = max_ops
+        self.max_delay = max_delay
+        self.on_commit = on_commit
+        # opens the transaction of a group, e.g. of a storage backend
+        self.transaction = transaction
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="write-queue", daemon=True
+        )
+        self._thread.start()
+        # whatever is queued is committed on a clean exit
+        atexit.register(self.close)
+
+    def submit(self, action: str, operation: Operation) -> Future:
+        """Queue an operation.
+
+        Parameters
+        ----------
+        action: str
+            Name of the operation for the log, e.g. `save`.
+        operation: Operation
+            Function that applies the write on a session.
+
+        Returns
+        -------
+        outs: Future
+            Return a future of the operation result, set after commit.
+        """
+        if self._closed:
+            raise RuntimeError("Write queue is closed")
+        future = Future()
+        self._queue.put((future, action, operation))
+        return future
+
+    def flush(self):
+        """Block until every operation queued so far is committed."""
+        if self._closed:
+            return
+        barrier = Future()
+        self._queue.put((barrier, "flush", None))
+        barrier.result()
+
+    def close(self):
+        """Commit what is queued and stop the background thread."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        """Collect operations into groups and commit them."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.monotonic() + self.max_delay
+            # a flush barrier ends the group so the flush returns promptly
+            while len(group) < self.max_ops and group[-1][2] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._commit(group)
+                    return
+                group.append(item)
+            self._commit(group)
+
+    @metrics.timed(name="group_commit")
+    def _commit(self, group: list):
+        """Apply a group in one transaction and resolve its futures.
+
+        If the transaction fails, operations are retried one transaction
+        each so only the failing ones report False.
+        """
+        start = time.perf_counter()
+        try:
+            with self.transaction() as session:
+                results = [self._apply(session, op) for _, _, op in group]
+        except Exception as e:
+            logging.error(
+                f"Error on group commit, retry one by one: {e}",
+                extra={"operation": "group_commit", "rows": len(group)},
+            )
+            results = [self._apply_alone(item) for item in group]
+        if logging.root.isEnabledFor(logging.DEBUG):
+            ms = round((time.perf_counter() - start) * 1000, 3)
+            fields = {"operation": "group_commit", "rows": len(group), "ms": ms}
+            logging.debug(f"Committed {len(group)} operations", extra=fields)
+        if self.on_commit is not None:
+            self.on_commit()
+        for (future, _, _), result in zip(group, results):
+            future.set_result(result)
+
+    @staticmethod
+    def _apply(session: Session, operation: Operation | None) -> bool:
+        # a flush barrier has no operation
+        return True if operation is None else operation(session)
+
+    def _apply_alone(self, item) -> bool:
+        _, action, operation = item
+        try:
+            with self.transaction() as session:
+                return self._apply(session, operation)
+        except Exception as e:
+            logging.error(f"Error on {action}: {e}", extra={"operation": action})
+            return False